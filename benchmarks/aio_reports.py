@@ -0,0 +1,244 @@
+"""
+Check that finpy.aio runs report requests in parallel: N concurrent
+get_report_data() calls should be in flight at the same time and
+finish in about the time of the slowest one, not the sum of all of
+them.
+
+Every request records when its worker started and finished it. Fails
+when no two of them were ever in flight at once (requests too short to
+outlast a thread switch are exempt), or when the concurrent
+run takes more than --max-ratio times the expected time: the slowest
+single request, or the sum of all of them spread over the CPUs when
+there are fewer CPUs than requests. On one CPU the expected time is the
+sum, so the timing check is skipped and only the overlap counts. Also
+fails when cancelling a full-ledger listing does not interrupt its
+query within --max-cancel milliseconds.
+
+Usage:
+    python benchmarks/aio_reports.py --rows 200000 --requests 4
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import tempfile
+import time
+
+from ledger import build_ledger
+
+from finpy import aio, connection, db
+
+def ranges(count, start_year, years):
+    """
+    Return count distinct (start, end) report ranges of about one year.
+    """
+    return [
+        (f"{start_year + i % years}-01-01", f"{start_year + i % years}-12-31")
+        for i in range(count)
+    ]
+
+async def ticker(stop, gaps):
+    # Longest time the event loop could not run a 1 ms sleep
+    last = time.perf_counter()
+
+    while not stop.is_set():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+
+def in_flight(spans):
+    """
+    Return the largest number of (start, end) spans open at one time.
+    """
+
+    # At equal times an end is counted before a start
+    events = sorted([(end, -1) for _, end in spans] + [(start, 1) for start, _ in spans])
+    most = current = 0
+
+    for _, step in events:
+        current += step
+        most = max(most, current)
+
+    return most
+
+async def timed(coro):
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+async def measure(requests, transactions):
+    # Warm up every worker's connection and page cache
+    await asyncio.gather(*(aio.get_summary_data() for _ in range(aio.MAX_WORKERS)))
+    db.clear_cache()
+
+    singles = []
+
+    for start, end in requests:
+        singles.append(await timed(aio.get_report_data(start, end, transactions=transactions)))
+
+    # When each worker started and finished its request
+    spans = []
+
+    def report(start, end):
+        began = time.perf_counter()
+
+        try:
+            return db.get_report_data(start, end, transactions=transactions)
+        finally:
+            spans.append((began, time.perf_counter()))
+
+    db.clear_cache()
+    stop = asyncio.Event()
+    gaps = []
+    tick = asyncio.ensure_future(ticker(stop, gaps))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(aio.run(report, s, e) for s, e in requests))
+    parallel = time.perf_counter() - start
+
+    stop.set()
+    await tick
+
+    return singles, parallel, max(gaps, default=0.0), in_flight(spans)
+
+async def cancellation():
+    """
+    Cancel a full-ledger listing 10 ms after it starts.
+
+    Returns:
+        (how the listing ended in the worker, seconds from the cancel
+         until the worker was free again)
+    """
+
+    done = threading.Event()
+    outcome = {}
+
+    def listing():
+        try:
+            db.get_all_transactions()
+            outcome["result"] = "finished"
+        except sqlite3.OperationalError as e:
+            outcome["result"] = str(e)
+            raise
+        finally:
+            done.set()
+
+    db.clear_cache()
+    task = asyncio.ensure_future(aio.run(listing))
+    await asyncio.sleep(0.01)
+    task.cancel()
+
+    start = time.perf_counter()
+
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+    # The awaiting task returns at once, the worker stops when its
+    # query is interrupted
+    await asyncio.get_running_loop().run_in_executor(None, done.wait)
+
+    return outcome.get("result", "never started"), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="finpy.aio concurrency check")
+
+    parser.add_argument("--rows", type=int, default=200000, help="Synthetic transactions (default: 200000)")
+    parser.add_argument("--requests", type=int, default=4, help="Concurrent report requests (default: 4)")
+    parser.add_argument("--workers", type=int, default=4, help="aio worker threads (default: 4)")
+    parser.add_argument("--db", help="Reuse or create the ledger at this path")
+    parser.add_argument(
+        "--max-ratio",
+        type=float,
+        default=1.5,
+        help="Concurrent time allowed, times the expected time (default: 1.5)"
+    )
+    parser.add_argument(
+        "--max-cancel",
+        type=float,
+        default=50,
+        help="Milliseconds a cancelled listing may keep its worker (default: 50)"
+    )
+
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="finpy-aio-")
+    path = args.db or os.path.join(workdir, "ledger.db")
+
+    if os.path.exists(path):
+        connection.configure(db=path)
+        db.init_db()
+    else:
+        print(f"Building {args.rows} row ledger at {path} ...", file=sys.stderr)
+        build_ledger(path, args.rows, 20, "2015-01-01", 10, (0.1, 0.8, 0.1), 42)
+
+    aio.configure(max_workers=args.workers)
+
+    # Threads only overlap on as many cores as there are
+    print(f"{os.cpu_count()} CPU(s), {args.workers} workers", file=sys.stderr)
+    requests = ranges(args.requests, 2015, 10)
+
+    # With fewer CPUs than requests the best case is the sum spread over them
+    lanes = max(min(os.cpu_count() or 1, args.workers, args.requests), 1)
+    overlap = min(args.workers, args.requests, 2)
+    problems = []
+
+    if lanes == 1:
+        print("Only one lane to run on, skipping the timing check, checking overlap only", file=sys.stderr)
+
+    for label, transactions in (("with transactions", True), ("totals only", False)):
+        singles, parallel, stall, most = asyncio.run(measure(requests, transactions))
+        expected = max(max(singles), sum(singles) / lanes)
+
+        print(
+            f"{args.requests} reports {label}: "
+            f"slowest {max(singles) * 1000:.1f} ms, "
+            f"sum {sum(singles) * 1000:.1f} ms, "
+            f"concurrent {parallel * 1000:.1f} ms "
+            f"(expected {expected * 1000:.1f} ms), "
+            f"at most {most} in flight, "
+            f"longest event loop stall {stall * 1000:.1f} ms"
+        )
+
+        # A request shorter than a thread switch can finish before the
+        # next worker is scheduled
+        if min(singles) > 2 * sys.getswitchinterval() and most < overlap:
+            problems.append(f"{label}: the requests ran one at a time, never {overlap} in flight")
+
+        if lanes > 1 and parallel > expected * args.max_ratio:
+            problems.append(
+                f"{label}: concurrent {parallel * 1000:.1f} ms is over "
+                f"{args.max_ratio:g}x the expected {expected * 1000:.1f} ms"
+            )
+
+    result, stopped = asyncio.run(cancellation())
+    print(f"cancelled listing: {result}, worker free after {stopped * 1000:.1f} ms")
+
+    if result != "interrupted":
+        problems.append(f"cancelling the listing did not interrupt its query ({result})")
+    elif stopped * 1000 > args.max_cancel:
+        problems.append(
+            f"cancelled listing kept its worker {stopped * 1000:.1f} ms, "
+            f"over {args.max_cancel:g} ms"
+        )
+
+    aio.shutdown()
+    connection.close_connection()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+
+    if problems:
+        sys.exit(1)
+
+    print("OK: reports overlapped, cancelling interrupted the query")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Stress finpy with many processes writing to one database at once and
+check that no write is lost.
+
+Every process adds --writes transactions one at a time (as concurrent
+`finpy add` runs would) and sets a budget every tenth write. Afterwards
+the row counts, the monthly rollup and the full-text index are checked
+against the raw data.
+
+Usage:
+    python benchmarks/concurrent_writers.py --processes 16 --writes 200
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from finpy import connection, db
+
+def writer(path, worker, writes, busy_timeout):
+    """
+    Add transactions from one process.
+
+    Returns:
+        (worker, written, failures)
+    """
+
+    connection.configure(db=path, busy_timeout=busy_timeout)
+    written = 0
+    failures = []
+
+    for i in range(writes):
+        try:
+            db.add_transaction("expense", 1 + i % 100, f"writer{worker:03d}", f"stress {worker}:{i}")
+            written += 1
+
+            if i % 10 == 0:
+                db.add_budget(f"writer{worker:03d}", 100 + i, 1 + i % 12, 2024)
+        except Exception as e:
+            failures.append(f"{type(e).__name__}: {e}")
+
+    connection.close_connection()
+
+    return worker, written, failures
+
+def check(path, processes, writes):
+    """
+    Return a list of problems found in the database after the run.
+    """
+
+    connection.configure(db=path)
+    conn = connection.get_connection()
+    problems = []
+
+    counts = dict(conn.execute(
+        "SELECT category, COUNT(*) FROM transactions WHERE category LIKE 'writer%' GROUP BY category"
+    ).fetchall())
+
+    for worker in range(processes):
+        found = counts.get(f"writer{worker:03d}", 0)
+
+        if found != writes:
+            problems.append(f"writer{worker:03d}: {found} of {writes} transactions stored")
+
+    rollup = sorted(conn.execute("SELECT * FROM monthly_rollup").fetchall())
+    db.rebuild_rollup()
+
+    if rollup != sorted(conn.execute("SELECT * FROM monthly_rollup").fetchall()):
+        problems.append("monthly_rollup differs from a rebuild")
+
+    try:
+        conn.execute("INSERT INTO transactions_fts (transactions_fts, rank) VALUES ('integrity-check', 1)")
+    except Exception as e:
+        problems.append(f"full-text index: {e}")
+
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="finpy concurrent writer stress test")
+
+    parser.add_argument("--processes", type=int, default=16, help="Writer processes (default: 16)")
+    parser.add_argument("--writes", type=int, default=200, help="Transactions per process (default: 200)")
+    parser.add_argument("--busy-timeout", type=int, default=5000, help="busy_timeout in ms (default: 5000)")
+    parser.add_argument("--db", help="Database to write to (default: a fresh temporary one)")
+
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="finpy-writers-")
+    path = args.db or os.path.join(workdir, "ledger.db")
+
+    connection.configure(db=path)
+    db.init_db()
+    connection.close_connection()
+
+    start = time.perf_counter()
+
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.starmap(
+            writer,
+            [(path, worker, args.writes, args.busy_timeout) for worker in range(args.processes)]
+        )
+
+    elapsed = time.perf_counter() - start
+    written = sum(result[1] for result in results)
+
+    print(
+        f"{args.processes} processes wrote {written} transactions in {elapsed:.2f}s "
+        f"({written / elapsed:.0f} writes/s)"
+    )
+
+    problems = [
+        f"writer{worker:03d}: {failure}"
+        for worker, _, failures in results
+        for failure in failures[:3]
+    ]
+    problems += check(path, args.processes, args.writes)
+
+    connection.close_connection()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+
+    if problems:
+        sys.exit(1)
+
+    print("OK: no lost writes, rollup and full-text index consistent")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Deterministic synthetic ledger generator for the finpy benchmarks.
+
+The same arguments always produce the same rows, so timings from two
+runs (or two releases) are comparable.
+"""
+
+import random
+from datetime import date, timedelta
+
+from finpy import connection, db
+
+TYPES = ("income", "expense", "investment")
+
+def generate(rows, categories=20, start="2015-01-01", years=10,
+             type_mix=(0.1, 0.8, 0.1), seed=42):
+    """
+    Yield synthetic transactions in date order.
+
+    input: rows (int) number of transactions,
+           categories (int) distinct expense categories,
+           start (str) first date, YYYY-MM-DD,
+           years (int) length of the date span,
+           type_mix (tuple) income/expense/investment weights,
+           seed (int) random seed
+    Yields:
+        Tuple: (date, type, amount, category, note)
+    """
+
+    rng = random.Random(seed)
+    first = date.fromisoformat(start)
+    span = (first.replace(year=first.year + years) - first).days
+    names = [f"cat{i:03d}" for i in range(categories)]
+
+    # Skew category popularity so GROUP BY results are not uniform
+    weights = [1 / (i + 1) for i in range(categories)]
+
+    for i in range(rows):
+        day = first + timedelta(days=i * span // rows)
+        tx_type = rng.choices(TYPES, type_mix)[0]
+
+        if tx_type == "income":
+            category = "salary"
+            amount = round(rng.uniform(20000, 150000), 2)
+        elif tx_type == "investment":
+            category = "mutual funds"
+            amount = round(rng.uniform(1000, 50000), 2)
+        else:
+            category = rng.choices(names, weights)[0]
+            amount = round(rng.lognormvariate(6, 1.2), 2)
+
+        yield (day.isoformat(), tx_type, amount, category, f"synthetic {i}")
+
+def build_ledger(path, rows, categories=20, start="2015-01-01", years=10,
+                 type_mix=(0.1, 0.8, 0.1), seed=42):
+    """
+    Create a finpy database at path filled with a synthetic ledger and
+    monthly budgets for every category, and make it the active database.
+    """
+
+    connection.configure(db=path)
+    db.init_db()
+
+    db.add_transactions(
+        generate(rows, categories, start, years, type_mix, seed),
+        batch_size=50000
+    )
+
+    first_year = int(start[:4])
+
+    for year in range(first_year, first_year + years):
+        for month in range(1, 13):
+            for i in range(categories):
+                db.add_budget(f"cat{i:03d}", 1000 + 50 * i, month, year)
@@ -0,0 +1,194 @@
+"""
+Check the query plans of finpy's built-in queries.
+
+Runs the public finpy.db functions against a synthetic ledger (with a
+few foreign currency rows and one archived year), records every
+statement they send to SQLite and runs EXPLAIN QUERY PLAN on it. Fails
+when a query scans the transactions table, or when an aggregate over it
+is answered from an index that does not cover the query.
+
+Calls that read the whole ledger on purpose are listed in FULL_READS.
+
+Usage:
+    python benchmarks/query_plans.py --rows 20000
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+from itertools import islice
+
+from ledger import build_ledger
+
+from finpy import connection, db
+from finpy.store import TransactionStore
+
+# Calls expected to read every row, and why
+FULL_READS = {
+    "db.get_all_transactions": "returns the whole ledger",
+    "db.iter_transactions": "walks idx_transactions_date_id in order, LIMIT ends each page",
+    "db.get_recent_transactions": "walks idx_transactions_date_id in order, LIMIT ends it",
+    "db.rebuild_rollup": "recomputes every total",
+    "db.count_missing_rates": "reads the partial indexes of foreign rows only",
+    "db.get_missing_rates": "reads the partial indexes of foreign rows only",
+    "store.TransactionStore.load": "loads the whole ledger into arrays",
+}
+
+# A plan step reading transactions (aliased t in joins, schema-qualified
+# in the ledger views) without a search
+SCAN = re.compile(r"\bSCAN (\w+\.)?(transactions|t)\b(?! VIRTUAL TABLE)")
+
+# A step that reads the table rows behind an index
+NOT_COVERED = re.compile(r"\bSEARCH (\w+\.)?(transactions|t) USING INDEX\b")
+
+# Partial indexes holding only the foreign currency rows, reading all of
+# one is not a scan of the ledger
+PARTIAL = re.compile(r"USING COVERING INDEX idx_transactions_foreign\b")
+
+def calls(year, month, start, end, tx_id):
+    """
+    Return (name, callable) pairs issuing every built-in query.
+    """
+
+    def first_page(filters):
+        return lambda: list(islice(db.iter_transactions(filters, page_size=100), 100))
+
+    return [
+        ("db.get_summary_data", db.get_summary_data),
+        ("db.get_summary_between", lambda: db.get_summary_between(start, end)),
+        ("db.get_summary_between[edge days]", lambda: db.get_summary_between(f"{year}-01-15", f"{year}-03-10")),
+        ("db.get_summary_between[archived]", lambda: db.get_summary_between("2015-03-15", f"{year}-03-10")),
+        ("db.get_mon_summary_data", lambda: db.get_mon_summary_data(month, year)),
+        ("db.get_yr_summary_data", lambda: db.get_yr_summary_data(year)),
+        ("db.get_all_transactions", db.get_all_transactions),
+        ("db.iter_transactions", first_page(None)),
+        ("db.iter_transactions[range]", first_page({"start": start, "end": end})),
+        ("db.iter_transactions[type]", first_page({"type": "expense"})),
+        ("db.iter_transactions[category]", first_page({"category": "cat001"})),
+        ("db.search_transactions", lambda: list(islice(db.search_transactions("synthetic 1*"), 50))),
+        ("db.get_monthly_report_data", lambda: db.get_monthly_report_data(month, year)),
+        ("db.get_yearly_report_data", lambda: db.get_yearly_report_data(year)),
+        ("db.get_report_data", lambda: db.get_report_data(f"{year}-01-15", f"{year}-03-10")),
+        ("db.get_report_data[archived]", lambda: db.get_report_data("2015-03-15", f"{year}-03-10")),
+        ("db.get_transaction_by_id", lambda: db.get_transaction_by_id(1)),
+        ("db.get_recent_transactions", lambda: db.get_recent_transactions(10)),
+        ("db.get_budget", lambda: db.get_budget(month, year)),
+        ("db.get_budget_dashboard", lambda: db.get_budget_dashboard(f"{year:04d}-01", f"{year:04d}-12")),
+        ("db.get_expense_aggregation_by_category", lambda: db.get_expense_aggregation_by_category(month, year)),
+        ("db.count_transactions[range]", lambda: db.count_transactions({"start": start, "end": end})),
+        ("db.count_transactions[archived]", lambda: db.count_transactions({"start": "2015-03-01", "end": end})),
+        ("db.count_transactions[category]", lambda: db.count_transactions({"category": "cat001"})),
+        ("db.update_transactions[category]", lambda: db.update_transactions({"category": "cat001", "start": start}, note="checked")),
+        ("db.delete_transactions[category]", lambda: db.delete_transactions({"category": "nothing"})),
+        ("db.update_transaction_by_id", lambda: db.update_transaction_by_id(tx_id, note="checked")),
+        ("db.rebuild_rollup", db.rebuild_rollup),
+        ("db.get_fx_rates", lambda: db.get_fx_rates("USD")),
+        ("db.get_fx_rate", lambda: db.get_fx_rate("USD", end)),
+        ("db.count_missing_rates", db.count_missing_rates),
+        ("db.get_missing_rates", lambda: db.get_missing_rates(start, end)),
+        ("store.TransactionStore.load", TransactionStore.load),
+    ]
+
+def statements(name, func, conn):
+    """
+    Run one call with its result caches cleared and return the
+    statements it sent on the shared connection.
+    """
+
+    sent = []
+    db.clear_cache()
+    conn.set_trace_callback(sent.append)
+
+    try:
+        func()
+    finally:
+        conn.set_trace_callback(None)
+
+    return [sql for sql in sent if re.match(r"\s*(SELECT|WITH|UPDATE|DELETE|INSERT)\b", sql, re.I)]
+
+def problems_of(name, sql, conn):
+    """
+    Return the problems in the plan of one statement.
+    """
+
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    problems = []
+
+    # t is also the alias of a ledger view, reading the view's rows is
+    # checked on the steps of its compound query
+    aliased = re.search(r"\btransactions t\b", sql)
+
+    if name not in FULL_READS:
+        problems += [
+            f"{name}: {step}" for step in plan
+            if SCAN.search(step) and not PARTIAL.search(step)
+            and (aliased or SCAN.search(step).group(2) != "t")
+        ]
+
+    # Aggregates over transactions should never touch its table rows
+    if re.search(r"\bSUM\(", sql) and name not in FULL_READS:
+        problems += [f"{name}: not covered, {step}" for step in plan if NOT_COVERED.search(step)]
+
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="finpy query plan check")
+
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic transactions (default: 20000)")
+    parser.add_argument("--verbose", action="store_true", help="Print every statement with its plan")
+
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="finpy-plans-")
+    path = os.path.join(workdir, "finpy.db")
+
+    print(f"Building {args.rows} row ledger ...", file=sys.stderr)
+    build_ledger(path, args.rows, 20, "2015-01-01", 10, (0.1, 0.8, 0.1), 42)
+
+    # Foreign rows and rates for the conversion paths, one archived year
+    # for the ledger views
+    db.add_fx_rates([("2015-01-01", "USD", 80.0)])
+    db.add_transactions(
+        (f"2020-0{1 + i % 9}-1{i % 10}", "expense", 10 + i, "cat001", f"usd {i}", "USD")
+        for i in range(100)
+    )
+    db.archive_transactions(2016)
+
+    conn = connection.get_connection()
+    year, month = 2020, 2
+    start, end = "2020-01-01", "2020-12-31"
+    problems = []
+    checked = 0
+
+    tx_id = db.get_recent_transactions(1)[0][0]
+
+    for name, func in calls(year, month, start, end, tx_id):
+        for sql in dict.fromkeys(statements(name, func, conn)):
+            checked += 1
+            found = problems_of(name, sql, conn)
+            problems += found
+
+            if args.verbose or found:
+                print(f"-- {name}\n{' '.join(sql.split())}")
+
+                for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+                    print(f"   {row[3]}")
+
+    connection.close_connection()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{checked} statements checked")
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+
+    if problems:
+        sys.exit(1)
+
+    print("OK: no query scans transactions, every aggregate is covered")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Time every public finpy.db function and every *_cmd handler against a
+synthetic ledger, write the results as JSON and optionally compare them
+with a previous run.
+
+Usage:
+    python benchmarks/run.py --rows 100000 --output new.json
+    python benchmarks/run.py --rows 100000 --compare old.json --threshold 0.2
+"""
+
+import argparse
+import builtins
+import contextlib
+import datetime
+import inspect
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from argparse import Namespace
+from itertools import islice
+
+from ledger import build_ledger
+
+import finpy
+from finpy import connection, db, utils
+from finpy.store import TransactionStore
+from finpy.cli import commands
+
+def db_benchmarks(year, month, start, end):
+    """
+    Return (name, callable) pairs covering the public finpy.db functions.
+    """
+
+    def add_and_delete():
+        db.add_transaction("expense", 123.45, "bench", "bench")
+        tx_id = db.get_recent_transactions(1)[0][0]
+        db.delete_transaction_by_id(tx_id)
+
+    def add_many():
+        db.add_transactions(
+            (("2000-01-01", "expense", 1.0, "bench", "bench") for _ in range(1000)),
+            batch_size=1000
+        )
+        with connection.transaction() as conn:
+            conn.execute("DELETE FROM transactions WHERE date = '2000-01-01'")
+
+    def bulk_update_and_delete():
+        db.add_transactions(
+            (("2000-01-01", "expense", 1.0, "bench", "bench") for _ in range(1000)),
+            batch_size=1000
+        )
+        db.update_transactions({"category": "bench"}, amount=2.0, note="bulk")
+        db.delete_transactions({"category": "bench"})
+
+    def update_in_place():
+        row = db.get_transaction_by_id(1)
+        db.update_transaction_by_id(1, amount=row[3], category=row[4], note=row[5])
+
+    # USD rates one per day, no USD transactions, so reports are unchanged
+    first = datetime.date.fromisoformat(start) - datetime.timedelta(days=1000)
+    fx_rates = [
+        ((first + datetime.timedelta(days=i)).isoformat(), "USD", 80 + i % 7)
+        for i in range(1000)
+    ]
+
+    store = TransactionStore.load()
+
+    def first_page():
+        for _ in zip(range(100), db.iter_transactions(page_size=100)):
+            pass
+
+    return [
+        ("db.init_db", db.init_db),
+        ("db.get_summary_data", db.get_summary_data),
+        ("db.get_summary_between", lambda: db.get_summary_between(start, end)),
+        ("db.get_mon_summary_data", lambda: db.get_mon_summary_data(month, year)),
+        ("db.get_yr_summary_data", lambda: db.get_yr_summary_data(year)),
+        ("db.get_all_transactions", db.get_all_transactions),
+        ("db.iter_transactions", first_page),
+        ("db.search_transactions", lambda: list(islice(db.search_transactions("synthetic 1*", page_size=50), 50))),
+        ("db.get_monthly_report_data", lambda: db.get_monthly_report_data(month, year)),
+        ("db.get_yearly_report_data", lambda: db.get_yearly_report_data(year)),
+        ("db.get_report_data", lambda: db.get_report_data(start, end)),
+        ("db.get_report_data[no rows]", lambda: db.get_report_data(start, end, transactions=False)),
+        ("db.get_transaction_by_id", lambda: db.get_transaction_by_id(1)),
+        ("db.get_recent_transactions", lambda: db.get_recent_transactions(10)),
+        ("db.get_budget", lambda: db.get_budget(month, year)),
+        ("db.get_budget_dashboard", lambda: db.get_budget_dashboard(f"{year - 1:04d}-01", f"{year:04d}-12")),
+        ("db.get_expense_aggregation_by_category", lambda: db.get_expense_aggregation_by_category(month, year)),
+        ("db.add_transaction+delete_transaction_by_id", add_and_delete),
+        ("db.add_transactions[1000]", add_many),
+        ("db.update_transaction_by_id", update_in_place),
+        ("db.count_transactions", lambda: db.count_transactions({"start": start, "end": end, "note": "1"})),
+        ("db.update_transactions+delete_transactions[1000]", bulk_update_and_delete),
+        ("db.add_budget", lambda: db.add_budget("cat000", 1000, month, year)),
+        ("db.rebuild_rollup", db.rebuild_rollup),
+        ("db.clear_cache", db.clear_cache),
+        ("db.get_archives", db.get_archives),
+        ("db.add_fx_rates[1000]", lambda: db.add_fx_rates(fx_rates, batch_size=1000)),
+        ("db.get_fx_rates", lambda: db.get_fx_rates("USD")),
+        ("db.get_fx_rate", lambda: db.get_fx_rate("USD", end)),
+        ("store.TransactionStore.load", TransactionStore.load),
+        ("store.TransactionStore.select+sum_by", lambda: store.select(type="expense", start=start, end=end).sum_by("category")),
+    ]
+
+def cmd_benchmarks(year, month, start, end, import_file, fx_file, script_file):
+    """
+    Return (name, callable) pairs covering every *_cmd handler.
+    """
+
+    def run(func, **kwargs):
+        return lambda: func(Namespace(**{"format": "table", **kwargs}))
+
+    return [
+        ("cmd.summary_cmd", run(commands.summary_cmd, start=None, end=None)),
+        ("cmd.summary_cmd[range]", run(commands.summary_cmd, start=start, end=end)),
+        ("cmd.list_cmd[1000]", run(commands.list_cmd, limit=1000, page=100, after=None)),
+        ("cmd.list_cmd[1000, csv]", run(commands.list_cmd, limit=1000, page=100, after=None, format="csv")),
+        ("cmd.list_cmd[1000, jsonl]", run(commands.list_cmd, limit=1000, page=100, after=None, format="jsonl")),
+        ("cmd.search_cmd", run(commands.search_cmd, query=["synthetic", "1*"], type=None, category=None, start=None, end=None, limit=20, after=None)),
+        ("cmd.monthly_cmd", run(commands.monthly_cmd, month=month, year=year, plot=True)),
+        ("cmd.yearly_cmd", run(commands.yearly_cmd, year=year, cat=True, monthly=True, plot=True)),
+        ("cmd.report_cmd", run(commands.report_cmd, start=start, end=end, cat=True, plot=True, no_list=False)),
+        ("cmd.report_cmd[json]", run(commands.report_cmd, start=start, end=end, cat=False, plot=False, no_list=False, format="json")),
+        ("cmd.report_cmd[no list]", run(commands.report_cmd, start=start, end=end, cat=True, plot=False, no_list=True)),
+        ("cmd.recent_cmd", run(commands.recent_cmd, n=20)),
+        ("cmd.delete_cmd[cancelled]", run(commands.delete_cmd, id=1, where=None, dry_run=False, yes=False)),
+        ("cmd.delete_cmd[where, dry run]", run(commands.delete_cmd, id=None, where=[f"from={start}", f"to={end}"], dry_run=True, yes=False)),
+        ("cmd.update_cmd", run(commands.update_cmd, id=1, where=None, amount=None, category=None, note=["synthetic", "0"], dry_run=False, yes=False)),
+        ("cmd.add_cmd", run(commands.add_cmd, type="expense", amount=10.0, category="bench", note=["bench"], currency="INR")),
+        ("cmd.import_cmd[1000]", run(commands.import_cmd, file=import_file, input_format="csv", batch_size=5000)),
+        ("cmd.budget_set_cmd", run(commands.budget_set_cmd, amount=1000.0, month=month, year=year, category="cat000")),
+        ("cmd.budget_status_cmd", run(commands.budget_status_cmd, month=month, year=year, start=None, end=None, categories=False)),
+        ("cmd.budget_status_cmd[range]", run(commands.budget_status_cmd, month=None, year=None, start=f"{year - 1:04d}-01", end=f"{year:04d}-12", categories=False)),
+        ("cmd.budget_status_cmd[range, categories]", run(commands.budget_status_cmd, month=None, year=None, start=f"{year - 1:04d}-01", end=f"{year:04d}-12", categories=True)),
+        ("cmd.fx_import_cmd", run(commands.fx_import_cmd, file=fx_file, input_format="csv")),
+        ("cmd.fx_list_cmd", run(commands.fx_list_cmd, currency="USD")),
+        ("cmd.rollup_rebuild_cmd", run(commands.rollup_rebuild_cmd)),
+        ("cmd.archive_cmd[list]", run(commands.archive_cmd, before=None, vacuum=False)),
+        ("cmd.backup_cmd", run(commands.backup_cmd, dir=None, compress=False, keep=1, pages=4096, skip_check=False, list=False)),
+        ("cmd.backup_cmd[compress]", run(commands.backup_cmd, dir=None, compress=True, keep=1, pages=4096, skip_check=False, list=False)),
+        ("cmd.restore_cmd", run(commands.restore_cmd, snapshot=None, skip_check=False, yes=True)),
+        ("cmd.shell_cmd[1000]", run(commands.shell_cmd, file=script_file, atomic=False)),
+        ("cmd.shell_cmd[1000, atomic]", run(commands.shell_cmd, file=script_file, atomic=True)),
+        ("cmd.analyze_cmd", run(commands.analyze_cmd, type="expense", category=None, start=None, end=None)),
+    ]
+
+def time_call(func, repeat):
+    """
+    Run func repeat times and return timing statistics in seconds.
+
+    The result cache is cleared before every run so cached functions are
+    timed doing their real work.
+    """
+
+    samples = []
+
+    for _ in range(repeat):
+        db.clear_cache()
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "max": max(samples),
+        "repeat": repeat
+    }
+
+def compare(results, baseline, threshold, floor):
+    """
+    Print the median change per benchmark against a baseline run.
+
+    Benchmarks whose median grew by less than floor seconds are never
+    flagged, sub-millisecond calls are too noisy for a relative threshold.
+
+    Returns:
+        List: Names of benchmarks slower than the baseline by more than threshold
+    """
+
+    regressions = []
+
+    print(f"\n{'benchmark':55} {'old ms':>10} {'new ms':>10} {'change':>8}")
+
+    for name, new in results["results"].items():
+        old = baseline["results"].get(name)
+
+        if old is None:
+            print(f"{name:55} {'-':>10} {new['median'] * 1000:10.2f} {'new':>8}")
+            continue
+
+        change = new["median"] / old["median"] - 1 if old["median"] else 0
+        flag = ""
+
+        if change > threshold and new["median"] - old["median"] > floor:
+            regressions.append(name)
+            flag = "  REGRESSION"
+
+        print(
+            f"{name:55} {old['median'] * 1000:10.2f} {new['median'] * 1000:10.2f} "
+            f"{change:+8.1%}{flag}"
+        )
+
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="finpy benchmark suite")
+
+    parser.add_argument("--rows", type=int, default=100000, help="Synthetic transactions (default: 100000)")
+    parser.add_argument("--categories", type=int, default=20, help="Expense categories (default: 20)")
+    parser.add_argument("--start", default="2015-01-01", help="First ledger date (default: 2015-01-01)")
+    parser.add_argument("--years", type=int, default=10, help="Ledger span in years (default: 10)")
+    parser.add_argument("--mix", default="0.1,0.8,0.1", help="income,expense,investment weights")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per benchmark (default: 5)")
+    parser.add_argument("--db", help="Reuse or create the ledger at this path")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before flagging (default: 0.2)")
+    parser.add_argument("--floor", type=float, default=0.001, help="Ignore slowdowns smaller than this many seconds (default: 0.001)")
+
+    args = parser.parse_args()
+
+    type_mix = tuple(float(w) for w in args.mix.split(","))
+    workdir = tempfile.mkdtemp(prefix="finpy-bench-")
+    path = args.db or os.path.join(workdir, "ledger.db")
+
+    if os.path.exists(path):
+        connection.configure(db=path)
+        db.init_db()
+    else:
+        print(f"Building {args.rows} row ledger at {path} ...", file=sys.stderr)
+        build_ledger(path, args.rows, args.categories, args.start, args.years, type_mix, args.seed)
+
+    year = int(args.start[:4]) + args.years // 2
+    month = 6
+    start = f"{year}-02-10"
+    end = f"{year}-09-20"
+
+    import_file = os.path.join(workdir, "import.csv")
+
+    # Snapshots taken by the backup benchmarks, restored by restore_cmd
+    os.environ["FINPY_BACKUP_DIR"] = os.path.join(workdir, "backups")
+
+    with open(import_file, "w", encoding="utf-8") as fh:
+        fh.write("date,type,amount,category,note\n")
+        for i in range(1000):
+            fh.write(f"2000-01-01,expense,{i % 97 + 1},bench,import {i}\n")
+
+    # Writes in runs of four between machine-format reads
+    script_file = os.path.join(workdir, "script.txt")
+
+    with open(script_file, "w", encoding="utf-8") as fh:
+        for i in range(1000):
+            if i % 5:
+                fh.write(f"add --type expense --amount {i % 97 + 1} --category bench --note script\n")
+            else:
+                fh.write(f"--format csv monthly --month {i % 12 + 1} --year {year}\n")
+
+    fx_file = os.path.join(workdir, "fx.csv")
+
+    with open(fx_file, "w", encoding="utf-8") as fh:
+        fh.write("date,currency,rate\n")
+        for i in range(100):
+            fh.write(f"1999-{i // 28 + 1:02d}-{i % 28 + 1:02d},EUR,{90 + i % 5}\n")
+
+    # Render into memory instead of the terminal, and cancel deletions
+    from rich.console import Console
+    utils._console = Console(file=io.StringIO(), width=120, force_terminal=True)
+    builtins.input = lambda prompt="": "n"
+
+    benchmarks = db_benchmarks(year, month, start, end)
+    benchmarks += cmd_benchmarks(year, month, start, end, import_file, fx_file, script_file)
+
+    # "db.add_transaction+delete_transaction_by_id[x]" covers both functions
+    covered = set()
+    for name, _ in benchmarks:
+        covered.update(name.split(".", 1)[1].split("[")[0].split("+"))
+
+    public = {
+        name for name, obj in vars(db).items()
+        if inspect.isfunction(obj) and obj.__module__ == db.__name__ and not name.startswith("_")
+    }
+    public |= {name for name in vars(commands) if name.endswith("_cmd")}
+    public -= {"connect_db", "cached", "to_paise", "to_rupees"}
+    # Archiving would move the benchmark ledger out of the database
+    public -= {"archive_transactions"}
+
+    for name in sorted(public - covered):
+        print(f"warning: {name} is not benchmarked", file=sys.stderr)
+
+    results = {
+        "meta": {
+            "rows": args.rows,
+            "categories": args.categories,
+            "start": args.start,
+            "years": args.years,
+            "mix": type_mix,
+            "seed": args.seed,
+            "finpy": finpy.__version__,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "results": {}
+    }
+
+    # --format csv/json commands write straight to stdout
+    with open(os.devnull, "w", encoding="utf-8") as sink:
+        for name, func in benchmarks:
+            with contextlib.redirect_stdout(sink):
+                stats = time_call(func, args.repeat)
+
+            results["results"][name] = stats
+            print(f"{name:55} {stats['median'] * 1000:10.2f} ms", file=sys.stderr)
+
+    with connection.transaction() as conn:
+        conn.execute("DELETE FROM transactions WHERE category = 'bench'")
+
+    connection.close_connection()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+
+        regressions = compare(results, baseline, args.threshold, args.floor)
+
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Check the startup budget of the finpy CLI.
+
+Runs `python -X importtime -c "import finpy.cli.parser"` a few times and
+fails when the fastest run takes longer than --budget milliseconds, or
+when importing the parser pulls in a module that should only load once
+a command runs (rich, termcharts, sqlite3, finpy.db).
+
+Usage:
+    python benchmarks/startup.py --budget 8 --runs 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+MODULE = "finpy.cli.parser"
+
+# Loaded by the command handlers, never by the parser itself
+DEFERRED = ("rich", "termcharts", "sqlite3", "finpy.db", "finpy.cli.commands")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def importtime(module):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        (cumulative microseconds of the module, set of imported module names)
+    """
+
+    # Measure with cached bytecode, as an installed finpy runs
+    env = dict(os.environ)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    total = None
+    imported = set()
+
+    # import time: self [us] | cumulative | imported package
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+
+        _, cumulative, name = line[len("import time:"):].split("|")
+
+        if not cumulative.strip().isdigit():
+            continue
+
+        imported.add(name.strip())
+
+        if name.strip() == module and not name[1:].startswith(" "):
+            total = int(cumulative)
+
+    if total is None:
+        raise RuntimeError(f"{module} is missing from the -X importtime output")
+
+    return total, imported
+
+def main():
+    parser = argparse.ArgumentParser(description="finpy CLI import-time budget")
+
+    parser.add_argument("--budget", type=float, default=8.0, help="Milliseconds allowed (default: 8)")
+    parser.add_argument("--runs", type=int, default=5, help="Runs, the fastest one counts (default: 5)")
+
+    args = parser.parse_args()
+
+    runs = [importtime(MODULE) for _ in range(max(args.runs, 1))]
+    fastest = min(total for total, _ in runs) / 1000
+    imported = set().union(*(names for _, names in runs))
+
+    print(f"import {MODULE}: fastest of {len(runs)} runs {fastest:.1f} ms, budget {args.budget:.1f} ms")
+
+    problems = []
+
+    if fastest > args.budget:
+        problems.append(f"{fastest:.1f} ms is over the {args.budget:.1f} ms budget")
+
+    for name in sorted(imported):
+        if name.split(".")[0] in DEFERRED or name in DEFERRED:
+            problems.append(f"{MODULE} imports {name}, which should load lazily")
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+
+    if problems:
+        sys.exit(1)
+
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+asyncio counterparts of the public finpy.db functions.
+
+Every call runs on a bounded pool of worker threads, each with its own
+connection from finpy.connection, so the event loop never blocks on
+SQLite and readers run in parallel under WAL.
+
+Cancelling the awaiting task interrupts the SQL statement the worker is
+running (sqlite3 Connection.interrupt()), the call raises in the worker
+and any transaction() it had open is rolled back.
+
+Usage:
+    from finpy import aio
+
+    data = await aio.get_report_data("2024-01-01", "2024-03-31")
+
+    async for row in aio.iter_transactions({"category": "food"}):
+        ...
+
+    aio.shutdown()
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from finpy import db
+from finpy.connection import get_connection
+
+MAX_WORKERS = int(os.environ.get("FINPY_AIO_WORKERS", "4"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def configure(max_workers=None):
+    """
+    Set the number of worker threads, replacing the current pool.
+    """
+    global MAX_WORKERS
+
+    if max_workers is not None:
+        if max_workers <= 0:
+            raise ValueError("Worker count must be a positive number.")
+
+        MAX_WORKERS = max_workers
+
+    shutdown()
+
+def _get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS,
+                thread_name_prefix="finpy-db"
+            )
+
+        return _executor
+
+def shutdown(wait=True):
+    """
+    Stop the worker threads, their connections close with them.
+    """
+    global _executor
+
+    with _executor_lock:
+        executor, _executor = _executor, None
+
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+class _Job:
+    """
+    One call on a worker, so a cancelled caller can interrupt it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conn = None
+        self.cancelled = False
+
+    def run(self, func, args, kwargs):
+        conn = get_connection()
+
+        with self.lock:
+            if self.cancelled:
+                raise asyncio.CancelledError()
+
+            self.conn = conn
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.conn = None
+
+    def cancel(self):
+        # Only interrupt while our call is running, the worker clears
+        # conn under the lock before it can pick up another job
+        with self.lock:
+            self.cancelled = True
+
+            if self.conn is not None:
+                self.conn.interrupt()
+
+async def run(func, *args, **kwargs):
+    """
+    Run any blocking finpy function on the worker pool.
+    """
+
+    job = _Job()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(
+        _get_executor(),
+        functools.partial(job.run, func, args, kwargs)
+    )
+
+    try:
+        return await future
+    except asyncio.CancelledError:
+        job.cancel()
+        raise
+
+def _async(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run(func, *args, **kwargs)
+
+    return wrapper
+
+init_db = _async(db.init_db)
+get_summary_between = _async(db.get_summary_between)
+get_summary_data = _async(db.get_summary_data)
+get_mon_summary_data = _async(db.get_mon_summary_data)
+get_yr_summary_data = _async(db.get_yr_summary_data)
+get_all_transactions = _async(db.get_all_transactions)
+get_monthly_report_data = _async(db.get_monthly_report_data)
+get_yearly_report_data = _async(db.get_yearly_report_data)
+get_report_data = _async(db.get_report_data)
+get_transaction_by_id = _async(db.get_transaction_by_id)
+get_recent_transactions = _async(db.get_recent_transactions)
+get_budget = _async(db.get_budget)
+get_budget_dashboard = _async(db.get_budget_dashboard)
+get_expense_aggregation_by_category = _async(db.get_expense_aggregation_by_category)
+count_transactions = _async(db.count_transactions)
+add_transaction = _async(db.add_transaction)
+add_transactions = _async(db.add_transactions)
+update_transaction_by_id = _async(db.update_transaction_by_id)
+update_transactions = _async(db.update_transactions)
+delete_transaction_by_id = _async(db.delete_transaction_by_id)
+delete_transactions = _async(db.delete_transactions)
+add_budget = _async(db.add_budget)
+rebuild_rollup = _async(db.rebuild_rollup)
+clear_cache = _async(db.clear_cache)
+archive_transactions = _async(db.archive_transactions)
+get_archives = _async(db.get_archives)
+add_fx_rates = _async(db.add_fx_rates)
+get_fx_rates = _async(db.get_fx_rates)
+get_fx_rate = _async(db.get_fx_rate)
+count_missing_rates = _async(db.count_missing_rates)
+get_missing_rates = _async(db.get_missing_rates)
+
+def _page(generator_func, *args, page_size, **kwargs):
+    # A cursor belongs to the worker thread that opened it, so every page
+    # is read by its own call from a fresh generator
+    rows = []
+
+    for row in generator_func(*args, page_size=page_size, **kwargs):
+        rows.append(row)
+
+        if len(rows) == page_size:
+            break
+
+    return rows
+
+async def iter_transactions(filters=None, page_size=500, after=None, ascending=False):
+    """
+    Async generator over db.iter_transactions(), one page per worker call.
+    """
+
+    while True:
+        rows = await run(
+            _page, db.iter_transactions, filters,
+            page_size=page_size, after=after, ascending=ascending
+        )
+
+        for row in rows:
+            yield row
+
+        if len(rows) < page_size:
+            return
+
+        after = (rows[-1][1], rows[-1][0])
+
+async def search_transactions(query, filters=None, page_size=50, after=None):
+    """
+    Async generator over db.search_transactions(), one page per worker call.
+    """
+
+    while True:
+        rows = await run(
+            _page, db.search_transactions, query, filters,
+            page_size=page_size, after=after
+        )
+
+        for row in rows:
+            yield row
+
+        if len(rows) < page_size:
+            return
+
+        after = (rows[-1][7], rows[-1][0])
@@ -0,0 +1,201 @@
+"""
+Vectorized spending analytics (finpy analyze).
+
+The selected transactions are loaded once into a TransactionStore and
+its date, amount and category columns are used as NumPy arrays, every
+statistic below is then computed with array operations, never with a
+Python loop over rows.
+
+Requires NumPy: pip install finpy[analytics]
+"""
+
+import numpy as np
+
+from finpy.store import TransactionStore
+
+ROLLING_WINDOWS = (3, 6, 12)
+
+def load_columns(filters=None):
+    """
+    Read the matching transactions into column arrays.
+
+    The columns of a TransactionStore are wrapped with np.frombuffer,
+    so the arrays share its memory instead of copying it.
+
+    input: filters (dict, optional) see finpy.db._where()
+    Returns:
+        {
+            "day": int32 array, days since 1970-01-01,
+            "amount": int64 array, paise,
+            "category": uint32 array, index into "categories",
+            "categories": array of category names
+        }
+    """
+
+    store = TransactionStore.load(filters)
+
+    return {
+        "day": np.frombuffer(store.days, dtype=np.int32),
+        "amount": np.frombuffer(store.amounts, dtype=np.int64),
+        "category": np.frombuffer(store.categories, dtype=np.uint32),
+        "categories": np.array(store.category_names, dtype=str)
+    }
+
+def spend_series(columns, period="monthly"):
+    """
+    Total spend per day, week (starting Monday) or month, including empty periods.
+
+    Returns:
+        (labels, totals): datetime64 array of period starts, float64 rupees
+    """
+
+    days = columns["day"]
+
+    if len(days) == 0:
+        return np.empty(0, dtype="datetime64[D]"), np.empty(0)
+
+    if period == "daily":
+        buckets = days
+        unit = "datetime64[D]"
+    elif period == "weekly":
+        # 1970-01-01 was a Thursday, shift so weeks start on Monday
+        buckets = (days + 3) // 7
+        unit = "datetime64[W]"
+    elif period == "monthly":
+        buckets = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        unit = "datetime64[M]"
+    else:
+        raise ValueError(f"Unsupported period: {period}")
+
+    first = buckets.min()
+    totals = np.bincount(buckets - first, weights=columns["amount"]) / 100
+    labels = np.arange(first, first + len(totals))
+
+    if period == "weekly":
+        labels = (labels * 7 - 3).astype("datetime64[D]")
+    else:
+        labels = labels.astype(unit)
+
+    return labels, totals
+
+def rolling_mean(values, window):
+    """
+    Trailing mean over window periods, NaN until window periods exist.
+    """
+
+    out = np.full(len(values), np.nan)
+
+    if len(values) >= window:
+        csum = np.cumsum(np.concatenate(([0.0], values)))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+
+    return out
+
+def growth(values):
+    """
+    Relative change against the previous period, NaN where that was zero.
+    """
+
+    out = np.full(len(values), np.nan)
+
+    if len(values) > 1:
+        previous = values[:-1]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[1:] = np.where(previous != 0, (values[1:] - previous) / previous, np.nan)
+
+    return out
+
+def trend(values):
+    """
+    Least-squares line through the series.
+
+    Returns:
+        (slope, intercept, fitted): change per period, value at the first
+        period and the line evaluated at every period
+    """
+
+    if len(values) < 2:
+        level = float(values[0]) if len(values) else 0.0
+        return 0.0, level, np.full(len(values), level)
+
+    x = np.arange(len(values))
+    slope, intercept = np.polyfit(x, values, 1)
+
+    return float(slope), float(intercept), slope * x + intercept
+
+def category_stats(columns):
+    """
+    Per-category transaction count, total, median and 90th percentile size.
+
+    Returns:
+        List of tuples: (category, count, total, median, p90), largest total first
+    """
+
+    names = columns["categories"]
+
+    if len(names) == 0:
+        return []
+
+    codes = columns["category"]
+    amounts = columns["amount"]
+
+    # Sort amounts within each category, then index the quantiles of every
+    # category at once from its start offset and count
+    ordered = amounts[np.lexsort((amounts, codes))] / 100
+    counts = np.bincount(codes, minlength=len(names))
+    starts = np.cumsum(counts) - counts
+    totals = np.bincount(codes, weights=amounts, minlength=len(names)) / 100
+
+    def quantile(q):
+        pos = starts + (counts - 1) * q
+        low = np.floor(pos).astype(np.int64)
+        high = np.ceil(pos).astype(np.int64)
+        return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+    medians = quantile(0.5)
+    p90 = quantile(0.9)
+
+    return sorted(
+        zip(names.tolist(), counts.tolist(), totals.tolist(), medians.tolist(), p90.tolist()),
+        key=lambda item: item[2],
+        reverse=True
+    )
+
+def analyze(filters=None, windows=ROLLING_WINDOWS):
+    """
+    Compute every statistic shown by finpy analyze.
+
+    input: filters (dict, optional) see finpy.db._where(),
+           windows (tuple) rolling mean windows in months
+    Returns:
+        {
+            "count": int,
+            "months": datetime64[M] array,
+            "monthly": float array,
+            "rolling": {window: float array},
+            "growth": float array,
+            "trend": (slope, intercept, fitted),
+            "daily_mean": float,
+            "weekly_mean": float,
+            "categories": see category_stats()
+        }
+    """
+
+    columns = load_columns(filters)
+
+    months, monthly = spend_series(columns, "monthly")
+    _, daily = spend_series(columns, "daily")
+    _, weekly = spend_series(columns, "weekly")
+
+    return {
+        "count": len(columns["amount"]),
+        "months": months,
+        "monthly": monthly,
+        "rolling": {window: rolling_mean(monthly, window) for window in windows},
+        "growth": growth(monthly),
+        "trend": trend(monthly),
+        "daily_mean": float(daily.mean()) if len(daily) else 0.0,
+        "weekly_mean": float(weekly.mean()) if len(weekly) else 0.0,
+        "categories": category_stats(columns)
+    }
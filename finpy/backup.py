@@ -0,0 +1,467 @@
+"""
+Online backup and restore of finpy.db (finpy backup / finpy restore).
+
+Snapshots are taken with SQLite's backup API a batch of pages at a
+time, so other processes keep reading and writing while it runs. Each
+snapshot is checked with PRAGMA integrity_check, can be gzip compressed
+and gets a .sha256 file next to it (sha256sum format). Only the newest
+snapshots are kept.
+
+Archive files (finpy archive) are copied along with every snapshot as
+<snapshot>.<archive name>, and listed in the same .sha256 file.
+"""
+
+import glob
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+from datetime import datetime
+
+from finpy.connection import transaction
+from finpy.db import connect_db, clear_cache, init_db, get_archives, _main_path
+
+# Pages copied per backup step, about 16 MiB with 4 KiB pages
+PAGES = 4096
+
+# Snapshots kept by default, 0 keeps all
+KEEP = 7
+
+# gzip level, 1 is several times faster than the default for a small
+# loss in size
+COMPRESS_LEVEL = 1
+
+# <stem>-YYYYmmdd-HHMMSS.db or .db.gz, with -2, -3, ... for snapshots
+# taken within the same second
+SNAPSHOT = re.compile(r"-(\d{8}-\d{6})(?:-(\d+))?\.db(\.gz)?$")
+
+def backup_dir():
+    """
+    Return the snapshot directory: FINPY_BACKUP_DIR or backups/ next to finpy.db.
+    """
+
+    directory = os.environ.get("FINPY_BACKUP_DIR")
+
+    if directory:
+        return directory
+
+    return os.path.join(os.path.dirname(_db_path()), "backups")
+
+def _db_path():
+    path = _main_path(connect_db())
+
+    if not path:
+        raise ValueError("Backups need a database file, not an in-memory database.")
+
+    return path
+
+def _stem():
+    return os.path.splitext(os.path.basename(_db_path()))[0]
+
+def _sha256(path):
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def _check(conn):
+    """
+    Run PRAGMA integrity_check, raising ValueError on any problem.
+    """
+
+    problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+
+    if problems != ["ok"]:
+        raise ValueError("Integrity check failed: " + "; ".join(problems[:5]))
+
+def _snapshot_base(path):
+    """
+    Return a snapshot path without its .db / .db.gz extension.
+    """
+    return path[:-len(".db.gz")] if path.endswith(".gz") else path[:-len(".db")]
+
+def _read_checksums(path):
+    """
+    Read the .sha256 file of a snapshot.
+
+    Returns:
+        dict: {file name: sha256}, None when there is no checksum file
+    """
+
+    if not os.path.exists(path + ".sha256"):
+        return None
+
+    checksums = {}
+
+    with open(path + ".sha256", encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                digest, name = line.split(None, 1)
+                # sha256sum marks binary mode with a leading *
+                checksums[name.strip().lstrip("*")] = digest
+
+    return checksums
+
+def list_backups(directory=None):
+    """
+    List the snapshots of finpy.db, newest first.
+
+    Returns:
+        List of tuples: (path, size in bytes)
+    """
+
+    directory = directory or backup_dir()
+    pattern = os.path.join(glob.escape(directory), glob.escape(_stem()) + "-*.db*")
+
+    def taken(path):
+        match = SNAPSHOT.search(path)
+        return match.group(1), int(match.group(2) or 1)
+
+    paths = sorted(
+        (path for path in glob.glob(pattern) if SNAPSHOT.search(path)),
+        key=taken,
+        reverse=True
+    )
+
+    return [(path, os.path.getsize(path)) for path in paths]
+
+def _rotate(directory, keep):
+    """
+    Delete all but the newest keep snapshots, their archive copies and
+    their checksum files.
+    """
+
+    removed = []
+
+    if keep <= 0:
+        return removed
+
+    for path, _ in list_backups(directory)[keep:]:
+        names = [os.path.join(directory, name) for name in _read_checksums(path) or {}]
+
+        for name in {path, *names, path + ".sha256"}:
+            if os.path.exists(name):
+                os.remove(name)
+
+        removed.append(path)
+
+    return removed
+
+def _reserve(directory, stem):
+    """
+    Pick the name of a new snapshot and create its .part file, so two
+    backups started within the same second never write the same file.
+
+    Returns:
+        (path, part)
+    """
+
+    taken = f"{stem}-{datetime.now():%Y%m%d-%H%M%S}"
+
+    for n in range(1, 1000):
+        name = f"{taken}.db" if n == 1 else f"{taken}-{n}.db"
+        path = os.path.join(directory, name)
+
+        if os.path.exists(path) or os.path.exists(path + ".gz"):
+            continue
+
+        try:
+            os.close(os.open(path + ".part", os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            continue
+
+        return path, path + ".part"
+
+    raise ValueError(f"Too many snapshots taken at {taken} in {directory}.")
+
+def _copy(source, part, pages, progress, check):
+    """
+    Copy a database into the file part with the backup API and check it.
+    """
+
+    def step(status, remaining, total):
+        if progress is not None:
+            progress(total - remaining, total)
+
+    target = sqlite3.connect(part)
+
+    try:
+        source.backup(target, pages=pages, progress=step, sleep=0)
+
+        # A snapshot is a single file, not a WAL database
+        target.execute("PRAGMA journal_mode = DELETE")
+
+        if check:
+            _check(target)
+    except BaseException:
+        target.close()
+        os.remove(part)
+        raise
+
+    target.close()
+
+def _finish(part, path, compress):
+    """
+    Move a copied database into place, gzip compressed if asked.
+
+    Returns:
+        str: Final path
+    """
+
+    if compress:
+        path += ".gz"
+
+        with open(part, "rb") as src, gzip.open(path + ".part", "wb", compresslevel=COMPRESS_LEVEL) as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+
+        os.remove(part)
+        part = path + ".part"
+
+    os.replace(part, path)
+
+    return path
+
+def backup(directory=None, compress=False, keep=KEEP, pages=PAGES, check=True, progress=None):
+    """
+    Take a snapshot of finpy.db while it stays in use, with a copy of
+    every archive file.
+
+    input: directory (str, optional) see backup_dir(),
+           compress (bool) gzip the snapshot,
+           keep (int) snapshots to keep, 0 keeps all,
+           pages (int) pages copied per step,
+           check (bool) run PRAGMA integrity_check on the copy,
+           progress (callable, optional) called as progress(copied, total) pages
+    Returns:
+        {
+            "path": str,
+            "size": int bytes,
+            "sha256": str,
+            "archives": List of archive copy paths,
+            "removed": List of rotated out snapshot paths
+        }
+    """
+
+    if pages <= 0:
+        raise ValueError("Pages per step must be a positive number.")
+
+    archives = get_archives()
+
+    for _, archive in archives:
+        if not os.path.exists(archive):
+            raise ValueError(f"Archive file is missing: {archive}")
+
+    directory = directory or backup_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    path, part = _reserve(directory, _stem())
+    _copy(connect_db(), part, pages, progress, check)
+    path = _finish(part, path, compress)
+    copies = []
+
+    try:
+        for _, archive in archives:
+            copy = f"{_snapshot_base(path)}.{os.path.basename(archive)}"
+            source = sqlite3.connect(archive)
+
+            try:
+                _copy(source, copy + ".part", pages, None, check)
+            finally:
+                source.close()
+
+            copies.append(_finish(copy + ".part", copy, compress))
+    except BaseException:
+        for name in [path, *copies]:
+            os.remove(name)
+        raise
+
+    digest = _sha256(path)
+
+    # sha256sum format, so sha256 -c checks the archive copies too
+    with open(path + ".sha256", "w", encoding="utf-8") as fh:
+        fh.write(f"{digest}  {os.path.basename(path)}\n")
+
+        for copy in copies:
+            fh.write(f"{_sha256(copy)}  {os.path.basename(copy)}\n")
+
+    return {
+        "path": path,
+        "size": os.path.getsize(path),
+        "sha256": digest,
+        "archives": copies,
+        "removed": _rotate(directory, keep)
+    }
+
+def _unpack(path, target, checksums, check):
+    """
+    Verify one file of a snapshot against its checksum and write it,
+    decompressed, to target, then run PRAGMA integrity_check on it.
+
+    Returns:
+        str: A warning when the file has no checksum, else None
+    """
+
+    warning = None
+    name = os.path.basename(path)
+
+    if checksums is None or name not in checksums:
+        warning = f"{name} has no checksum in the .sha256 file, it was not verified."
+    elif _sha256(path) != checksums[name]:
+        raise ValueError(f"Checksum mismatch, {path} is damaged.")
+
+    opener = gzip.open if path.endswith(".gz") else open
+
+    with opener(path, "rb") as src, open(target, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+
+    if check:
+        conn = sqlite3.connect(target)
+
+        try:
+            _check(conn)
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"Could not restore {path}: {e}") from None
+        finally:
+            conn.close()
+
+    return warning
+
+def restore(path=None, check=True):
+    """
+    Replace the contents of finpy.db (and its archive files) with a snapshot.
+
+    The checksums are verified, every file is decompressed and checked
+    with PRAGMA integrity_check before finpy.db is touched, and the copy
+    into finpy.db is one write transaction, so other connections see
+    either the old or the restored ledger. The restored finpy.db is
+    checked again afterwards.
+
+    A snapshot without a .sha256 file is restored with a warning. One
+    taken before snapshots held archive copies keeps the archive files
+    next to finpy.db, and fails if one of them is missing.
+
+    input: path (str, optional) snapshot, defaults to the newest one,
+           check (bool) run PRAGMA integrity_check on every file
+    Returns:
+        {
+            "path": str restored snapshot,
+            "archives": List of restored archive paths,
+            "warnings": List of str
+        }
+    """
+
+    if path is None:
+        snapshots = list_backups()
+
+        if not snapshots:
+            raise ValueError(f"No snapshots found in {backup_dir()}.")
+
+        path = snapshots[0][0]
+
+    if not os.path.exists(path):
+        raise ValueError(f"Snapshot not found: {path}")
+
+    checksums = _read_checksums(path)
+    warnings = []
+
+    if checksums is None:
+        warnings.append(f"{path} has no .sha256 file, its checksum was not verified.")
+
+    db_path = _db_path()
+    staged = []
+
+    try:
+        source_path = db_path + ".restore"
+        staged.append(source_path)
+        warning = _unpack(path, source_path, checksums, check)
+
+        if warning and checksums is not None:
+            warnings.append(warning)
+
+        source = sqlite3.connect(source_path)
+
+        try:
+            archives = source.execute("SELECT path FROM archives").fetchall()
+        except sqlite3.OperationalError:
+            # Snapshots older than schema version 8 have no archives
+            archives = []
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"Could not restore {path}: {e}") from None
+        finally:
+            source.close()
+
+        # Archive files of the snapshot, staged next to their final name
+        installs = []
+
+        for (name,) in archives:
+            target = os.path.join(os.path.dirname(db_path), name)
+            copy = f"{_snapshot_base(path)}.{name}" + (".gz" if path.endswith(".gz") else "")
+
+            if not os.path.exists(copy):
+                if not os.path.exists(target):
+                    raise ValueError(f"The snapshot has no copy of {name} and {target} is missing.")
+
+                warnings.append(f"The snapshot has no copy of {name}, kept the current {target}.")
+                continue
+
+            staged.append(target + ".restore")
+            warning = _unpack(copy, target + ".restore", checksums, check)
+
+            if warning and checksums is not None:
+                warnings.append(warning)
+
+            installs.append((target + ".restore", target))
+
+        init_db()
+        conn = connect_db()
+        generation = conn.execute(
+            "SELECT value FROM finpy_meta WHERE key = 'generation'"
+        ).fetchone()[0]
+
+        # Attached archives would keep reading the replaced files
+        for _, schema, _ in conn.execute("PRAGMA database_list").fetchall():
+            if schema.startswith("archive_"):
+                conn.execute(f"DETACH DATABASE {schema}")
+
+        source = sqlite3.connect(source_path)
+
+        try:
+            source.backup(conn)
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f"Could not restore {path}: {e}") from None
+        finally:
+            source.close()
+
+        for staged_path, target in installs:
+            os.replace(staged_path, target)
+
+        if check:
+            _check(conn)
+    finally:
+        for staged_path in staged:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+
+    # The restored ledger may come from an older finpy
+    init_db()
+
+    # Move the generation past the replaced ledger's, so results other
+    # processes cached from it are never served again
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE finpy_meta SET value = MAX(value, ?) + 1 WHERE key = 'generation'",
+            (generation,)
+        )
+
+    clear_cache()
+
+    return {
+        "path": path,
+        "archives": [target for _, target in installs],
+        "warnings": warnings
+    }
@@ -1,36 +1,179 @@
+import sys
+import time
+from datetime import datetime
+from itertools import groupby, islice
+
 from finpy.db import (
     add_transaction, 
+    add_transactions,
     get_summary_data, 
     get_summary_between,
-    get_all_transactions, 
+    iter_transactions,
+    search_transactions,
     get_monthly_report_data, 
     get_yearly_report_data, 
     get_report_data, 
     get_transaction_by_id,
     delete_transaction_by_id,
     update_transaction_by_id,
+    count_transactions,
+    update_transactions,
+    delete_transactions,
     get_recent_transactions,
     add_budget,
-    get_budget,
-    get_expense_aggregation_by_category
+    get_budget_dashboard,
+    rebuild_rollup,
+    archive_transactions,
+    get_archives,
+    add_fx_rates,
+    get_fx_rates,
+    get_fx_rate,
+    get_missing_rates,
+    ensure_writable
+)
+
+from finpy import backup
+from finpy.utils import (
+    get_console,
+    render_chart,
+    iter_import_rows,
+    iter_fx_rows,
+    parse_currency,
+    format_amount,
+    TRANSACTION_TYPES
 )
+from finpy.cli.output import emit, TRANSACTION_FIELDS
+
+# --where KEY -> finpy.db filter key
+WHERE_KEYS = {
+    "category": "category",
+    "type": "type",
+    "from": "start",
+    "to": "end",
+    "note": "note",
+    "id": "ids"
+}
+
+def parse_where(items):
+    """
+    Turn --where KEY=VALUE arguments into a finpy.db filter dict.
+
+    Raises ValueError for unknown keys or malformed values.
+    """
+
+    filters = {}
+
+    for item in items or []:
+        key, sep, value = item.partition("=")
+        key = key.strip().lower()
+
+        if not sep or key not in WHERE_KEYS:
+            raise ValueError(
+                f"Invalid --where '{item}'. Use KEY=VALUE with KEY one of: {', '.join(WHERE_KEYS)}."
+            )
+
+        value = value.strip()
+
+        if key == "id":
+            try:
+                value = [int(tx_id) for tx_id in value.split(",") if tx_id.strip()]
+            except ValueError:
+                raise ValueError(f"Invalid --where '{item}'. Use id=1,2,3.")
+        elif key == "type":
+            value = value.lower()
+
+            if value not in TRANSACTION_TYPES:
+                raise ValueError(f"Invalid --where '{item}'. Type must be one of: {', '.join(TRANSACTION_TYPES)}.")
+        elif key == "category":
+            value = value.lower()
+
+        filters[WHERE_KEYS[key]] = value
+
+    return filters
+
+def _confirm(args, prompt):
+    """
+    Ask a y/n question on the terminal.
+
+    Scripts run by finpy shell set args.assume_no, then the question is
+    answered "n" without reading stdin.
+    Returns:
+        bool: True if the answer was y
+    """
+
+    if getattr(args, "assume_no", False):
+        print(f"{prompt}n (scripts cannot answer prompts, pass --yes)", file=sys.stderr)
+        return False
+
+    return input(prompt).lower() == "y"
+
+def _confirm_bulk(console, args, action, filters):
+    """
+    Show how many transactions a --where filter matches and ask once.
+
+    Returns:
+        bool: True if the caller should go ahead
+    """
+
+    # Refuse before asking when archived years match too
+    ensure_writable(filters)
 
-from rich.table import Table
-from rich.console import Console
+    count, total = count_transactions(filters)
 
-from finpy.utils import render_chart
+    if count == 0:
+        console.print("No transactions match.", style="yellow")
+        return False
 
-console = Console()
+    console.print(f"{count} transactions match (₹{total:.2f} in total).", style="bold yellow")
+
+    if args.dry_run:
+        console.print(f"Dry run, nothing was {action}d.", style="yellow")
+        return False
+
+    if not args.yes:
+        if not _confirm(args, f"Confirm {action} of {count} transactions (y/n): "):
+            console.print(f"{action.capitalize()} cancelled.", style="yellow")
+            return False
+
+    return True
+
+def _target(console, args):
+    """
+    Check that exactly one of an ID or --where filters was given.
+
+    Returns:
+        dict or None: The --where filters ({} for a single ID), None on error
+    """
+
+    if (args.id is None) == (not args.where):
+        console.print("Give either a transaction ID or at least one --where filter.", style="bold red")
+        return None
+
+    try:
+        return parse_where(args.where)
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return None
 
 def summary_cmd(args):
     """
     Shows financial summary (CLI layer)
     """
 
+    console = get_console()
+
     if args.start and args.end:
-        data = get_summary_between(args.start, args.end)
+        try:
+            data = get_summary_between(args.start, args.end)
+        except ValueError as e:
+            console.print(str(e), style="bold red")
+            return
     elif not args.start and not args.end:
-        data = get_summary_data()
+        try:
+            data = get_summary_data()
+        except ValueError as e:
+            console.print(str(e), style="bold red")
+            return
     else:
         console.print("Both --from and --to arguments are required.", style="bold red")
         return
@@ -53,6 +196,18 @@ def summary_cmd(args):
         investment_rate = 0
         savings_rate = 0
 
+    if args.format != "table":
+        emit(
+            args.format,
+            ("income", "expense", "investment", "savings", "net_cash_flow",
+             "expense_rate", "investment_rate", "savings_rate"),
+            [(income, expense, investment, savings, net_cash_flow,
+              expense_rate, investment_rate, savings_rate)]
+        )
+        return
+
+    from rich.table import Table
+
     table = Table(title="Financial Summary")
 
     table.add_column("Metric")
@@ -69,18 +224,163 @@ def summary_cmd(args):
 
     console.print(table)
 
-def list_cmd(_):
+def list_cmd(args):
     """
-    Lists all transactions (CLI layer)
+    Lists transactions page by page, newest first (CLI layer)
     """
 
-    entries = get_all_transactions()
+    console = get_console()
+
+    if args.page <= 0 or (args.limit is not None and args.limit <= 0):
+        console.print("Please provide positive values for --page and --limit.", style="bold red")
+        return
+
+    after = None
+
+    if args.after:
+        date, _, tx_id = args.after.rpartition(":")
+
+        try:
+            datetime.strptime(date, "%Y-%m-%d")
+        except ValueError:
+            date = None
+
+        if not date or not tx_id.isdigit():
+            console.print("Invalid --after value. Use YYYY-MM-DD:ID.", style="bold red")
+            return
 
-    if not entries:
+        after = (date, int(tx_id))
+
+    if args.format != "table":
+        emit(
+            args.format,
+            TRANSACTION_FIELDS,
+            islice(iter_transactions(page_size=args.page, after=after), args.limit)
+        )
+        return
+
+    from rich.table import Table
+
+    # Fetch one extra row past --limit to know whether more remain
+    fetch = args.limit + 1 if args.limit is not None else None
+    entries = islice(
+        iter_transactions(page_size=args.page, after=after),
+        fetch
+    )
+
+    shown = 0
+    last = None
+    more = False
+
+    while True:
+        page = list(islice(entries, args.page))
+
+        if args.limit is not None and shown + len(page) > args.limit:
+            page = page[:args.limit - shown]
+            more = True
+
+        if not page:
+            break
+
+        table = Table(title="All Transactions" if shown == 0 else None)
+
+        table.add_column("ID", justify="right")
+        table.add_column("Date")
+        table.add_column("Type")
+        table.add_column("Amount", justify="right")
+        table.add_column("Category")
+        table.add_column("Note")
+
+        for entry in page:
+            table.add_row(
+                str(entry[0]),
+                entry[1],
+                entry[2],
+                format_amount(entry[3], entry[6]),
+                entry[4],
+                entry[5] or ""
+            )
+
+        console.print(table)
+
+        shown += len(page)
+        last = page[-1]
+
+        if more:
+            break
+
+    if shown == 0:
         console.print("No transactions found.", style="yellow")
         return
 
-    table = Table(title="All Transactions")
+    if more:
+        console.print(
+            f"More transactions available, continue with --after {last[1]}:{last[0]}",
+            style="yellow"
+        )
+
+def search_cmd(args):
+    """
+    Full-text search over transaction notes and categories (CLI layer)
+    """
+
+    console = get_console()
+
+    if args.limit <= 0:
+        console.print("Please provide a positive value for --limit.", style="bold red")
+        return
+
+    after = None
+
+    if args.after:
+        rank, _, tx_id = args.after.rpartition(":")
+
+        try:
+            after = (float(rank), int(tx_id))
+        except ValueError:
+            console.print("Invalid --after value. Use RANK:ID.", style="bold red")
+            return
+
+    filters = {
+        "type": args.type,
+        "category": args.category,
+        "start": args.start,
+        "end": args.end
+    }
+
+    query = " ".join(args.query)
+
+    if args.format != "table":
+        try:
+            emit(
+                args.format,
+                TRANSACTION_FIELDS + ("rank",),
+                islice(search_transactions(query, filters, after=after), args.limit)
+            )
+        except ValueError as e:
+            console.print(str(e), style="bold red")
+        return
+
+    try:
+        # One extra row tells whether more matches remain
+        matches = list(islice(
+            search_transactions(query, filters, page_size=args.limit + 1, after=after),
+            args.limit + 1
+        ))
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
+
+    if not matches:
+        console.print("No matching transactions found.", style="yellow")
+        return
+
+    more = len(matches) > args.limit
+    matches = matches[:args.limit]
+
+    from rich.table import Table
+
+    table = Table(title=f"Transactions matching '{query}'")
 
     table.add_column("ID", justify="right")
     table.add_column("Date")
@@ -89,27 +389,47 @@ def list_cmd(_):
     table.add_column("Category")
     table.add_column("Note")
 
-    for entry in entries:
+    for entry in matches:
         table.add_row(
             str(entry[0]),
             entry[1],
             entry[2],
-            f"₹{entry[3]:.2f}",
+            format_amount(entry[3], entry[6]),
             entry[4],
             entry[5] or ""
         )
 
     console.print(table)
 
+    if more:
+        last = matches[-1]
+        console.print(
+            f"More matches available, continue with --after={last[7]!r}:{last[0]}",
+            style="yellow"
+        )
+
 def monthly_cmd(args):
     """
     Generates monthly report (CLI layer)
     """
 
-    data = get_monthly_report_data(args.month, args.year)
+    console = get_console()
+
+    try:
+        data = get_monthly_report_data(args.month, args.year)
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
+
     total_expense = data["total"]
     rows = data['by_category']
 
+    if args.format != "table":
+        emit(args.format, ("category", "amount"), rows)
+        return
+
+    from rich.table import Table
+
     if not rows:
         console.print("No transactions found for this month.", style="yellow")
         return
@@ -141,12 +461,27 @@ def yearly_cmd(args):
     Generates yearly report (CLI layer)
     """
 
-    data = get_yearly_report_data(args.year)
+    console = get_console()
+
+    try:
+        data = get_yearly_report_data(args.year)
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
 
     total_expense = data["total"]
     by_category = data["by_category"]
     by_month = data["by_month"]
 
+    if args.format != "table":
+        if args.monthly:
+            emit(args.format, ("month", "amount"), by_month)
+        else:
+            emit(args.format, ("category", "amount"), by_category)
+        return
+
+    from rich.table import Table
+
     if not total_expense:
         console.print("No transactions found for this year.", style="yellow")
         return
@@ -204,8 +539,34 @@ def report_cmd(args):
     Generates expense report for a date range (CLI layer)
     """
 
+    console = get_console()
+
+    if args.format != "table" and not args.no_list:
+        try:
+            start = datetime.strptime(args.start, "%Y-%m-%d")
+            end = datetime.strptime(args.end, "%Y-%m-%d")
+        except ValueError:
+            console.print("Invalid date format. Use YYYY-MM-DD.", style="bold red")
+            return
+
+        if start > end:
+            console.print("Start date cannot be after end date.", style="bold red")
+            return
+
+        emit(
+            args.format,
+            TRANSACTION_FIELDS,
+            iter_transactions({"start": args.start, "end": args.end}, ascending=True)
+        )
+        return
+
     try:
-        data = get_report_data(args.start, args.end)
+        data = get_report_data(
+            args.start,
+            args.end,
+            transactions=not args.no_list,
+            by_category=args.cat or args.format != "table"
+        )
     except ValueError as e:
         console.print(str(e), style="bold red")
         return
@@ -214,6 +575,12 @@ def report_cmd(args):
     all_transactions = data["all_transactions"]
     by_category = data["by_category"]
 
+    if args.format != "table":
+        emit(args.format, ("category", "amount"), by_category)
+        return
+
+    from rich.table import Table
+
     if not total_expense:
         console.print("No transactions found for this date range.", style="yellow")
         return
@@ -234,7 +601,7 @@ def report_cmd(args):
                 str(entry[0]),
                 entry[1],
                 entry[2],
-                f"₹{entry[3]:.2f}",
+                format_amount(entry[3], entry[6]),
                 entry[4],
                 entry[5] or ""
             )
@@ -259,9 +626,29 @@ def report_cmd(args):
 
 def delete_cmd(args):
     """
-    Deletes a transaction by ID (CLI layer)
+    Deletes a transaction by ID, or every transaction matching --where (CLI layer)
     """
 
+    console = get_console()
+
+    filters = _target(console, args)
+
+    if filters is None:
+        return
+
+    if filters:
+        try:
+            if not _confirm_bulk(console, args, "delete", filters):
+                return
+
+            deleted = delete_transactions(filters)
+        except ValueError as e:
+            console.print(str(e), style="bold red")
+            return
+
+        console.print(f"{deleted} transactions deleted.", style="bold green")
+        return
+
     tx_id = args.id
 
     row = get_transaction_by_id(tx_id)
@@ -273,15 +660,24 @@ def delete_cmd(args):
         )
         return
 
+    try:
+        ensure_writable({"ids": [tx_id]})
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
+
     console.print("Transaction to delete:", style="bold yellow")
     console.print(row)
 
-    confirm = input("Confirm deletion (y/n): ")
-
-    if confirm.lower() != "y":
-        console.print("Deletion cancelled.", style="yellow")
+    if args.dry_run:
+        console.print("Dry run, nothing was deleted.", style="yellow")
         return
 
+    if not args.yes:
+        if not _confirm(args, "Confirm deletion (y/n): "):
+            console.print("Deletion cancelled.", style="yellow")
+            return
+
     success = delete_transaction_by_id(tx_id)
 
     if success:
@@ -292,21 +688,54 @@ def delete_cmd(args):
 
 def update_cmd(args):
     """
-    Updates a transaction by ID (CLI layer)
+    Updates a transaction by ID, or every transaction matching --where (CLI layer)
     """
 
+    console = get_console()
+
+    filters = _target(console, args)
+
+    if filters is None:
+        return
+
     tx_id = args.id
 
     note_text = None
     if args.note:
         note_text = " ".join(args.note)
 
-    success = update_transaction_by_id(
-        tx_id,
-        amount=args.amount,
-        category=args.category,
-        note=note_text
-    )
+    if filters:
+        if args.amount is None and args.category is None and note_text is None:
+            console.print("Nothing to update, give --amount, --category or --note.", style="bold red")
+            return
+
+        try:
+            if not _confirm_bulk(console, args, "update", filters):
+                return
+
+            updated = update_transactions(
+                filters,
+                amount=args.amount,
+                category=args.category,
+                note=note_text
+            )
+        except ValueError as e:
+            console.print(str(e), style="bold red")
+            return
+
+        console.print(f"{updated} transactions updated.", style="bold green")
+        return
+
+    try:
+        success = update_transaction_by_id(
+            tx_id,
+            amount=args.amount,
+            category=args.category,
+            note=note_text
+        )
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
 
     if not success:
         console.print(
@@ -322,26 +751,107 @@ def add_cmd(args):
     CLI layer for adding transaction
     """
 
+    console = get_console()
+
     note_text = ""
 
     if args.note:
         note_text = " ".join(args.note)
 
+    try:
+        currency = parse_currency(args.currency)
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
+
     success = add_transaction(
         tx_type=args.type,
         amount=args.amount,
         category=args.category.strip().lower(),
-        note=note_text
+        note=note_text,
+        currency=currency
     )
 
     if success:
         console.print("Transaction added successfully.", style="bold green")
 
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        if get_fx_rate(currency, today) is None:
+            console.print(
+                f"No {currency} exchange rate on or before {today}, reports that "
+                "include this transaction will fail until one is imported with: "
+                "finpy fx import <file>",
+                style="yellow"
+            )
+
+def import_cmd(args):
+    """
+    Bulk imports transactions from a CSV/JSONL file or stdin (CLI layer)
+    """
+
+    console = get_console()
+
+    path = args.file
+    fmt = args.input_format
+
+    if fmt is None:
+        fmt = "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+    if args.batch_size <= 0:
+        console.print("Please provide a positive batch size.", style="bold red")
+        return
+
+    try:
+        fh = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    except OSError as e:
+        console.print(f"Could not open {path}: {e}", style="bold red")
+        return
+
+    start = time.perf_counter()
+
+    # Earlier batches stay committed when a record is rejected
+    committed = [0]
+
+    try:
+        count = add_transactions(
+            iter_import_rows(fh, fmt),
+            batch_size=args.batch_size,
+            progress=lambda count: committed.__setitem__(0, count)
+        )
+    except ValueError as e:
+        console.print(
+            f"Import stopped: {e} {committed[0]} transactions were imported before it.",
+            style="bold red"
+        )
+        return
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else count
+
+    console.print(
+        f"Imported {count} transactions in {elapsed:.2f}s ({rate:,.0f} rows/s).",
+        style="bold green"
+    )
+
+    for currency, missing, first, last in get_missing_rates():
+        console.print(
+            f"{missing} {currency} transactions from {first} to {last} have no "
+            "exchange rate on or before their date, reports that include them "
+            "will fail until rates are imported with: finpy fx import <file>",
+            style="yellow"
+        )
+
 def recent_cmd(args):
     """
     Shows recent transactions (CLI layer)
     """
 
+    console = get_console()
+
     n = args.n
 
     if n <= 0:
@@ -350,10 +860,16 @@ def recent_cmd(args):
     
     transactions = get_recent_transactions(n)
 
+    if args.format != "table":
+        emit(args.format, TRANSACTION_FIELDS, transactions)
+        return
+
     if not transactions:
         console.print("No transactions found.", style="yellow")
         return
-    
+
+    from rich.table import Table
+
     table = Table(title=f"Recent {n} Transactions")
     table.add_column("ID", justify="right")
     table.add_column("Date")
@@ -366,7 +882,7 @@ def recent_cmd(args):
             str(entry[0]),
             entry[1],
             entry[2],
-            f"₹{entry[3]:.2f}",
+            format_amount(entry[3], entry[6]),
             entry[4],
             entry[5] or ""
         )
@@ -377,6 +893,8 @@ def budget_set_cmd(args):
     Sets monthly budget (CLI layer)
     """
 
+    console = get_console()
+
     amount = args.amount
     category = args.category.strip().lower()
     if amount <= 0:
@@ -395,100 +913,510 @@ def budget_set_cmd(args):
     else:
         console.print("Failed to set budget.", style="bold red")
 
+def _budget_status(usage_pct):
+    """
+    Return the status label for a budget usage percentage.
+    """
+
+    if usage_pct < 50:
+        return "On Track"
+    elif usage_pct < 100:
+        return "Caution"
+    else:
+        return "Over Budget"
+
+def _budget_lines(rows):
+    """
+    Add usage % and status to get_budget_dashboard() rows.
+    """
+
+    for year, month, cat, budget_amt, spent_amt, remaining_amt, carry, ytd_budget, ytd_spent in rows:
+        usage_pct = (spent_amt / budget_amt) * 100 if budget_amt > 0 else 0
+
+        yield (
+            year, month, cat, budget_amt, spent_amt, remaining_amt,
+            carry, ytd_budget, ytd_spent, usage_pct, _budget_status(usage_pct)
+        )
+
+BUDGET_STATUS_STYLE = {"On Track": "green", "Caution": "yellow", "Over Budget": "red"}
+
+def _budget_total_row(total_budget, total_spent, leading=1):
+    """
+    Cells of the TOTAL row of a budget table.
+
+    input: leading (int) columns before the budget, the first says TOTAL
+    """
+
+    total_usage_pct = (total_spent / total_budget) * 100 if total_budget > 0 else 0
+
+    return (
+        "[bold]TOTAL[/bold]",
+        *[""] * (leading - 1),
+        f"[bold]₹{total_budget:.2f}[/bold]",
+        f"[bold]₹{total_spent:.2f}[/bold]",
+        f"[bold]₹{total_budget - total_spent:.2f}[/bold]",
+        "",
+        "",
+        "",
+        f"[bold]{total_usage_pct:.2f}%[/bold]",
+        ""
+    )
+
+def _budget_table(title, lines):
+    """
+    Build the table of one month's _budget_lines(), one row per category.
+    """
+
+    from rich.table import Table
+
+    table = Table(title=title)
+
+    table.add_column("Category", style="cyan")
+    table.add_column("Budget Amount", justify="right", style="green")
+    table.add_column("Spent", justify="right", style="red")
+    table.add_column("Remaining", justify="right")
+    table.add_column("Carry-over", justify="right")
+    table.add_column("YTD Budget", justify="right", style="green")
+    table.add_column("YTD Spent", justify="right", style="red")
+    table.add_column("Usage %", style="bold", justify="right")
+    table.add_column("Status", style="bold", justify="center")
+
+    total_budget = 0
+    total_spent = 0
+
+    for _, _, cat, budget_amt, spent_amt, remaining_amt, carry, ytd_budget, ytd_spent, usage_pct, label in lines:
+        total_budget += budget_amt
+        total_spent += spent_amt
+
+        # ---- Remaining formatting ----
+        color = "red" if remaining_amt < 0 else "yellow"
+
+        table.add_row(
+            cat,
+            f"₹{budget_amt:.2f}",
+            f"₹{spent_amt:.2f}",
+            f"[{color}]₹{remaining_amt:.2f}[/{color}]",
+            f"₹{carry:.2f}",
+            f"₹{ytd_budget:.2f}",
+            f"₹{ytd_spent:.2f}",
+            f"{usage_pct:.2f}%",
+            f"[{BUDGET_STATUS_STYLE[label]}]{label}[/{BUDGET_STATUS_STYLE[label]}]"
+        )
+
+    # ---- Summary Row ----
+    table.add_section()
+    table.add_row(*_budget_total_row(total_budget, total_spent))
+
+    return table
+
 def budget_status_cmd(args):
     """
-    Shows budget status for a given month and year (CLI layer)
+    Shows budget against spend for a month or a range of months (CLI layer)
     """
 
-    month = args.month
-    year = args.year
+    console = get_console()
 
     # ---- Input validation ----
-    if month < 1 or month > 12:
-        console.print("Please provide a valid month (1-12).", style="bold red")
+    if args.start or args.end:
+        if args.month is not None or args.year is not None:
+            console.print("Use either --month/--year or --from/--to, not both.", style="bold red")
+            return
+
+        start = args.start or args.end
+        end = args.end or args.start
+    elif args.month is not None and args.year is not None:
+        if args.month < 1 or args.month > 12:
+            console.print("Please provide a valid month (1-12).", style="bold red")
+            return
+
+        start = end = f"{args.year:04d}-{args.month:02d}"
+    else:
+        console.print("Give --month and --year, or --from/--to (YYYY-MM).", style="bold red")
         return
 
+    # ---- One query for every month and category ----
     try:
-        # ---- Fetch data from service layer ----
-        budgets = get_budget(month=month, year=year)
+        rows = get_budget_dashboard(start, end)
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
 
-        if not budgets:
-            console.print("No budgets found for this month.", style="yellow")
-            return
+    if args.format != "table":
+        emit(
+            args.format,
+            ("year", "month", "category", "budget", "spent", "remaining",
+             "carry_over", "ytd_budget", "ytd_spent", "usage", "status"),
+            _budget_lines(rows)
+        )
+        return
 
-        expenses = get_expense_aggregation_by_category(month=month, year=year)
+    if not rows:
+        console.print("No budgets found for this period.", style="yellow")
+        return
 
-        # Normalize expense categories
-        expense_map = {
-            cat.strip().lower(): amt
-            for cat, amt in expenses
-        }
+    # ---- One table per month, each printed as soon as it is built ----
+    if start == end or args.categories:
+        for (year, month), lines in groupby(_budget_lines(rows), key=lambda line: line[:2]):
+            console.print(_budget_table(f"Budget Status for {month}/{year}", lines))
 
-        # ---- Create table ----
-        table = Table(title=f"Budget Status for {month}/{year}")
+        return
 
-        table.add_column("Category", style="cyan")
-        table.add_column("Budget Amount", justify="right", style="green")
-        table.add_column("Spent", justify="right", style="red")
-        table.add_column("Remaining", justify="right")
-        table.add_column("Usage %", style="bold", justify="right")
-        table.add_column("Status", style="bold", justify="center")
+    # ---- A range: one row per month, every category added up ----
+    from rich.table import Table
+
+    table = Table(title=f"Budget Status from {start} to {end}")
+
+    table.add_column("Month")
+    table.add_column("Categories", justify="right")
+    table.add_column("Over Budget", justify="right", style="red")
+    table.add_column("Budget Amount", justify="right", style="green")
+    table.add_column("Spent", justify="right", style="red")
+    table.add_column("Remaining", justify="right")
+    table.add_column("Carry-over", justify="right")
+    table.add_column("YTD Budget", justify="right", style="green")
+    table.add_column("YTD Spent", justify="right", style="red")
+    table.add_column("Usage %", style="bold", justify="right")
+    table.add_column("Status", style="bold", justify="center")
+
+    total_budget = 0
+    total_spent = 0
+
+    for (year, month), lines in groupby(_budget_lines(rows), key=lambda line: line[:2]):
+        lines = list(lines)
+        budget_amt, spent_amt, remaining_amt, carry, ytd_budget, ytd_spent = (
+            sum(column) for column in list(zip(*lines))[3:9]
+        )
+        over = sum(1 for line in lines if line[10] == "Over Budget")
+        usage_pct = (spent_amt / budget_amt) * 100 if budget_amt > 0 else 0
+        label = _budget_status(usage_pct)
 
-        total_budget = 0
-        total_spent = 0
+        total_budget += budget_amt
+        total_spent += spent_amt
 
-        # ---- Populate rows ----
-        for cat, budget_amt in budgets:
-            normalized_cat = cat.strip().lower()
+        color = "red" if remaining_amt < 0 else "yellow"
 
-            spent_amt = expense_map.get(normalized_cat, 0)
-            remaining_amt = budget_amt - spent_amt
-            usage_pct = (spent_amt / budget_amt) * 100 if budget_amt > 0 else 0
+        table.add_row(
+            f"{year:04d}-{month:02d}",
+            str(len(lines)),
+            str(over),
+            f"₹{budget_amt:.2f}",
+            f"₹{spent_amt:.2f}",
+            f"[{color}]₹{remaining_amt:.2f}[/{color}]",
+            f"₹{carry:.2f}",
+            f"₹{ytd_budget:.2f}",
+            f"₹{ytd_spent:.2f}",
+            f"{usage_pct:.2f}%",
+            f"[{BUDGET_STATUS_STYLE[label]}]{label}[/{BUDGET_STATUS_STYLE[label]}]"
+        )
 
-            total_budget += budget_amt
-            total_spent += spent_amt
+    table.add_section()
+    table.add_row(*_budget_total_row(total_budget, total_spent, leading=3))
 
-            # ---- Status logic ----
-            if usage_pct < 50:
-                status = "[green]On Track[/green]"
-            elif usage_pct < 100:
-                status = "[yellow]Caution[/yellow]"
-            else:
-                status = "[red]Over Budget[/red]"
+    console.print(table)
+    console.print("Add --categories for every category of every month.", style="yellow")
 
-            # ---- Remaining formatting ----
-            if remaining_amt < 0:
-                remaining_display = f"[red]₹{remaining_amt:.2f}[/red]"
-            else:
-                remaining_display = f"[yellow]₹{remaining_amt:.2f}[/yellow]"
+def fx_import_cmd(args):
+    """
+    Imports exchange rates from a CSV/JSONL file or stdin (CLI layer)
+    """
 
-            table.add_row(
-                normalized_cat,
-                f"₹{budget_amt:.2f}",
-                f"₹{spent_amt:.2f}",
-                remaining_display,
-                f"{usage_pct:.2f}%",
-                status
-            )
+    console = get_console()
+
+    path = args.file
+    fmt = args.input_format
 
-        # ---- Summary Row ----
-        total_remaining = total_budget - total_spent
-        total_usage_pct = (
-            (total_spent / total_budget) * 100 if total_budget > 0 else 0
+    if fmt is None:
+        fmt = "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+
+    try:
+        fh = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    except OSError as e:
+        console.print(f"Could not open {path}: {e}", style="bold red")
+        return
+
+    # Earlier batches stay committed when a record is rejected
+    committed = [0]
+
+    try:
+        count = add_fx_rates(
+            iter_fx_rows(fh, fmt),
+            progress=lambda count: committed.__setitem__(0, count)
+        )
+    except ValueError as e:
+        console.print(
+            f"Import stopped: {e} {committed[0]} exchange rates were imported before it.",
+            style="bold red"
         )
+        return
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
 
-        table.add_section()
+    console.print(f"Imported {count} exchange rates.", style="bold green")
 
-        table.add_row(
-            "[bold]TOTAL[/bold]",
-            f"[bold]₹{total_budget:.2f}[/bold]",
-            f"[bold]₹{total_spent:.2f}[/bold]",
-            f"[bold]₹{total_remaining:.2f}[/bold]",
-            f"[bold]{total_usage_pct:.2f}%[/bold]",
-            ""
+def fx_list_cmd(args):
+    """
+    Lists stored exchange rates (CLI layer)
+    """
+
+    console = get_console()
+
+    try:
+        rates = get_fx_rates(args.currency)
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
+
+    if args.format != "table":
+        emit(args.format, ("currency", "date", "rate"), rates)
+        return
+
+    if not rates:
+        console.print("No exchange rates found.", style="yellow")
+        return
+
+    from rich.table import Table
+
+    table = Table(title="Exchange Rates (₹ per unit)")
+    table.add_column("Currency")
+    table.add_column("Date")
+    table.add_column("Rate", justify="right")
+
+    for currency, rate_date, rate in rates:
+        table.add_row(currency, rate_date, f"{rate:.4f}")
+
+    console.print(table)
+
+def rollup_rebuild_cmd(_):
+    """
+    Rebuilds the monthly rollup table from raw transactions (CLI layer)
+    """
+
+    console = get_console()
+
+    try:
+        rows = rebuild_rollup()
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
+
+    console.print(f"Monthly rollup rebuilt ({rows} entries).", style="bold green")
+
+def archive_cmd(args):
+    """
+    Moves closed years into per-year archive files, or lists them (CLI layer)
+    """
+
+    console = get_console()
+
+    if args.before is None:
+        archives = get_archives()
+
+        if not archives:
+            console.print("No archived years.", style="yellow")
+            return
+
+        for year, path in archives:
+            console.print(f"{year}  {path}")
+
+        return
+
+    try:
+        moved = archive_transactions(args.before, vacuum=args.vacuum)
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
+
+    if not moved:
+        console.print(f"No transactions before {args.before} to archive.", style="yellow")
+        return
+
+    for year, count, path in moved:
+        console.print(f"{year}: {count} transactions moved to {path}")
+
+    console.print(f"Archived {sum(count for _, count, _ in moved)} transactions.", style="bold green")
+
+def backup_cmd(args):
+    """
+    Takes a snapshot of the database, or lists snapshots (CLI layer)
+    """
+
+    console = get_console()
+
+    if args.list:
+        snapshots = backup.list_backups(args.dir)
+
+        if not snapshots:
+            console.print("No snapshots found.", style="yellow")
+            return
+
+        for path, size in snapshots:
+            console.print(f"{path}  {size / 1048576:.1f} MiB")
+
+        return
+
+    start = time.perf_counter()
+
+    options = {
+        "compress": args.compress,
+        "keep": args.keep,
+        "pages": args.pages,
+        "check": not args.skip_check
+    }
+
+    try:
+        if args.format == "table":
+            from rich.progress import Progress
+
+            with Progress(console=console, transient=True) as progress:
+                task = progress.add_task("Backing up", total=None)
+                result = backup.backup(
+                    args.dir,
+                    progress=lambda copied, total: progress.update(task, completed=copied, total=total),
+                    **options
+                )
+        else:
+            result = backup.backup(args.dir, **options)
+    except (ValueError, OSError) as e:
+        console.print(f"Backup failed: {e}", style="bold red")
+        return
+
+    elapsed = time.perf_counter() - start
+
+    console.print(
+        f"Saved {result['path']} ({result['size'] / 1048576:.1f} MiB) in {elapsed:.1f}s.",
+        style="bold green"
+    )
+
+    for path in result["archives"]:
+        console.print(f"Saved archive copy {path}")
+
+    for path in result["removed"]:
+        console.print(f"Removed old snapshot {path}")
+
+def restore_cmd(args):
+    """
+    Replaces the database with a snapshot (CLI layer)
+    """
+
+    console = get_console()
+
+    if not args.yes:
+        target = args.snapshot or "the newest snapshot"
+
+        if not _confirm(args, f"Replace all current data with {target} (y/n): "):
+            console.print("Restore cancelled.", style="yellow")
+            return
+
+    try:
+        result = backup.restore(args.snapshot, check=not args.skip_check)
+    except (ValueError, OSError) as e:
+        console.print(f"Restore failed: {e}", style="bold red")
+        return
+
+    for warning in result["warnings"]:
+        console.print(warning, style="yellow")
+
+    console.print(f"Restored {result['path']}.", style="bold green")
+
+    for path in result["archives"]:
+        console.print(f"Restored archive {path}")
+
+def analyze_cmd(args):
+    """
+    Shows spending trends and transaction size statistics (CLI layer)
+    """
+
+    from rich.table import Table
+    console = get_console()
+
+    try:
+        from finpy.analytics import analyze
+    except ImportError:
+        console.print("finpy analyze needs NumPy: pip install finpy[analytics]", style="bold red")
+        return
+
+    filters = {
+        "type": args.type,
+        "category": args.category,
+        "start": args.start,
+        "end": args.end
+    }
+
+    try:
+        data = analyze(filters)
+    except ValueError as e:
+        console.print(str(e), style="bold red")
+        return
+
+    if not data["count"]:
+        console.print("No transactions found for this selection.", style="yellow")
+        return
+
+    def fmt(value, pattern="₹{:.2f}"):
+        return "-" if value != value else pattern.format(value)
+
+    windows = sorted(data["rolling"])
+
+    month_table = Table(title=f"Monthly {args.type.capitalize()} Trend")
+    month_table.add_column("Month")
+    month_table.add_column("Amount", justify="right")
+    month_table.add_column("MoM", justify="right")
+
+    for window in windows:
+        month_table.add_column(f"{window}m Avg", justify="right")
+
+    month_table.add_column("Trend", justify="right")
+
+    slope, _, fitted = data["trend"]
+
+    for i, month in enumerate(data["months"]):
+        month_table.add_row(
+            str(month),
+            fmt(data["monthly"][i]),
+            fmt(data["growth"][i] * 100, "{:+.1f}%"),
+            *(fmt(data["rolling"][window][i]) for window in windows),
+            fmt(fitted[i])
         )
 
-        console.print(table)
+    console.print(month_table)
+
+    cat_table = Table(title="Transaction Size by Category")
+    cat_table.add_column("Category")
+    cat_table.add_column("Count", justify="right")
+    cat_table.add_column("Total", justify="right")
+    cat_table.add_column("Median", justify="right")
+    cat_table.add_column("P90", justify="right")
+
+    for category, count, total, median, p90 in data["categories"]:
+        cat_table.add_row(category, str(count), fmt(total), fmt(median), fmt(p90))
+
+    console.print(cat_table)
+
+    console.print(
+        f"Average per day: ₹{data['daily_mean']:.2f}, "
+        f"per week: ₹{data['weekly_mean']:.2f}, "
+        f"trend: {'+' if slope >= 0 else '-'}₹{abs(slope):.2f} per month",
+        style="green"
+    )
+
+def shell_cmd(args):
+    """
+    Runs many commands in one process, from a file, stdin or a prompt (CLI layer)
+    """
+
+    from finpy.cli import shell
+
+    status = shell.run(args.file, atomic=args.atomic)
+
+    if status:
+        sys.exit(status)
+
+def serve_cmd(args):
+    """
+    Runs the finpy server on a Unix socket (CLI layer)
+    """
+
+    from finpy.cli.daemon import serve
 
-    except Exception as e:
-        console.print(f"Error retrieving budget status: {e}", style="bold red")
\ No newline at end of file
+    serve(args.socket)
\ No newline at end of file
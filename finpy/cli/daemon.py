@@ -0,0 +1,209 @@
+"""
+finpy serve: a warm process that answers CLI commands over a Unix socket.
+
+Protocol: the client sends one JSON line
+
+    {"argv": ["summary", "--from", ...], "width": 120, "color": true}
+
+and the server replies with one JSON line
+
+    {"stdout": "<rendered text>", "stderr": "<messages>", "status": 0}
+
+The server parses argv with the regular argparse tree and runs the same
+*_cmd handlers, so every subcommand works identically in both modes.
+Commands that need the client's terminal or files run locally instead.
+"""
+
+import json
+import os
+import signal
+import socket
+import sys
+
+# Prompts for confirmation, or reads files/stdin relative to the client
+LOCAL_COMMANDS = {"delete", "update", "import", "fx", "archive", "backup", "restore", "shell", "serve"}
+
+def socket_path():
+    """
+    Return the socket path of the server for the current database.
+    """
+    from finpy.connection import DB
+
+    return os.environ.get("FINPY_SOCKET") or os.path.abspath(DB) + ".sock"
+
+# Global options that take a separate value
+VALUE_OPTIONS = {"--format", "-f", "--file"}
+
+# Global options that run a script, always locally like shell
+SCRIPT_OPTIONS = {"-f", "--file"}
+
+def _global_options(argv):
+    """
+    Split argv into the global options before the subcommand and the rest.
+    """
+    options = []
+    args = iter(argv)
+
+    for arg in args:
+        if not arg.startswith("-"):
+            return options, [arg, *args]
+
+        options.append(arg)
+
+        if arg in VALUE_OPTIONS:
+            options.append(next(args, None))
+
+    return options, []
+
+def _command_name(argv):
+    """
+    Return the subcommand in argv, skipping global options.
+    """
+    _, rest = _global_options(argv)
+
+    return rest[0] if rest else None
+
+def wants_daemon(argv):
+    """
+    Return True if argv (or FINPY_DAEMON) asks to forward to the server.
+    """
+    options, _ = _global_options(argv)
+    requested = os.environ.get("FINPY_DAEMON") == "1" or "--daemon" in options
+
+    script = any(option.split("=")[0] in SCRIPT_OPTIONS for option in options if option)
+
+    return requested and not script and _command_name(argv) not in LOCAL_COMMANDS
+
+def forward(argv):
+    """
+    Run argv on the server and print its output.
+
+    Returns:
+        int: Exit status of the command, or None if no server is reachable
+    """
+
+    path = socket_path()
+    argv = [arg for arg in argv if arg != "--daemon"]
+
+    try:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(path)
+    except OSError:
+        return None
+
+    try:
+        width = os.get_terminal_size(sys.stdout.fileno()).columns
+    except OSError:
+        width = 80
+
+    request = {"argv": argv, "width": width, "color": sys.stdout.isatty()}
+
+    with client, client.makefile("rwb") as stream:
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+        response = json.loads(stream.readline())
+
+    sys.stdout.write(response["stdout"])
+    sys.stdout.flush()
+    sys.stderr.write(response["stderr"])
+    sys.stderr.flush()
+
+    return response["status"]
+
+def _handle(parser, request):
+    """
+    Run one request and return its response dict.
+    """
+
+    import io
+    import traceback
+    from contextlib import redirect_stderr, redirect_stdout
+
+    from rich.console import Console
+
+    from finpy import utils
+
+    out, err = io.StringIO(), io.StringIO()
+    utils._console = Console(
+        file=out,
+        width=request.get("width", 80),
+        force_terminal=request.get("color", False),
+        no_color=not request.get("color", False)
+    )
+    status = 0
+
+    with redirect_stdout(out), redirect_stderr(err):
+        try:
+            args = parser.parse_args(request["argv"])
+
+            if args.format != "table":
+                from finpy.cli.output import PlainConsole
+                utils._console = PlainConsole()
+
+            if _command_name(request["argv"]) in LOCAL_COMMANDS:
+                print("This command cannot run through the server.", file=sys.stderr)
+                status = 2
+            elif hasattr(args, "func"):
+                args.func(args)
+            else:
+                parser.print_help()
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+
+    return {"stdout": out.getvalue(), "stderr": err.getvalue(), "status": status}
+
+def serve(path=None):
+    """
+    Accept requests on the Unix socket until interrupted.
+    """
+
+    from finpy.cli.parser import build_parser
+    from finpy.db import init_db
+
+    path = path or socket_path()
+    parser = build_parser()
+    init_db()
+
+    if os.path.exists(path):
+        os.unlink(path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(16)
+
+    # Remove the socket on `kill` as well as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    print(f"finpy server listening on {path}", file=sys.stderr)
+
+    try:
+        while True:
+            conn, _ = server.accept()
+
+            with conn, conn.makefile("rwb") as stream:
+                line = stream.readline()
+
+                if not line:
+                    continue
+
+                try:
+                    response = _handle(parser, json.loads(line))
+                except (ValueError, KeyError) as e:
+                    response = {"stdout": "", "stderr": f"Bad request: {e}\n", "status": 2}
+
+                try:
+                    stream.write(json.dumps(response).encode() + b"\n")
+                    stream.flush()
+                except OSError:
+                    # Client went away before reading the answer
+                    pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+        if os.path.exists(path):
+            os.unlink(path)
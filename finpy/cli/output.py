@@ -0,0 +1,87 @@
+"""
+Machine-readable output for finpy --format json/jsonl/csv/tsv.
+
+Rows are written to stdout as they are produced, so a command that
+passes a cursor-backed generator never holds its result in memory.
+Nothing here imports rich.
+"""
+
+import csv
+import json
+import os
+import sys
+from itertools import chain
+
+FORMATS = ("table", "json", "jsonl", "csv", "tsv")
+
+TRANSACTION_FIELDS = ("id", "date", "type", "amount", "category", "note", "currency")
+
+class PlainConsole:
+    """
+    Stand-in for the rich Console while a machine format is active.
+
+    Messages go to stderr without markup so stdout carries only data.
+    """
+
+    def print(self, *objects, style=None, **kwargs):
+        print(*objects, file=sys.stderr)
+
+def emit(fmt, fields, rows, stream=None):
+    """
+    Write rows in a machine-readable format.
+
+    fmt: "json" (one array), "jsonl", "csv" or "tsv"
+    fields: column names, rows: iterable of tuples in the same order
+    Returns:
+        int: Number of rows written
+    """
+
+    stream = stream or sys.stdout
+
+    try:
+        return _write(fmt, fields, rows, stream)
+    except BrokenPipeError:
+        # The reader went away (e.g. `| head`), stop quietly. Point stdout
+        # at devnull so flushing it at exit does not raise again.
+        if stream is sys.stdout:
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+
+def _write(fmt, fields, rows, stream):
+    count = 0
+
+    if fmt in ("csv", "tsv"):
+        writer = csv.writer(stream, delimiter="," if fmt == "csv" else "\t", lineterminator="\n")
+        writer.writerow(fields)
+
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+
+    elif fmt == "jsonl":
+        for row in rows:
+            stream.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n")
+            count += 1
+
+    elif fmt == "json":
+        rows = iter(rows)
+        # Fetch the first row before writing "[" so a query that fails
+        # up front writes nothing at all
+        first = next(rows, None)
+        stream.write("[")
+
+        try:
+            for row in chain([first], rows) if first is not None else ():
+                stream.write(("," if count else "") + "\n  " + json.dumps(dict(zip(fields, row)), ensure_ascii=False))
+                count += 1
+        finally:
+            # Close the array even if a later row fails, the error is
+            # still reported on stderr
+            stream.write("\n]\n" if count else "]\n")
+
+    else:
+        raise ValueError(f"Unsupported output format: {fmt}")
+
+    stream.flush()
+
+    return count
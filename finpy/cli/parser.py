@@ -1,27 +1,122 @@
 import argparse
-from finpy.db import init_db
-from finpy.cli.commands import (
-    summary_cmd,
-    list_cmd,
-    add_cmd,
-    monthly_cmd,
-    yearly_cmd,
-    report_cmd,
-    delete_cmd,
-    update_cmd,
-    recent_cmd,
-    budget_set_cmd,
-    budget_status_cmd
-)
-
-def main():
-    init_db()
+import os
+import sys
+
+def finite_amount(value):
+    """
+    argparse type for amounts: a float that is not inf or nan.
+    """
+
+    import math
+
+    try:
+        amount = float(value)
+    except ValueError:
+        amount = math.nan
+
+    if not math.isfinite(amount):
+        raise argparse.ArgumentTypeError(f"invalid amount: '{value}'")
+
+    return amount
+
+def add_where_arguments(parser, action):
+    """
+    Add the --where/--dry-run/--yes options shared by update and delete.
+    """
+
+    parser.add_argument(
+        "--where",
+        dest="where",
+        action="append",
+        metavar="KEY=VALUE",
+        help=(
+            f"Select transactions to {action} instead of an ID, repeatable: "
+            "category=, type=, from=YYYY-MM-DD, to=YYYY-MM-DD, note=TEXT, id=1,2,3"
+        )
+    )
+
+    parser.add_argument(
+        "--dry-run",
+        dest="dry_run",
+        action="store_true",
+        help=f"Only show what would be {action}d"
+    )
+
+    parser.add_argument(
+        "--yes",
+        "-y",
+        dest="yes",
+        action="store_true",
+        help="Do not ask for confirmation"
+    )
+
+def build_parser():
+    """
+    Build the finpy argument parser with every subcommand.
+    """
+
+    from finpy.cli.output import FORMATS
+
+    from finpy.cli.commands import (
+        summary_cmd,
+        list_cmd,
+        search_cmd,
+        add_cmd,
+        import_cmd,
+        monthly_cmd,
+        yearly_cmd,
+        report_cmd,
+        delete_cmd,
+        update_cmd,
+        recent_cmd,
+        budget_set_cmd,
+        budget_status_cmd,
+        fx_import_cmd,
+        fx_list_cmd,
+        rollup_rebuild_cmd,
+        archive_cmd,
+        backup_cmd,
+        restore_cmd,
+        analyze_cmd,
+        shell_cmd,
+        serve_cmd
+    )
 
     parser = argparse.ArgumentParser(
         prog="finpy",
         description="Personal Finance CLI Tool"
     )
 
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print SQL statement and phase timings at exit (or set FINPY_TRACE)"
+    )
+
+    parser.add_argument(
+        "-f",
+        "--file",
+        dest="script",
+        help="Run the commands in a file, one per line (same as 'finpy shell FILE')"
+    )
+
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Send the command to a running 'finpy serve' (or set FINPY_DAEMON=1)"
+    )
+
+    parser.add_argument(
+        "--format",
+        dest="format",
+        choices=FORMATS,
+        default="table",
+        help=(
+            "Output format for list, recent, search, report, monthly, yearly, "
+            "summary, budget status and fx list (default: table)"
+        )
+    )
+
     subparsers = parser.add_subparsers(dest="command")
 
     # Add
@@ -40,8 +135,15 @@ def main():
     add.add_argument(
         "--amount",
         dest="amount",
-        type=float,
-        help="Amount in rupees"
+        type=finite_amount,
+        help="Amount in rupees, or in --currency"
+    )
+
+    add.add_argument(
+        "--currency",
+        dest="currency",
+        default="INR",
+        help="Currency of the amount (e.g., USD, default: INR)"
     )
 
     add.add_argument(
@@ -59,6 +161,36 @@ def main():
 
     add.set_defaults(func=add_cmd)
 
+    # Import
+    imp = subparsers.add_parser(
+        "import",
+        help="Bulk import transactions from CSV/JSONL"
+    )
+
+    imp.add_argument(
+        "file",
+        nargs="?",
+        default="-",
+        help="CSV/JSONL file with date,type,amount,category,note[,currency] (default: stdin)"
+    )
+
+    imp.add_argument(
+        "--input-format",
+        dest="input_format",
+        choices=["csv", "jsonl"],
+        help="Input format (default: from file extension, csv for stdin)"
+    )
+
+    imp.add_argument(
+        "--batch-size",
+        dest="batch_size",
+        type=int,
+        default=5000,
+        help="Rows written per transaction (default: 5000)"
+    )
+
+    imp.set_defaults(func=import_cmd)
+
     # Summary
     summary = subparsers.add_parser(
         "summary",
@@ -93,8 +225,82 @@ def main():
         help="List all transactions"
     )
 
+    lst.add_argument(
+        "--limit",
+        dest="limit",
+        type=int,
+        help="Maximum number of transactions to show"
+    )
+
+    lst.add_argument(
+        "--page",
+        dest="page",
+        type=int,
+        default=100,
+        help="Transactions fetched and rendered per page (default: 100)"
+    )
+
+    lst.add_argument(
+        "--after",
+        dest="after",
+        help="Continue after this transaction (YYYY-MM-DD:ID)"
+    )
+
     lst.set_defaults(func=list_cmd)
 
+    # Search
+    search = subparsers.add_parser(
+        "search",
+        help="Full-text search over notes and categories"
+    )
+
+    search.add_argument(
+        "query",
+        nargs="+",
+        help='Words, prefixes (amaz*), phrases ("amazon refund"), OR/NOT, category:food'
+    )
+
+    search.add_argument(
+        "--from",
+        dest="start",
+        help="Start date (YYYY-MM-DD)"
+    )
+
+    search.add_argument(
+        "--to",
+        dest="end",
+        help="End date (YYYY-MM-DD)"
+    )
+
+    search.add_argument(
+        "--type",
+        dest="type",
+        choices=["income", "expense", "investment"],
+        help="Only match this transaction type"
+    )
+
+    search.add_argument(
+        "--category",
+        dest="category",
+        help="Only match this category"
+    )
+
+    search.add_argument(
+        "--limit",
+        dest="limit",
+        type=int,
+        default=20,
+        help="Maximum number of matches to show (default: 20)"
+    )
+
+    search.add_argument(
+        "--after",
+        dest="after",
+        help="Continue after this match (RANK:ID, as printed)"
+    )
+
+    search.set_defaults(func=search_cmd)
+
     # Monthly Report
     mon_report = subparsers.add_parser(
         "monthly",
@@ -185,6 +391,13 @@ def main():
         help="Show category-wise breakdown"
     )
 
+    range_report.add_argument(
+        "--no-list",
+        dest="no_list",
+        action="store_true",
+        help="Skip the transaction list, show totals only"
+    )
+
     range_report.add_argument(
         "--plot",
         action="store_true",
@@ -196,33 +409,39 @@ def main():
     # Delete
     delete = subparsers.add_parser(
         "delete",
-        help="Delete a transaction by ID"
+        help="Delete a transaction by ID, or all transactions matching --where"
     )
 
     delete.add_argument(
         "id",
+        nargs="?",
         type=int,
         help="Transaction ID to delete"
     )
 
+    add_where_arguments(delete, "delete")
+
     delete.set_defaults(func=delete_cmd)
 
     # Update
     update = subparsers.add_parser(
         "update",
-        help="Update a transaction by ID"
+        help="Update a transaction by ID, or all transactions matching --where"
     )
 
     update.add_argument(
         "id",
+        nargs="?",
         type=int,
         help="Transaction ID to update"
     )
 
+    add_where_arguments(update, "update")
+
     update.add_argument(
         "--amount",
         dest="amount",
-        type=float,
+        type=finite_amount,
         help="Updated amount"
     )
 
@@ -274,7 +493,7 @@ def main():
     budget_set.add_argument(
         "--amount",
         dest="amount",
-        type=float,
+        type=finite_amount,
         required=True,
         help="Budget amount in rupees"
     )
@@ -307,14 +526,13 @@ def main():
     # Budget Status
     budget_status = budget_sub.add_parser(
         "status",
-        help="Show budget status for a month"
+        help="Show budget against spending for a month or a range of months"
     )
 
     budget_status.add_argument(
         "--month",
         dest="month",
         type=int,
-        required=True,
         help="Month (1-12)"
     )
 
@@ -322,16 +540,301 @@ def main():
         "--year",
         dest="year",
         type=int,
-        required=True,
         help="Year (e.g., 2024)"
     )
 
+    budget_status.add_argument(
+        "--from",
+        dest="start",
+        help="First month (YYYY-MM), instead of --month/--year"
+    )
+
+    budget_status.add_argument(
+        "--to",
+        dest="end",
+        help="Last month (YYYY-MM), instead of --month/--year"
+    )
+
+    budget_status.add_argument(
+        "--categories",
+        dest="categories",
+        action="store_true",
+        help="With --from/--to, one table per month with every category instead of one row per month"
+    )
+
     budget_status.set_defaults(func=budget_status_cmd)
+
+    # FX rates
+    fx_parser = subparsers.add_parser(
+        "fx",
+        help="Exchange rates for foreign currency transactions"
+    )
+
+    fx_sub = fx_parser.add_subparsers(dest="fx_cmd", required=True)
+
+    fx_import = fx_sub.add_parser(
+        "import",
+        help="Import exchange rates from CSV/JSONL"
+    )
+
+    fx_import.add_argument(
+        "file",
+        nargs="?",
+        default="-",
+        help="CSV/JSONL file with date,currency,rate, rate in rupees per unit (default: stdin)"
+    )
+
+    fx_import.add_argument(
+        "--input-format",
+        dest="input_format",
+        choices=["csv", "jsonl"],
+        help="Input format (default: from file extension, csv for stdin)"
+    )
+
+    fx_import.set_defaults(func=fx_import_cmd)
+
+    fx_list = fx_sub.add_parser(
+        "list",
+        help="List stored exchange rates"
+    )
+
+    fx_list.add_argument(
+        "--currency",
+        dest="currency",
+        help="Only this currency (e.g., USD)"
+    )
+
+    fx_list.set_defaults(func=fx_list_cmd)
+
+    # Rollup
+    rollup_parser = subparsers.add_parser(
+        "rollup",
+        help="Monthly rollup maintenance"
+    )
+
+    rollup_sub = rollup_parser.add_subparsers(dest="rollup_cmd", required=True)
+
+    rollup_rebuild = rollup_sub.add_parser(
+        "rebuild",
+        help="Recompute monthly totals from raw transactions"
+    )
+
+    rollup_rebuild.set_defaults(func=rollup_rebuild_cmd)
+
+    # Archive
+    archive = subparsers.add_parser(
+        "archive",
+        help="Move closed years into per-year database files, or list them"
+    )
+
+    archive.add_argument(
+        "--before",
+        dest="before",
+        type=int,
+        help="Archive every year before this one (e.g., 2024)"
+    )
+
+    archive.add_argument(
+        "--vacuum",
+        action="store_true",
+        help="Shrink finpy.db afterwards (rewrites the whole file)"
+    )
+
+    archive.set_defaults(func=archive_cmd)
+
+    # Backup
+    backup = subparsers.add_parser(
+        "backup",
+        help="Save a snapshot of the database while it stays in use"
+    )
+
+    backup.add_argument(
+        "--dir",
+        dest="dir",
+        help="Snapshot directory (default: FINPY_BACKUP_DIR or backups/ next to finpy.db)"
+    )
+
+    backup.add_argument(
+        "--compress",
+        action="store_true",
+        help="gzip the snapshot"
+    )
+
+    backup.add_argument(
+        "--keep",
+        dest="keep",
+        type=int,
+        default=7,
+        help="Snapshots to keep, older ones are deleted (0 keeps all, default 7)"
+    )
+
+    backup.add_argument(
+        "--pages",
+        dest="pages",
+        type=int,
+        default=4096,
+        help="Database pages copied per step (default 4096)"
+    )
+
+    backup.add_argument(
+        "--skip-check",
+        action="store_true",
+        help="Do not run an integrity check on the snapshot"
+    )
+
+    backup.add_argument(
+        "--list",
+        action="store_true",
+        help="List the existing snapshots instead"
+    )
+
+    backup.set_defaults(func=backup_cmd)
+
+    # Restore
+    restore = subparsers.add_parser(
+        "restore",
+        help="Replace the database with a snapshot"
+    )
+
+    restore.add_argument(
+        "snapshot",
+        nargs="?",
+        help="Snapshot file (default: the newest one)"
+    )
+
+    restore.add_argument(
+        "--skip-check",
+        action="store_true",
+        help="Do not run an integrity check on the snapshot"
+    )
+
+    restore.add_argument(
+        "--yes",
+        action="store_true",
+        help="Do not ask for confirmation"
+    )
+
+    restore.set_defaults(func=restore_cmd)
+
+    # Analyze
+    analyze = subparsers.add_parser(
+        "analyze",
+        help="Show spending trends, rolling averages and transaction size percentiles"
+    )
+
+    analyze.add_argument(
+        "--from",
+        dest="start",
+        help="Start date (YYYY-MM-DD)"
+    )
+
+    analyze.add_argument(
+        "--to",
+        dest="end",
+        help="End date (YYYY-MM-DD)"
+    )
+
+    analyze.add_argument(
+        "--type",
+        dest="type",
+        choices=["income", "expense", "investment"],
+        default="expense",
+        help="Transaction type to analyze (default: expense)"
+    )
+
+    analyze.add_argument(
+        "--category",
+        dest="category",
+        help="Only analyze this category"
+    )
+
+    analyze.set_defaults(func=analyze_cmd)
+
+    # Shell
+    shell = subparsers.add_parser(
+        "shell",
+        help="Run many commands in one process, from a file, stdin or a prompt"
+    )
+
+    shell.add_argument(
+        "file",
+        nargs="?",
+        help="File with one command per line, - for stdin (default: prompt, or stdin when piped)"
+    )
+
+    shell.add_argument(
+        "--atomic",
+        dest="atomic",
+        action="store_true",
+        help="Run everything in one transaction, rolled back if any command fails"
+    )
+
+    shell.set_defaults(func=shell_cmd)
+
+    # Serve
+    serve = subparsers.add_parser(
+        "serve",
+        help="Run a background server that keeps the database open"
+    )
+
+    serve.add_argument(
+        "--socket",
+        dest="socket",
+        help="Unix socket path (default: <database>.sock)"
+    )
+
+    serve.set_defaults(func=serve_cmd)
+
+    return parser
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # Thin client path: forward to a running server without importing
+    # the command layer at all
+    from finpy.cli import daemon
+
+    if daemon.wants_daemon(argv):
+        status = daemon.forward(argv)
+
+        if status is not None:
+            sys.exit(status)
+
+    from finpy import profiling
+    from finpy.db import init_db
+
+    parser = build_parser()
+
     # Parse
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    # finpy -f FILE is finpy shell FILE
+    if args.script is not None:
+        if args.command is not None:
+            parser.error("-f/--file cannot be combined with a command")
+
+        from finpy.cli.commands import shell_cmd
+
+        args.func, args.file, args.atomic = shell_cmd, args.script, False
+
+    # FINPY_TRACE=1 prints the profile, any other value is a JSON lines file
+    trace = os.environ.get("FINPY_TRACE")
+
+    if args.profile or trace:
+        profiling.enable(None if args.profile or trace == "1" else trace)
+
+    if args.format != "table":
+        from finpy import utils
+        from finpy.cli.output import PlainConsole
+
+        # Keep rich out of the process and stdout free of messages
+        utils._console = PlainConsole()
 
     if hasattr(args, "func"):
-        args.func(args)
+        with profiling.phase("command"):
+            init_db()
+            args.func(args)
     else:
         parser.print_help()
 
@@ -0,0 +1,255 @@
+"""
+finpy shell / finpy -f script: many commands in one process.
+
+Commands are read one per line from a file, from stdin, or from a
+prompt when stdin is a terminal, parsed with the regular argparse tree
+and run by the same *_cmd handlers on one connection. Blank lines and
+# comments are skipped.
+
+Consecutive writes share one transaction, which is committed before
+the next read (or when the script ends), so a script adding a day's
+transactions pays for one commit instead of one per line. At the
+prompt every command commits on its own, so the write lock is never
+held while waiting for input.
+
+With --atomic the whole script is one transaction: the first failing
+command rolls everything back. Archive files are attached up front so
+reads see archived years. archive, backup and restore commit their own
+transactions and move or replace database files, which a rollback
+could not undo, so they are refused.
+"""
+
+import shlex
+import sqlite3
+import sys
+
+# Handlers that write to the ledger, grouped into one transaction
+WRITE_COMMANDS = {
+    "add_cmd",
+    "import_cmd",
+    "update_cmd",
+    "delete_cmd",
+    "budget_set_cmd",
+    "fx_import_cmd",
+    "rollup_rebuild_cmd"
+}
+
+# Handlers that attach files or copy the whole database, run with no
+# transaction open
+OWN_TRANSACTION_COMMANDS = {"archive_cmd", "backup_cmd", "restore_cmd"}
+
+# Handlers that cannot run inside a shell
+REFUSED_COMMANDS = {"serve_cmd", "shell_cmd"}
+
+# Lines that end the prompt
+EXIT_WORDS = {"exit", "quit"}
+
+class _ErrorWatch:
+    """
+    Console wrapper that notes whether a handler reported an error.
+
+    Handlers print errors with style="bold red" and return, so this is
+    how a failed command is told apart from a successful one.
+    """
+
+    def __init__(self, console):
+        self.console = console
+        self.failed = False
+
+    def print(self, *objects, style=None, **kwargs):
+        if style == "bold red":
+            self.failed = True
+
+        self.console.print(*objects, style=style, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.console, name)
+
+def _lines(path):
+    """
+    Yield (line number, text) from a file, stdin or the prompt.
+    """
+
+    if path is None and sys.stdin.isatty():
+        line_no = 0
+
+        while True:
+            try:
+                line = input("finpy> ")
+            except EOFError:
+                print()
+                return
+
+            line_no += 1
+
+            if line.strip() in EXIT_WORDS:
+                return
+
+            yield line_no, line
+
+    fh = sys.stdin if path in (None, "-") else open(path, encoding="utf-8")
+
+    try:
+        yield from enumerate(fh, start=1)
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
+
+def _execute(args, console):
+    """
+    Run one parsed command.
+
+    Returns:
+        bool: True if it failed
+    """
+
+    import traceback
+
+    from finpy import utils
+    from finpy.cli.output import PlainConsole
+
+    watch = _ErrorWatch(PlainConsole() if args.format != "table" else console)
+    utils._console = watch
+
+    try:
+        args.func(args)
+    except SystemExit as e:
+        return bool(e.code)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        watch.print(str(e), style="bold red")
+    except Exception:
+        traceback.print_exc()
+        return True
+    finally:
+        utils._console = console
+
+    return watch.failed
+
+def run(path=None, atomic=False):
+    """
+    Run commands from a file, stdin ("-" or None) or the prompt.
+
+    input: path (str, optional) script file,
+           atomic (bool) run the whole script as one transaction
+    Returns:
+        int: Exit status, 0 if every command succeeded
+    """
+
+    from finpy import utils
+    from finpy.cli.parser import build_parser
+    from finpy.connection import get_connection, retry_on_busy
+    from finpy.db import init_db, get_archives, _attach, MAX_ATTACHED
+
+    parser = build_parser()
+    init_db()
+    conn = get_connection()
+
+    interactive = path is None and sys.stdin.isatty()
+    # Confirmation prompts need a terminal, elsewhere they are declined
+    prompts = sys.stdin.isatty()
+    console = utils.get_console()
+
+    @retry_on_busy
+    def begin():
+        conn.execute("BEGIN IMMEDIATE")
+
+    def commit():
+        if conn.in_transaction:
+            conn.commit()
+
+    if atomic:
+        archives = get_archives()
+
+        if len(archives) > MAX_ATTACHED:
+            console.print(
+                f"--atomic can read at most {MAX_ATTACHED} archived years, "
+                f"found {len(archives)}.",
+                style="bold red"
+            )
+            return 1
+
+        _attach(conn, archives)
+        begin()
+
+    status = 0
+    done = 0
+
+    try:
+        for line_no, line in _lines(path):
+            try:
+                argv = shlex.split(line, comments=True)
+            except ValueError as e:
+                console.print(str(e), style="bold red")
+                failed = True
+            else:
+                if not argv:
+                    continue
+
+                failed = False
+
+            if not failed:
+                try:
+                    args = parser.parse_args([arg for arg in argv if arg != "--daemon"])
+                except SystemExit as e:
+                    # --help exits with 0
+                    failed, args = bool(e.code), None
+
+            if not failed and args is not None:
+                name = args.func.__name__ if hasattr(args, "func") else None
+
+                if name in REFUSED_COMMANDS or (atomic and name in OWN_TRANSACTION_COMMANDS):
+                    console.print(
+                        f"'{args.command}' cannot run in finpy shell"
+                        f"{' --atomic' if atomic else ''}.",
+                        style="bold red"
+                    )
+                    failed = True
+                elif name is None:
+                    parser.print_help()
+                else:
+                    # Reads see every earlier write, at the prompt each
+                    # command commits on its own
+                    if not atomic:
+                        if name not in WRITE_COMMANDS or interactive:
+                            commit()
+                        elif not conn.in_transaction:
+                            begin()
+
+                    args.assume_no = not prompts
+                    failed = _execute(args, console)
+
+                    if interactive and not atomic:
+                        commit()
+
+            if not failed:
+                done += 1
+                continue
+
+            status = 1
+
+            if not interactive:
+                console.print(f"Line {line_no} failed: {line.strip()}", style="bold red")
+
+            if atomic:
+                conn.rollback()
+                console.print(
+                    f"Rolled back, none of the {done} earlier commands were applied.",
+                    style="bold red"
+                )
+                return status
+
+        commit()
+    except KeyboardInterrupt:
+        if atomic:
+            conn.rollback()
+            console.print("Interrupted, rolled back.", style="bold red")
+        else:
+            commit()
+
+        return 130
+    finally:
+        # A failed COMMIT leaves the transaction open
+        if conn.in_transaction:
+            conn.rollback()
+
+    return status
@@ -0,0 +1,167 @@
+"""
+Shared SQLite connection manager.
+
+Every function in finpy.db goes through get_connection(), which opens
+one connection per thread on first use, applies PRAGMAS to it and
+reuses it for the rest of the process.
+"""
+
+import atexit
+import functools
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from finpy import profiling
+
+DB = os.environ.get("FINPY_DB", "finpy.db")
+
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -65536,       # negative = KiB, i.e. 64 MiB of page cache
+    "mmap_size": 268435456,     # 256 MiB memory-mapped reads
+    "temp_store": "MEMORY",
+    # ms a statement waits for another writer before failing with SQLITE_BUSY
+    "busy_timeout": int(os.environ.get("FINPY_BUSY_TIMEOUT", "5000")),
+}
+
+# Attempts and first delay (seconds, doubled per attempt) for writes that
+# still find the database locked after busy_timeout
+RETRIES = 5
+BACKOFF = 0.05
+
+_local = threading.local()
+
+# Bumped by configure() so connections of other threads reopen too
+_config_version = 0
+
+def configure(db=None, **pragmas):
+    """
+    Change the database path and/or pragma values.
+
+    Closes the calling thread's connection, connections of other threads
+    are reopened with the new settings on their next get_connection().
+    """
+    global DB, _config_version
+
+    if db is not None:
+        DB = db
+
+    PRAGMAS.update(pragmas)
+    _config_version += 1
+    close_connection()
+
+def get_connection():
+    """
+    Return this thread's connection, opening and tuning it on first use.
+
+    The connection runs in autocommit mode, use transaction() to group
+    writes.
+    """
+    conn = getattr(_local, "conn", None)
+
+    if (
+        conn is not None
+        and _local.config_version != _config_version
+        and not conn.in_transaction
+    ):
+        close_connection()
+        conn = None
+
+    if conn is None:
+        factory = profiling.ProfiledConnection if profiling.enabled else sqlite3.Connection
+
+        with profiling.phase("connect"):
+            conn = sqlite3.connect(DB, isolation_level=None, factory=factory)
+
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+
+        _local.conn = conn
+        _local.config_version = _config_version
+
+    return conn
+
+def close_connection():
+    """
+    Close this thread's connection, if one is open.
+    """
+    conn = getattr(_local, "conn", None)
+
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextmanager
+def transaction(mode="IMMEDIATE"):
+    """
+    Run a block inside one transaction on the shared connection.
+
+    Commits when the block finishes and rolls back if it raises.
+    A nested transaction() joins the outer one.
+
+    The default BEGIN IMMEDIATE takes the write lock up front, so a
+    writer waits (busy_timeout) at BEGIN instead of failing halfway
+    through when another process holds the lock. Pass mode="DEFERRED"
+    for read-only blocks.
+
+    Usage:
+        with transaction() as conn:
+            conn.execute(...)
+    """
+    conn = get_connection()
+
+    if conn.in_transaction:
+        yield conn
+        return
+
+    conn.execute(f"BEGIN {mode}")
+
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+def is_busy(error):
+    """
+    Return True if an sqlite3 error means another connection holds a lock.
+    """
+    message = str(error)
+    return isinstance(error, sqlite3.OperationalError) and (
+        "database is locked" in message or "database is busy" in message
+    )
+
+def retry_on_busy(func):
+    """
+    Retry a write function with exponential backoff while the database is locked.
+
+    Only the outermost call retries: inside an open transaction the
+    whole transaction has to be retried, so the error is raised instead.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        delay = BACKOFF
+
+        for attempt in range(RETRIES):
+            nested = get_connection().in_transaction
+
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if nested or not is_busy(e) or attempt == RETRIES - 1:
+                    raise
+
+            time.sleep(delay * (1 + random.random()))
+            delay *= 2
+
+    return wrapper
+
+atexit.register(close_connection)
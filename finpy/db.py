@@ -1,53 +1,644 @@
+import functools
+import json
+import os
 import sqlite3
-from datetime import datetime
-from rich.console import Console
-from finpy.utils import fetch_expenses
-
-DB = "finpy.db"
-console = Console()
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from itertools import islice
+from finpy.utils import month_bounds, year_bounds, parse_currency
+from finpy.schema import (
+    migrate,
+    get_schema_version,
+    SCHEMA_VERSION,
+    BASE_CURRENCY,
+    ROLLUP_KEY,
+    ROLLUP_MERGE,
+    ROLLUP_ADD_SINCE,
+    FTS_ADD_SINCE,
+    ROLLUP_BASE_REBUILD,
+    DEFER_GENERATION,
+    DEFER_ROW_TRIGGERS,
+    GENERATION_BUMP,
+    ARCHIVE_SCHEMA,
+    ARCHIVE_FTS_REBUILD
+)
+from finpy import connection
+from finpy.connection import (
+    get_connection,
+    transaction,
+    retry_on_busy,
+    is_busy
+)
 
 def connect_db():
     """
-    Connect to the SQLite database.
+    Return the shared connection to the SQLite database.
+
+    The connection is owned by finpy.connection, do not close it.
     """
-    return sqlite3.connect(DB)
+    return get_connection()
 
 def init_db():
     """
-    Initialize the database with required tables.
+    Initialize the database, applying any pending schema migrations.
+
+    Only reads PRAGMA user_version when the schema is already current.
     """
     conn = connect_db()
-    cur = conn.cursor()
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS transactions(
-            id INTEGER PRIMARY KEY,
-            date TEXT,
-            type TEXT,
-            amount REAL,
-            category TEXT,
-            note TEXT
-        )
-        """
+    if get_schema_version(conn) < SCHEMA_VERSION:
+        migrate(conn)
+
+# -----------------------
+# Amounts
+# -----------------------
+# Amounts are stored as INTEGER paise so sums are exact, every public
+# function takes and returns rupees.
+
+def to_paise(amount):
+    """
+    Convert a rupee amount to integer paise, rounding half up.
+
+    Raises ValueError for amounts that are not finite numbers.
+    """
+    if amount is None:
+        return None
+
+    try:
+        value = Decimal(str(amount))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {amount!r}")
+
+    # inf and nan have no paise value
+    if not value.is_finite():
+        raise ValueError(f"Amount must be a finite number, got {amount!r}.")
+
+    return int(value.scaleb(2).quantize(Decimal(1), ROUND_HALF_UP))
+
+def to_rupees(paise):
+    """
+    Convert integer paise back to rupees.
+    """
+    if paise is None:
+        return None
+
+    return paise / 100
+
+# Select list of a transactions row with the amount in rupees (or the
+# main unit of its currency)
+TRANSACTION_COLUMNS = "id, date, type, amount / 100.0, category, note, currency"
+
+# -----------------------
+# Currencies
+# -----------------------
+# Amounts of foreign currency rows are converted when a report runs,
+# with the latest fx_rates entry on or before the row's date (one
+# primary key seek per foreign row). monthly_rollup only holds base
+# currency rows.
+
+# Amount of a transactions row in base currency paise, NULL when no
+# rate is known for its currency and date. {row} must qualify the row
+# (e.g. "t."), fx_rates has date and currency columns too.
+BASE_AMOUNT = f"""
+    CASE WHEN {{row}}currency = '{BASE_CURRENCY}' THEN {{row}}amount
+    ELSE CAST(ROUND({{row}}amount * (
+        SELECT r.rate FROM fx_rates r
+        WHERE r.currency = {{row}}currency AND r.date <= {{row}}date
+        ORDER BY r.date DESC
+        LIMIT 1
+    )) AS INTEGER) END
+"""
+
+def _missing_rates(start=None, end=None):
+    """
+    Return the error for foreign currency rows in [start, end) that have
+    no exchange rate, naming each currency and its dates.
+    """
+
+    details = "; ".join(
+        f"{count} {currency} from {first} to {last}"
+        for currency, count, first, last in get_missing_rates(start, end)
     )
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS budgets (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        category TEXT NOT NULL,
-        amount REAL NOT NULL CHECK(amount > 0),
-        month INTEGER NOT NULL CHECK(month BETWEEN 1 AND 12),
-        year INTEGER NOT NULL,
-        UNIQUE(category, month, year)
-        );
-        """
+    return ValueError(
+        f"Foreign currency transactions with no exchange rate on or before "
+        f"their date: {details}. Import rates with: finpy fx import <file>"
+    )
+
+# -----------------------
+# Result cache
+# -----------------------
+CACHE_SIZE = 256
+DISK_CACHE = os.environ.get("FINPY_DISK_CACHE") == "1"
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _generation(conn):
+    """
+    Return the data generation, bumped by every committed write to the
+    ledger (see schema.GENERATION_TRIGGERS).
+    """
+    return conn.execute(
+        "SELECT value FROM finpy_meta WHERE key = 'generation'"
+    ).fetchone()[0]
+
+def _disk_get(conn, key, generation):
+    row = conn.execute(
+        "SELECT value FROM query_cache WHERE key = ? AND generation = ?",
+        (key, generation)
+    ).fetchone()
+
+    if row is None:
+        return None
+
+    import ast
+
+    # Entries that are not Python literals are never hits
+    try:
+        return ast.literal_eval(row[0])
+    except (ValueError, SyntaxError):
+        return None
+
+def _disk_put(conn, key, generation, value):
+    try:
+        with transaction():
+            conn.execute(
+                "DELETE FROM query_cache WHERE generation < ?", (generation,)
+            )
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO query_cache (key, generation, value)
+                VALUES (?, ?, ?)
+                """, (key, generation, repr(value))
+            )
+    except sqlite3.OperationalError as e:
+        # Never fail a read because a writer holds the lock
+        if not is_busy(e):
+            raise
+
+def cached(func):
+    """
+    Cache a read function's result per arguments until the data changes.
+
+    Entries are keyed on the database file and its data generation, so
+    every connection of the process (aio workers, daemon threads) shares
+    them and any committed write, from this process or another one,
+    invalidates them. Results computed inside an open transaction may
+    never be committed and are not kept.
+
+    Results live in a bounded LRU (CACHE_SIZE entries) and, with
+    FINPY_DISK_CACHE=1, also in the query_cache table so other processes
+    reuse them. The disk copy is stored as a Python literal, so a hit
+    returns the same tuples and int keys as the call. Cached results are
+    shared, callers must not mutate them.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        conn = connect_db()
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        generation = _generation(conn)
+        stamp = (connection.DB, generation)
+
+        with _cache_lock:
+            entry = _cache.get(key)
+
+            if entry is not None and entry[0] == stamp:
+                _cache.move_to_end(key)
+                return entry[1]
+
+        if conn.in_transaction:
+            return func(*args, **kwargs)
+
+        value = None
+
+        if DISK_CACHE:
+            disk_key = repr(key)
+            value = _disk_get(conn, disk_key, generation)
+
+        if value is None:
+            value = func(*args, **kwargs)
+
+            if DISK_CACHE:
+                _disk_put(conn, disk_key, generation, value)
+
+        with _cache_lock:
+            _cache[key] = (stamp, value)
+            _cache.move_to_end(key)
+
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+
+        return value
+
+    return wrapper
+
+@retry_on_busy
+def clear_cache():
+    """
+    Drop every cached result, in memory and on disk.
+    """
+
+    with _cache_lock:
+        _cache.clear()
+
+    with transaction() as conn:
+        conn.execute("DELETE FROM query_cache")
+
+@contextmanager
+def _deferred(conn, level):
+    """
+    Let the per-row triggers gated on finpy_meta 'deferred' skip the
+    rows written in the block (see schema.DEFERRED), the caller does
+    their work with one statement instead. The data generation is
+    bumped once when the block finishes.
+
+    Must run inside a transaction, the flag is back to its old value
+    before that commits.
+    """
+
+    previous = conn.execute(
+        "SELECT value FROM finpy_meta WHERE key = 'deferred'"
+    ).fetchone()[0]
+    conn.execute("UPDATE finpy_meta SET value = ? WHERE key = 'deferred'", (level,))
+
+    try:
+        yield
+        conn.execute(GENERATION_BUMP)
+    finally:
+        conn.execute("UPDATE finpy_meta SET value = ? WHERE key = 'deferred'", (previous,))
+
+def _parse_date(value):
+    """
+    Parse a YYYY-MM-DD string, raising ValueError with a CLI friendly message.
+    """
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ValueError("Invalid date format. Use YYYY-MM-DD.")
+
+def _month_span(start, end):
+    """
+    Split the half-open date range [start, end) into whole months and edge days.
+
+    Returns:
+        (months, edges):
+            months: ((first_year, first_month), (last_year, last_month)) or None
+            edges: List of half-open (start, end) ISO date ranges not covered by months
+    """
+    start_date = _parse_date(start)
+    end_date = _parse_date(end)
+
+    first = start_date.replace(day=1)
+    if first < start_date:
+        first = (first + timedelta(days=32)).replace(day=1)
+
+    stop = end_date.replace(day=1)
+
+    if first >= stop:
+        return None, [(start, end)]
+
+    last = stop - timedelta(days=1)
+    edges = []
+
+    if start_date < first:
+        edges.append((start, first.isoformat()))
+
+    if stop < end_date:
+        edges.append((stop.isoformat(), end))
+
+    return ((first.year, first.month), (last.year, last.month)), edges
+
+# -----------------------
+# Archives
+# -----------------------
+# Closed years can be moved out of finpy.db into one database file per
+# year (archive_transactions()). monthly_rollup keeps their totals, so
+# only queries that need raw rows of an archived year ATTACH its file.
+
+# SQLite's default limit on databases attached to one connection
+MAX_ATTACHED = 10
+
+def _main_path(conn):
+    """
+    Return the file of the main database, "" for an in-memory one.
+    """
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            return path
+
+    return ""
+
+def _archive_path(conn, name):
+    """
+    Resolve an archive file name against the directory of the main database.
+    """
+    return os.path.join(os.path.dirname(_main_path(conn)), name)
+
+def _attach(conn, archives, create=False):
+    """
+    Make sure the archives [(year, path)] are attached as archive_<year>.
+
+    Archives not in the list are detached first if keeping them would
+    go over MAX_ATTACHED.
+    """
+
+    attached = {
+        name for _, name, _ in conn.execute("PRAGMA database_list")
+        if name.startswith("archive_")
+    }
+    wanted = {f"archive_{year}": path for year, path in archives}
+
+    if len(attached | wanted.keys()) > MAX_ATTACHED:
+        for name in attached - wanted.keys():
+            conn.execute(f"DETACH DATABASE {name}")
+
+    for name, path in wanted.items():
+        if name in attached:
+            continue
+
+        if not create and not os.path.exists(path):
+            raise ValueError(f"Archive file is missing: {path}")
+
+        conn.execute(f"ATTACH DATABASE ? AS {name}", (path,))
+
+def _archives_between(conn, start=None, end=None, foreign=False):
+    """
+    List the archived years overlapping the half-open date range
+    [start, end), oldest first. With foreign=True only archives holding
+    foreign currency rows count.
+
+    Returns:
+        List of tuples: (year, archive path)
+    """
+
+    first_year = int(start[:4]) if start else 0
+    last_year = int(end[:4]) - (end[5:] == "01-01") if end else 9999
+
+    return [
+        (year, _archive_path(conn, path))
+        for year, path in conn.execute(
+            f"""
+            SELECT year, path FROM archives
+            WHERE year BETWEEN ? AND ? {"AND foreign_rows > 0" if foreign else ""}
+            ORDER BY year
+            """,
+            (first_year, last_year)
+        )
+    ]
+
+def _ledger_windows(conn, start=None, end=None, newest_first=False, foreign=False):
+    """
+    Split the half-open date range [start, end) into windows that can be
+    read with one query each, oldest first (newest first if asked).
+    With foreign=True only archives holding foreign currency rows count.
+
+    Yields (table, window_start, window_end). table is "transactions"
+    when no archived year overlaps the range, otherwise a temp view
+    (ledger_<years>): a UNION ALL of transactions and the attached
+    archives of that window. A range over more than MAX_ATTACHED
+    archived years takes several windows. Bounds left as None by the
+    caller stay None.
+    """
+
+    archives = _archives_between(conn, start, end, foreign)
+
+    if not archives:
+        yield "transactions", start, end
+        return
+
+    groups = [archives[i:i + MAX_ATTACHED] for i in range(0, len(archives), MAX_ATTACHED)]
+    bounds = [start] + [f"{group[0][0]:04d}-01-01" for group in groups[1:]] + [end]
+    order = range(len(groups) - 1, -1, -1) if newest_first else range(len(groups))
+
+    for i in order:
+        group = groups[i]
+        view = "ledger_" + "_".join(str(year) for year, _ in group)
+
+        _attach(conn, group)
+
+        # Named after its archives, so a view still read by a suspended
+        # generator is never redefined under it
+        conn.execute(
+            f"CREATE TEMP VIEW IF NOT EXISTS {view} AS "
+            + _ledger_union(view, "id, date, type, amount, category, note, currency")
+        )
+
+        yield view, bounds[i], bounds[i + 1]
+
+def _ledger_union(table, columns):
+    """
+    Return the UNION ALL of transactions and the archives behind a table
+    yielded by _ledger_windows(), reading only the given columns.
+
+    Aggregates read it as a subquery instead of the view: SQLite builds
+    every column of the view, so its branches cannot stay on covering
+    indexes. "transactions" is returned as is.
+    """
+
+    if table == "transactions":
+        return table
+
+    schemas = ["main"] + [f"archive_{year}" for year in table[len("ledger_"):].split("_")]
+
+    return " UNION ALL ".join(f"SELECT {columns} FROM {schema}.transactions" for schema in schemas)
+
+def _ledger_columns(table, columns):
+    """
+    Return what to put after FROM to read columns of a table yielded by
+    _ledger_windows(), see _ledger_union().
+    """
+
+    if table == "transactions":
+        return table
+
+    return f"({_ledger_union(table, columns)})"
+
+def _foreign_totals(conn, start=None, end=None, keys=("NULL",), tx_type=None):
+    """
+    Sum the foreign currency transactions in [start, end), converted to
+    base currency paise.
+
+    Only the foreign rows are read, through the covering partial index
+    on them, so ledgers kept in the base currency pay one empty index
+    probe.
+
+    keys: SQL expressions to group by, after the type
+    Returns:
+        List of tuples: (type, *keys, total in paise)
+    """
+
+    rows = []
+    missing = 0
+
+    for table, window_start, window_end in _ledger_windows(conn, start, end, foreign=True):
+        conditions = [f"currency != '{BASE_CURRENCY}'"]
+        params = []
+
+        for condition, value in (
+            ("date >= ?", window_start),
+            ("date < ?", window_end),
+            # +type keeps the planner on the partial index
+            ("+type = ?", tx_type)
+        ):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        for row in conn.execute(
+            f"""
+            SELECT IFNULL(type, ''), {", ".join(keys)}, SUM(base), COUNT(*) - COUNT(base)
+            FROM (
+                SELECT *, {BASE_AMOUNT.format(row="t.")} AS base
+                FROM {_ledger_columns(table, "date, type, category, amount, currency")} t
+                WHERE {" AND ".join(conditions)}
+            )
+            GROUP BY {", ".join(str(i) for i in range(1, len(keys) + 2))}
+            """, params
+        ):
+            missing += row[-1]
+            rows.append(row[:-1])
+
+    if missing:
+        raise _missing_rates(start, end)
+
+    return rows
+
+def _aggregate(cur, start=None, end=None, tx_type=None, by=None):
+    """
+    Sum amounts per type (and optionally per category or month) over [start, end).
+
+    Whole months are answered from monthly_rollup, only the edge days of
+    the range are read from the transactions table. With no range the
+    whole ledger is summed from the rollup. Foreign currency rows are
+    added converted to the base currency, see _foreign_totals().
+
+    by:
+        None        -> key is None
+        "category"  -> key is the category
+        "month"     -> key is "YYYY-MM"
+
+    Returns:
+        dict: {(type, key): total in paise}
+    """
+
+    rollup_key = {
+        None: "NULL",
+        "category": "category",
+        "month": "printf('%04d-%02d', year, month)"
+    }[by]
+
+    raw_key = {
+        None: "NULL",
+        "category": "IFNULL(category, '')",
+        "month": "substr(date, 1, 7)"
+    }[by]
+
+    if start is None and end is None:
+        months, edges = ((0, 0), (9999, 12)), []
+    else:
+        months, edges = _month_span(start, end)
+
+    totals = {}
+
+    def collect(query, params):
+        if tx_type is not None:
+            query += " AND type = ?"
+            params.append(tx_type)
+
+        cur.execute(query + " GROUP BY 1, 2", params)
+
+        for row_type, key, amount in cur.fetchall():
+            totals[(row_type, key)] = totals.get((row_type, key), 0) + amount
+
+    if months:
+        (first_year, first_month), (last_year, last_month) = months
+        collect(
+            f"""
+            SELECT type, {rollup_key}, SUM(total)
+            FROM monthly_rollup
+            WHERE (year, month) BETWEEN (?, ?) AND (?, ?)
+            """,
+            [first_year, first_month, last_year, last_month]
+        )
+
+    for edge_start, edge_end in edges:
+        for table, window_start, window_end in _ledger_windows(cur.connection, edge_start, edge_end):
+            collect(
+                f"""
+                SELECT IFNULL(type, ''), {raw_key}, SUM(amount)
+                FROM {_ledger_columns(table, "date, type, category, amount, currency")}
+                WHERE date >= ? AND date < ? AND currency = '{BASE_CURRENCY}'
+                """,
+                [window_start, window_end]
+            )
+
+    for row_type, key, amount in _foreign_totals(cur.connection, start, end, (raw_key,), tx_type):
+        totals[(row_type, key)] = totals.get((row_type, key), 0) + amount
+
+    return totals
+
+def _ranked(totals):
+    """
+    Turn {(type, key): paise} into a list of (key, rupees) sorted by total, largest first.
+    """
+    return sorted(
+        ((key, to_rupees(total)) for (_, key), total in totals.items()),
+        key=lambda item: item[1],
+        reverse=True
     )
 
-    conn.commit()
-    conn.close()
+@retry_on_busy
+def rebuild_rollup():
+    """
+    Recompute the monthly_rollup table from the raw base currency
+    transactions, archived years included.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+
+    conn = connect_db()
+    archived = []
+
+    # Archive totals are read through their own connections, so any
+    # number of archives fits in the one rebuild transaction below
+    for year, name in conn.execute("SELECT year, path FROM archives").fetchall():
+        path = _archive_path(conn, name)
+
+        if not os.path.exists(path):
+            raise ValueError(f"Archive file is missing: {path}")
+
+        archive = sqlite3.connect(path, isolation_level=None)
+
+        try:
+            archived.extend(archive.execute(
+                """
+                SELECT {key}, SUM(IFNULL(amount, 0)), COUNT(*)
+                FROM transactions
+                WHERE currency = '{base}'
+                GROUP BY 1, 2, 3, 4
+                """.format(key=ROLLUP_KEY.format(row=""), base=BASE_CURRENCY)
+            ).fetchall())
+        finally:
+            archive.close()
 
+    with transaction() as conn:
+        for statement in ROLLUP_BASE_REBUILD:
+            conn.execute(statement)
+
+        conn.executemany(ROLLUP_MERGE, archived)
+
+        # Cached results were built on the old totals
+        conn.execute(GENERATION_BUMP)
+
+        return conn.execute("SELECT COUNT(*) FROM monthly_rollup").fetchone()[0]
+
+@cached
 def get_summary_between(start_date=None, end_date=None):
     """
     Return total income, expense and investment for a date range.
@@ -63,27 +654,15 @@ def get_summary_between(start_date=None, end_date=None):
     conn = connect_db()
     cur = conn.cursor()
 
-    query = """
-        SELECT
-            SUM(CASE WHEN type='income' THEN amount ELSE 0 END),
-            SUM(CASE WHEN type='expense' THEN amount ELSE 0 END),
-            SUM(CASE WHEN type='investment' THEN amount ELSE 0 END)
-        FROM transactions
-    """
-
-    params = []
-
     if start_date and end_date:
-        query += " WHERE date BETWEEN ? AND ?"
-        params.extend([start_date, end_date])
-
-    cur.execute(query, params)
-    income, expense, investment = cur.fetchone()
-    conn.close()
+        end_excl = (_parse_date(end_date) + timedelta(days=1)).isoformat()
+        totals = _aggregate(cur, start_date, end_excl)
+    else:
+        totals = _aggregate(cur)
 
-    income = income or 0
-    expense = expense or 0
-    investment = investment or 0
+    income = to_rupees(totals.get(("income", None), 0))
+    expense = to_rupees(totals.get(("expense", None), 0))
+    investment = to_rupees(totals.get(("investment", None), 0))
 
     return {
         "income": income,
@@ -111,25 +690,285 @@ def get_all_transactions():
     Fetch all transactions from the database.
 
     Returns:
-        List of tuples: Each tuple contains (id, date, type, amount, category, note)
+        List of tuples: Each tuple contains (id, date, type, amount, category, note, currency)
+    """
+
+    conn = connect_db()
+    cur = conn.cursor()
+
+    cur.execute(
+        f"""
+        SELECT {TRANSACTION_COLUMNS}
+        FROM transactions
+        ORDER BY date DESC
+        """
+    )
+
+    rows = cur.fetchall()
+
+    return rows
+
+def _where(filters, table=None):
+    """
+    Build a WHERE clause for the transactions table from a filter dict.
+
+    table: alias to qualify the columns with, for queries that join
+           transactions with another table
+    filters:
+        "type"      -> exact transaction type
+        "category"  -> exact category
+        "start"     -> first date, YYYY-MM-DD (inclusive)
+        "end"       -> last date, YYYY-MM-DD (inclusive)
+        "note"      -> note contains this text (case-insensitive)
+        "ids"       -> list of transaction IDs
+        "currency"  -> exact currency code
+
+    Returns:
+        (clause, params)
+    """
+
+    filters = filters or {}
+    prefix = f"{table}." if table else ""
+    conditions = []
+    params = []
+
+    if filters.get("type") is not None:
+        conditions.append(f"{prefix}type = ?")
+        params.append(filters["type"])
+
+    if filters.get("category") is not None:
+        conditions.append(f"{prefix}category = ?")
+        params.append(filters["category"])
+
+    if filters.get("start") is not None:
+        conditions.append(f"{prefix}date >= ?")
+        params.append(_parse_date(filters["start"]).isoformat())
+
+    if filters.get("end") is not None:
+        end_excl = _parse_date(filters["end"]) + timedelta(days=1)
+        conditions.append(f"{prefix}date < ?")
+        params.append(end_excl.isoformat())
+
+    if filters.get("note") is not None:
+        conditions.append(f"{prefix}note LIKE ?")
+        params.append(f"%{filters['note']}%")
+
+    if filters.get("currency") is not None:
+        conditions.append(f"{prefix}currency = ?")
+        params.append(filters["currency"])
+
+    if filters.get("ids") is not None:
+        ids = list(filters["ids"])
+        conditions.append(f"{prefix}id IN ({', '.join('?' * len(ids)) or 'NULL'})")
+        params.extend(ids)
+
+    clause = " AND ".join(conditions) if conditions else "1"
+
+    return clause, params
+
+def _filter_range(filters):
+    """
+    Return the half-open date range [start, end) of a filter dict, a
+    bound the filter leaves open stays None.
+    """
+
+    filters = filters or {}
+    start = filters.get("start")
+    end = filters.get("end")
+
+    return (
+        _parse_date(start).isoformat() if start is not None else None,
+        (_parse_date(end) + timedelta(days=1)).isoformat() if end is not None else None
+    )
+
+def _archived_years(conn, filters):
+    """
+    Return the archived years holding transactions that match a filter.
+
+    Archives are read through their own connections, like in
+    rebuild_rollup(), so any number of them can be checked.
+    """
+
+    clause, params = _where(filters)
+    years = []
+
+    for year, path in _archives_between(conn, *_filter_range(filters)):
+        if not os.path.exists(path):
+            raise ValueError(f"Archive file is missing: {path}")
+
+        archive = sqlite3.connect(path, isolation_level=None)
+
+        try:
+            if archive.execute(
+                f"SELECT 1 FROM transactions WHERE {clause} LIMIT 1", params
+            ).fetchone():
+                years.append(year)
+        finally:
+            archive.close()
+
+    return years
+
+def ensure_writable(filters):
+    """
+    Raise ValueError if transactions of archived years match a filter.
+
+    Archived years are read-only, so updates and deletes refuse a filter
+    that reaches them instead of changing only the rows in finpy.db.
+
+    input: filters (dict) see _where()
+    """
+
+    years = _archived_years(connect_db(), filters)
+
+    if years:
+        raise ValueError(
+            f"Matching transactions are in archived years ({', '.join(str(year) for year in years)}), "
+            "which are read-only. Narrow the filters to leave them out, e.g. from=YYYY-MM-DD."
+        )
+
+def iter_transactions(filters=None, page_size=500, after=None, ascending=False):
+    """
+    Stream transactions newest first (oldest first with ascending=True),
+    one page per query.
+
+    Uses keyset pagination on (date, id) so every page is an index range
+    scan and memory stays bounded by page_size.
+
+    input: filters (dict, optional) see _where(),
+           page_size (int) rows fetched per query,
+           after ((date, id), optional) resume after this row,
+           ascending (bool) walk the ledger oldest first
+    Yields:
+        Tuple: (id, date, type, amount, category, note, currency)
+    """
+
+    if page_size <= 0:
+        raise ValueError("Page size must be a positive number.")
+
+    conn = connect_db()
+    cur = conn.cursor()
+    op, order = (">", "ASC") if ascending else ("<", "DESC")
+
+    start, end = _filter_range(filters)
+
+    # Archived years in the range are read through a ledger view, one
+    # window at a time in the order of the listing
+    for table, window_start, window_end in _ledger_windows(
+        conn, start, end, newest_first=not ascending
+    ):
+        clause, params = _where(filters)
+
+        if window_start is not None:
+            clause += " AND date >= ?"
+            params.append(window_start)
+
+        if window_end is not None:
+            clause += " AND date < ?"
+            params.append(window_end)
+
+        while True:
+            query = f"""
+                SELECT {TRANSACTION_COLUMNS}
+                FROM {table}
+                WHERE {clause}
+            """
+            page_params = list(params)
+
+            if after is not None:
+                query += f" AND (date, id) {op} (?, ?)"
+                page_params.extend(after)
+
+            query += f" ORDER BY date {order}, id {order} LIMIT ?"
+            page_params.append(page_size)
+
+            cur.execute(query, page_params)
+            rows = cur.fetchall()
+
+            yield from rows
+
+            if len(rows) < page_size:
+                break
+
+            after = (rows[-1][1], rows[-1][0])
+
+def search_transactions(query, filters=None, page_size=50, after=None):
     """
+    Stream transactions whose note or category match a full-text query,
+    best match first.
+
+    The query uses FTS5 syntax: words (all must match), prefixes
+    (amaz*), phrases ("amazon refund"), OR / NOT and column filters
+    (category:food). Filters and ranking run inside SQLite and pages
+    are fetched by keyset on (rank, id).
+
+    Archived years in the date range are searched through the index of
+    their own file, so their ranks come from that file's statistics.
+    At most MAX_ATTACHED archived years are searched at once.
+
+    input: query (str), filters (dict, optional) see _where(),
+           page_size (int) rows fetched per query,
+           after ((rank, id), optional) resume after this match
+    Yields:
+        Tuple: (id, date, type, amount, category, note, currency, rank)
+    """
+
+    if page_size <= 0:
+        raise ValueError("Page size must be a positive number.")
 
+    clause, params = _where(filters, table="t")
     conn = connect_db()
+    archives = _archives_between(conn, *_filter_range(filters))
+
+    if len(archives) > MAX_ATTACHED:
+        raise ValueError(
+            f"Search can read at most {MAX_ATTACHED} archived years at once, "
+            f"found {len(archives)}. Narrow it with --from/--to."
+        )
+
+    _attach(conn, archives)
     cur = conn.cursor()
 
-    cur.execute(
-        """
-        SELECT id, date, type, amount, category, note
-        FROM transactions
-        ORDER BY date DESC
-        """
-    )
+    matches = " UNION ALL ".join(
+        f"""
+        SELECT t.id, t.date, t.type, t.amount / 100.0 AS amount, t.category,
+               t.note, t.currency, f.rank AS rank
+        FROM {schema}.transactions_fts f
+        JOIN {schema}.transactions t ON t.id = f.rowid
+        WHERE f.transactions_fts MATCH ? AND {clause}
+        """
+        for schema in ["main"] + [f"archive_{year}" for year, _ in archives]
+    )
+    match_params = [query, *params] * (len(archives) + 1)
+
+    while True:
+        sql = f"SELECT * FROM ({matches})"
+        page_params = list(match_params)
+
+        if after is not None:
+            sql += " WHERE (rank, id) > (?, ?)"
+            page_params.extend(after)
+
+        sql += " ORDER BY rank, id LIMIT ?"
+        page_params.append(page_size)
+
+        try:
+            cur.execute(sql, page_params)
+        except sqlite3.OperationalError as e:
+            # FTS5 reports malformed queries as OperationalError too
+            if "fts5" not in str(e) and "no such column" not in str(e):
+                raise
+            raise ValueError(f"Invalid search query: {e}") from None
+
+        rows = cur.fetchall()
+
+        yield from rows
 
-    rows = cur.fetchall()
-    conn.close()
+        if len(rows) < page_size:
+            return
 
-    return rows
+        after = (rows[-1][7], rows[-1][0])
 
+@cached
 def get_monthly_report_data(month, year):
     """
     Fetch total expense and category-wise breakdown for a given month and year.
@@ -144,29 +983,21 @@ def get_monthly_report_data(month, year):
     conn = connect_db()
     cur = conn.cursor()
 
-    # Total Expense
-    res = fetch_expenses(
-        cur=cur,
-        year=year,
-        month=month
-    )
-    total = res[0][0] if res and res[0][0] else 0
+    start, end = month_bounds(year, month)
+    totals = _aggregate(cur, start, end, tx_type="expense", by="category")
 
     # Category-wise Breakdown
-    by_category = fetch_expenses(
-        cur=cur,
-        year=year,
-        month=month,
-        group_by="category"
-    )
+    by_category = _ranked(totals)
 
-    conn.close()
+    # Total Expense, summed in paise
+    total = to_rupees(sum(totals.values()))
 
     return {
         "total": total,
         "by_category": by_category
     }
 
+@cached
 def get_yearly_report_data(year):
     """
     Fetch total expense, category-wise breakdown and month-wise breakdown for a given year.
@@ -182,28 +1013,20 @@ def get_yearly_report_data(year):
     conn = connect_db()
     cur = conn.cursor()
 
-    # Total Expense
-    res = fetch_expenses(
-        cur=cur,
-        year=year
-    )
-    total = res[0][0] if res and res[0][0] else 0
+    start, end = year_bounds(year)
+    totals = _aggregate(cur, start, end, tx_type="expense", by="category")
 
     # Category-wise Breakdown
-    by_category = fetch_expenses(
-        cur,
-        year=year,
-        group_by="category"
-    )
+    by_category = _ranked(totals)
 
-    # Monthly Breakdown
-    by_month = fetch_expenses(
-        cur,
-        year=year,
-        group_by="month"
-    )
+    # Total Expense, summed in paise
+    total = to_rupees(sum(totals.values()))
 
-    conn.close()
+    # Monthly Breakdown, reported as "MM"
+    by_month = sorted(
+        (key[5:7], to_rupees(amount))
+        for (_, key), amount in _aggregate(cur, start, end, tx_type="expense", by="month").items()
+    )
 
     return {
         "total": total,
@@ -211,87 +1034,101 @@ def get_yearly_report_data(year):
         "by_month": by_month
     }
 
-def get_report_data(start, end):
+def get_report_data(start, end, transactions=True, by_category=True):
     """
-    Fetch total expense and category-wise breakdown for a given date range.
-
+    Fetch total expense, per-type totals, category-wise breakdown and the
+    transactions for a given date range, in a single pass.
+
+    With transactions=True one cursor walks the rows in the range and
+    every aggregate is accumulated while the rows are collected, foreign
+    currency amounts converted to the base currency. Without
+    it no row is materialized and the aggregates come from one grouped
+    read of the monthly rollup (plus the edge days).
+
+    input: start, end (str) in YYYY-MM-DD format, inclusive
+           transactions (bool) include the list of transactions
+           by_category (bool) include the category-wise breakdown
     Returns:
         {
             "total": float,
-            "all_transactions": List of tuples (id, date, type, amount, category, note),
-            "by_category": List of tuples (category, amount)
+            "by_type": dict {type: amount},
+            "all_transactions": List of tuples (id, date, type, amount, category, note, currency) or None,
+            "by_category": List of tuples (category, amount) or None
         }
     """
     conn = connect_db()
     cur = conn.cursor()
 
-    try:
+    # -----------------------
+    # Parse Dates
+    # -----------------------
+    start_date = _parse_date(start)
+    end_date = _parse_date(end)
 
-        # -----------------------
-        # Parse Dates
-        # -----------------------
-        try:
-            start_date = datetime.strptime(start, "%Y-%m-%d").date()
-            end_date = datetime.strptime(end, "%Y-%m-%d").date()
-        except ValueError:
-            raise ValueError("Invalid date format. Use YYYY-MM-DD.")
+    if start_date > end_date:
+        raise ValueError("Start date cannot be after end date.")
 
-        if start_date > end_date:
-            raise ValueError("Start date cannot be after end date.")
+    end_excl = (end_date + timedelta(days=1)).isoformat()
 
+    all_transactions = None
+
+    if transactions:
         # -----------------------
-        # TOTAL
+        # ONE PASS OVER THE ROWS
         # -----------------------
-        cur.execute(
-            """
-            SELECT SUM(amount)
-            FROM transactions
-            WHERE type='expense'
-            AND date BETWEEN ? AND ?
-            """,
-            (start_date.isoformat(), end_date.isoformat())
-        )
+        all_transactions = []
+        totals = {}
+        missing = 0
 
-        res = cur.fetchone()
-        total = res[0] if res and res[0] else 0
+        # Archived years in the range are read through the ledger view,
+        # foreign amounts are converted in the same query
+        for table, window_start, window_end in _ledger_windows(conn, start_date.isoformat(), end_excl):
+            cur.execute(
+                f"""
+                SELECT id, date, type, amount, category, note, currency,
+                       {BASE_AMOUNT.format(row="t.")}
+                FROM {table} t
+                WHERE date >= ? AND date < ?
+                ORDER BY date, id
+                """,
+                (window_start, window_end)
+            )
 
-        # Transactions list
-        cur.execute(
-            """
-            SELECT id, date, type, amount, category, note
-            FROM transactions
-            WHERE date BETWEEN ? AND ?
-            """,
-            (start_date.isoformat(), end_date.isoformat())
-        )
+            for tx_id, tx_date, tx_type, amount, category, note, currency, base in cur:
+                all_transactions.append((tx_id, tx_date, tx_type, to_rupees(amount), category, note, currency))
 
-        all_transactions = cur.fetchall()
-        
+                if base is None and amount is not None:
+                    missing += 1
 
+                key = (tx_type or "", category or "")
+                totals[key] = totals.get(key, 0) + (base or 0)
+
+        if missing:
+            raise _missing_rates(start_date.isoformat(), end_excl)
+    else:
         # -----------------------
-        # CATEGORY BREAKDOWN
+        # AGGREGATES ONLY
         # -----------------------
-        cur.execute(
-                """
-                SELECT category, SUM(amount)
-                FROM transactions
-                WHERE type='expense'
-                AND date BETWEEN ? AND ?
-                GROUP BY category
-                ORDER BY SUM(amount) DESC
-                """,
-                (start_date.isoformat(), end_date.isoformat())
-            )
+        totals = _aggregate(cur, start_date.isoformat(), end_excl, by="category")
 
-        by_category = cur.fetchall()
+    by_type = {}
+    expense_by_category = {}
 
-    finally:
-        conn.close()
+    for (tx_type, category), amount in totals.items():
+        by_type[tx_type] = by_type.get(tx_type, 0) + amount
+
+        if tx_type == "expense":
+            expense_by_category[category] = to_rupees(amount)
 
     return {
-        "total": total,
+        "total": to_rupees(by_type.get("expense", 0)),
+        "by_type": {tx_type: to_rupees(amount) for tx_type, amount in by_type.items()},
         "all_transactions": all_transactions,
-        "by_category": by_category
+        "by_category": sorted(
+            expense_by_category.items(),
+            key=lambda item: item[1],
+            reverse=True
+        ) if by_category else None
     }
 
 def get_transaction_by_id(tx_id):
@@ -299,49 +1136,62 @@ def get_transaction_by_id(tx_id):
     Fetch a transaction by its ID.
 
     Returns:
-        Tuple: (id, date, type, amount, category, note) or None if not found
+        Tuple: (id, date, type, amount, category, note, currency) or None if not found
     """
 
     conn = connect_db()
     cur = conn.cursor()
 
-    try:
-        cur.execute(
-            """
-            SELECT *
-            FROM transactions
-            WHERE id=?
-            """, (tx_id,)
-        )
+    cur.execute(
+        f"""
+        SELECT {TRANSACTION_COLUMNS}
+        FROM transactions
+        WHERE id=?
+        """, (tx_id,)
+    )
 
-        row = cur.fetchone()
-        return row
+    row = cur.fetchone()
 
-    finally:
-        conn.close()
+    if row is None:
+        # Archived rows keep their IDs
+        for table, _, _ in _ledger_windows(conn):
+            if table == "transactions":
+                break
+
+            row = cur.execute(
+                f"SELECT {TRANSACTION_COLUMNS} FROM {table} WHERE id = ?", (tx_id,)
+            ).fetchone()
+
+            if row is not None:
+                break
 
+    return row
+
+@retry_on_busy
 def delete_transaction_by_id(tx_id):
     """
     Delete a transaction by its ID.
 
+    Raises ValueError if the transaction is in an archived year.
+
     Returns:
         bool: True if deleted, False if not found
     """
 
-    conn = connect_db()
-    cur = conn.cursor()
+    with transaction() as conn:
+        cur = conn.cursor()
 
-    cur.execute(
-        """
-        DELETE FROM transactions
-        WHERE id=?
-        """, (tx_id,)
-    )
+        cur.execute(
+            """
+            DELETE FROM transactions
+            WHERE id=?
+            """, (tx_id,)
+        )
 
-    deleted = cur.rowcount > 0
+        deleted = cur.rowcount > 0
 
-    conn.commit()
-    conn.close()
+    if not deleted:
+        ensure_writable({"ids": [tx_id]})
 
     return deleted
 
@@ -349,93 +1199,390 @@ def update_transaction_by_id(tx_id, amount=None, category=None, note=None):
     """
     Update a transaction by its ID.
 
+    Every given field is written by one UPDATE statement.
+
     Returns:
         bool: True if updated, False if not found
     """
 
-    conn = connect_db()
-    cur = conn.cursor()
+    if amount is None and category is None and note is None:
+        return get_transaction_by_id(tx_id) is not None
 
-    cur.execute(
-        """
-        SELECT id FROM transactions WHERE id=?
-        """, (tx_id,)
+    updated = update_transactions(
+        {"ids": [tx_id]},
+        amount=amount,
+        category=category,
+        note=note
     )
 
-    if not cur.fetchone():
-        conn.close()
-        return False
-    
-    if amount is not None:
-        cur.execute(
-            """
+    return updated > 0
+
+def count_transactions(filters):
+    """
+    Count the transactions matching a filter and sum their amounts,
+    archived years included.
+
+    input: filters (dict) see _where()
+    Returns:
+        Tuple: (count, total amount in base currency)
+    """
+
+    conn = connect_db()
+    count = total = missing = 0
+
+    # Only a note filter needs the table rows
+    columns = "id, date, type, category, amount, currency"
+
+    if (filters or {}).get("note") is not None:
+        columns += ", note"
+
+    for table, window_start, window_end in _ledger_windows(conn, *_filter_range(filters)):
+        clause, params = _where(filters)
+
+        if window_start is not None:
+            clause += " AND date >= ?"
+            params.append(window_start)
+
+        if window_end is not None:
+            clause += " AND date < ?"
+            params.append(window_end)
+
+        window_count, window_total, window_missing = conn.execute(
+            f"""
+            SELECT COUNT(*), IFNULL(SUM(base), 0),
+                   COUNT(amount) - COUNT(base)
+            FROM (
+                SELECT amount, {BASE_AMOUNT.format(row="t.")} AS base
+                FROM {_ledger_columns(table, columns)} t
+                WHERE {clause}
+            )
+            """, params
+        ).fetchone()
+
+        count += window_count
+        total += window_total
+        missing += window_missing
+
+    if missing:
+        raise _missing_rates(*_filter_range(filters))
+
+    return count, to_rupees(total)
+
+@retry_on_busy
+def update_transactions(filters, amount=None, category=None, note=None):
+    """
+    Update every transaction matching a filter with one UPDATE statement.
+
+    input: filters (dict) see _where(), must not be empty and must not
+           reach archived years (see ensure_writable()),
+           amount, category, note: new values, None keeps the old one
+    Returns:
+        int: Number of transactions updated
+    """
+
+    clause, params = _where(filters)
+
+    if clause == "1":
+        raise ValueError("Refusing to update every transaction, give at least one filter.")
+
+    assignments = []
+    values = []
+
+    for column, value in (
+        ("amount", to_paise(amount)),
+        ("category", category),
+        ("note", note)
+    ):
+        if value is not None:
+            assignments.append(f"{column} = ?")
+            values.append(value)
+
+    if not assignments:
+        raise ValueError("Nothing to update, give at least one new value.")
+
+    ensure_writable(filters)
+
+    with transaction() as conn, _deferred(conn, DEFER_GENERATION):
+        cur = conn.execute(
+            f"""
             UPDATE transactions
-            SET amount = ?
-            WHERE id = ?
-            """, (amount, tx_id)
+            SET {', '.join(assignments)}
+            WHERE {clause}
+            """, values + params
         )
 
-    if category is not None:
-        cur.execute(
+        return cur.rowcount
+
+@retry_on_busy
+def delete_transactions(filters):
+    """
+    Delete every transaction matching a filter with one DELETE statement.
+
+    input: filters (dict) see _where(), must not be empty and must not
+           reach archived years (see ensure_writable())
+    Returns:
+        int: Number of transactions deleted
+    """
+
+    clause, params = _where(filters)
+
+    if clause == "1":
+        raise ValueError("Refusing to delete every transaction, give at least one filter.")
+
+    ensure_writable(filters)
+
+    with transaction() as conn, _deferred(conn, DEFER_GENERATION):
+        cur = conn.execute(
+            f"""
+            DELETE FROM transactions
+            WHERE {clause}
+            """, params
+        )
+
+        return cur.rowcount
+
+@retry_on_busy
+def add_transaction(tx_type, amount, category, note, currency=BASE_CURRENCY):
+    """
+    Add a new transaction to the database.
+
+    input: currency (str) ISO 4217 code of the amount, defaults to the
+           base currency
+    Returns:
+        bool: True if added successfully
+    """
+
+    date = datetime.now().strftime("%Y-%m-%d")
+
+    with transaction() as conn:
+        conn.execute(
             """
-            UPDATE transactions
-            SET category = ?
-            WHERE id = ?
-            """, (category, tx_id)
+            INSERT INTO transactions (date, type, amount, category, note, currency)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, (date, tx_type, to_paise(amount), category, note, parse_currency(currency))
         )
 
-    if note is not None:
-        cur.execute(
+    return True
+
+def add_transactions(rows, batch_size=1000, progress=None):
+    """
+    Add many transactions with one executemany and one commit per batch.
+
+    input: rows (iterable of (date, type, amount, category, note) or
+           (date, type, amount, category, note, currency) tuples),
+           batch_size (int) number of rows written per transaction,
+           progress (callable, optional) called as progress(count) with
+           the rows committed so far after every batch.
+           A missing date defaults to today, a missing currency to the
+           base currency.
+    Returns:
+        int: Number of transactions added
+    """
+
+    if batch_size <= 0:
+        raise ValueError("Batch size must be a positive number.")
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    rows = iter(rows)
+    count = 0
+
+    while True:
+        batch = [
+            (date or today, tx_type, to_paise(amount), category, note, parse_currency(currency[0] if currency else None))
+            for date, tx_type, amount, category, note, *currency
+            in islice(rows, batch_size)
+        ]
+
+        if not batch:
+            break
+
+        _insert_batch(batch)
+        count += len(batch)
+
+        if progress is not None:
+            progress(count)
+
+    return count
+
+@retry_on_busy
+def _insert_batch(batch):
+    # Each batch commits on its own, so a retry never repeats an earlier one
+    with transaction() as conn:
+        # New rows get ids above the current largest one
+        last_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM transactions").fetchone()[0]
+
+        # The rollup and the full-text index are updated once per batch,
+        # so their per-row insert triggers skip these rows
+        with _deferred(conn, DEFER_ROW_TRIGGERS):
+            conn.executemany(
+                """
+                INSERT INTO transactions (date, type, amount, category, note, currency)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """, batch
+            )
+            conn.execute(ROLLUP_ADD_SINCE, (last_id,))
+            conn.execute(FTS_ADD_SINCE, (last_id,))
+
+def add_fx_rates(rows, batch_size=1000, progress=None):
+    """
+    Add or replace exchange rates, one commit per batch.
+
+    input: rows (iterable of (date, currency, rate) tuples), rate is the
+           value of one unit of the currency in the base currency,
+           batch_size (int) number of rows written per transaction,
+           progress (callable, optional) called as progress(count) with
+           the rates committed so far after every batch
+    Returns:
+        int: Number of rates written
+    """
+
+    if batch_size <= 0:
+        raise ValueError("Batch size must be a positive number.")
+
+    rows = iter(rows)
+    count = 0
+
+    while True:
+        batch = [
+            (parse_currency(currency), date, rate)
+            for date, currency, rate in islice(rows, batch_size)
+        ]
+
+        if not batch:
+            break
+
+        _insert_fx_batch(batch)
+        count += len(batch)
+
+        if progress is not None:
+            progress(count)
+
+    return count
+
+@retry_on_busy
+def _insert_fx_batch(batch):
+    with transaction() as conn, _deferred(conn, DEFER_GENERATION):
+        conn.executemany(
             """
-            UPDATE transactions
-            SET note = ?
-            WHERE id = ?
-            """, (note, tx_id)
+            INSERT OR REPLACE INTO fx_rates (currency, date, rate)
+            VALUES (?, ?, ?)
+            """, batch
         )
 
-    conn.commit()
-    conn.close()
+@cached
+def get_fx_rates(currency=None):
+    """
+    Fetch the stored exchange rates, optionally of one currency.
 
-    return True
+    Returns:
+        List of tuples: (currency, date, rate), ordered by currency and date
+    """
 
-def add_transaction(tx_type, amount, category, note):
+    if currency is None:
+        clause, params = "1", ()
+    else:
+        clause, params = "currency = ?", (parse_currency(currency),)
+
+    return connect_db().execute(
+        f"""
+        SELECT currency, date, rate
+        FROM fx_rates
+        WHERE {clause}
+        ORDER BY currency, date
+        """, params
+    ).fetchall()
+
+def get_fx_rate(currency, on):
     """
-    Add a new transaction to the database.
+    Return the rate of a currency in effect on a date: the latest one
+    on or before it, None when there is none.
+
+    input: currency (str), on (str) YYYY-MM-DD
+    """
+
+    currency = parse_currency(currency)
+
+    if currency == BASE_CURRENCY:
+        return 1.0
+
+    row = connect_db().execute(
+        """
+        SELECT rate FROM fx_rates
+        WHERE currency = ? AND date <= ?
+        ORDER BY date DESC
+        LIMIT 1
+        """, (currency, on)
+    ).fetchone()
+
+    return row[0] if row else None
+
+def get_missing_rates(start=None, end=None):
+    """
+    Find the foreign currency transactions in [start, end) with no
+    exchange rate on or before their date, archived years included.
+    Reports that include them fail until one is added.
+
+    input: start, end (str, optional) ISO dates, end exclusive
     Returns:
-        bool: True if added successfully
+        List of tuples: (currency, count, first date, last date)
     """
 
     conn = connect_db()
-    cur = conn.cursor()
+    found = {}
+
+    for table, window_start, window_end in _ledger_windows(conn, start, end, foreign=True):
+        conditions = [f"currency != '{BASE_CURRENCY}'"]
+        params = []
+
+        for condition, value in (("date >= ?", window_start), ("date < ?", window_end)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        for currency, count, first, last in conn.execute(
+            f"""
+            SELECT currency, COUNT(*), MIN(date), MAX(date)
+            FROM {_ledger_columns(table, "date, currency")} t
+            WHERE {" AND ".join(conditions)} AND NOT EXISTS (
+                SELECT 1 FROM fx_rates r
+                WHERE r.currency = t.currency AND r.date <= t.date
+            )
+            GROUP BY currency
+            """, params
+        ):
+            if currency in found:
+                _, seen, seen_first, seen_last = found[currency]
+                count, first, last = seen + count, min(seen_first, first), max(seen_last, last)
 
-    date = datetime.now().strftime("%Y-%m-%d")
+            found[currency] = (currency, count, first, last)
 
-    cur.execute(
-        """
-        INSERT INTO transactions
-        VALUES (NULL, ?, ?, ?, ?, ?)
-        """, (date, tx_type, amount, category, note)
-    )
+    return sorted(found.values())
 
-    conn.commit()
-    conn.close()
+def count_missing_rates():
+    """
+    Count the foreign currency transactions with no exchange rate on or
+    before their date, see get_missing_rates().
 
-    return True
+    Returns:
+        int: Number of transactions without a rate
+    """
+
+    return sum(count for _, count, _, _ in get_missing_rates())
 
 def get_recent_transactions(limit=5):
     """
     Fetch recent transactions.
 
     Returns:
-        List: Each tuple contains (id, date, type, amount, category, note)
+        List: Each tuple contains (id, date, type, amount, category, note, currency)
     """
 
     conn = connect_db()
     cur = conn.cursor()
 
     cur.execute(
-        """
-        SELECT id, date, type, amount, category, note
+        f"""
+        SELECT {TRANSACTION_COLUMNS}
         FROM transactions
         ORDER BY date DESC, id DESC
         LIMIT ?
@@ -443,7 +1590,6 @@ def get_recent_transactions(limit=5):
     )
 
     rows = cur.fetchall()
-    conn.close()
 
     return rows
 
@@ -459,9 +1605,9 @@ def get_mon_summary_data(month, year):
         }
     """
 
-    start_date = f"{year}-{month:02d}-01"
-    end_date = f"{year}-{month:02d}-31"
-    return get_summary_between(start_date, end_date)
+    start, end = month_bounds(year, month)
+    end_date = (_parse_date(end) - timedelta(days=1)).isoformat()
+    return get_summary_between(start, end_date)
 
 def get_yr_summary_data(year):
     """
@@ -478,6 +1624,7 @@ def get_yr_summary_data(year):
     end_date = f"{year}-12-31"
     return get_summary_between(start_date, end_date)
 
+@retry_on_busy
 def add_budget(category, amount, month, year):
     """
     Add or update a budget for a specific category and month.
@@ -486,44 +1633,20 @@ def add_budget(category, amount, month, year):
         bool: True if added/updated successfully
     """
 
-    conn = connect_db()
-    cur = conn.cursor()
-
-    try:
-        # Check if budget already exists for the category and month
-        cur.execute(
+    with transaction() as conn:
+        # Insert, or update the existing budget for the category and month
+        conn.execute(
             """
-            SELECT id FROM budgets
-            WHERE category=? AND month=? AND year=?
-            """, (category, month, year)
+            INSERT INTO budgets (category, amount, month, year)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (category, month, year)
+            DO UPDATE SET amount = excluded.amount
+            """, (category, to_paise(amount), month, year)
         )
 
-        row = cur.fetchone()
-
-        if row:
-            # Update existing budget
-            cur.execute(
-                """
-                UPDATE budgets
-                SET amount=?
-                WHERE id=?
-                """, (amount, row[0])
-            )
-        else:
-            # Insert new budget
-            cur.execute(
-                """
-                INSERT INTO budgets (category, amount, month, year)
-                VALUES (?, ?, ?, ?)
-                """, (category, amount, month, year)
-            )
-
-        conn.commit()
-        return True
-
-    finally:
-        conn.close()
+    return True
 
+@cached
 def get_budget(month, year):
     """
     Fetch budget for a specific month and year.
@@ -536,16 +1659,16 @@ def get_budget(month, year):
 
     cur.execute(
         """
-        SELECT category, amount FROM budgets
+        SELECT category, amount / 100.0 FROM budgets
         WHERE month=? AND year=?
         """, (month, year)
     )
 
     rows = cur.fetchall()
-    conn.close()
 
     return rows
 
+@cached
 def get_expense_aggregation_by_category(month, year):
     """
     Fetch total expense for each category in a given month and year.
@@ -556,15 +1679,234 @@ def get_expense_aggregation_by_category(month, year):
     conn = connect_db()
     cur = conn.cursor()
 
-    cur.execute(
-        """
-        SELECT category, SUM(amount) FROM transactions
-        WHERE type='expense' AND strftime('%m', date)=? AND strftime('%Y', date)=?
-        GROUP BY category
-        """, (f"{month:02d}", str(year))
+    start, end = month_bounds(year, month)
+
+    rows = [
+        (key, to_rupees(amount))
+        for (_, key), amount in _aggregate(cur, start, end, tx_type="expense", by="category").items()
+    ]
+
+    return rows
+
+def _parse_month(value):
+    """
+    Parse a YYYY-MM string into (year, month).
+    """
+    try:
+        parsed = datetime.strptime(value, "%Y-%m")
+    except (TypeError, ValueError):
+        raise ValueError("Invalid month format. Use YYYY-MM.")
+
+    return parsed.year, parsed.month
+
+@cached
+def get_budget_dashboard(start, end):
+    """
+    Compare budgets with actual spend for every category and month in a
+    range, in one query.
+
+    Spend comes from the expense rows of monthly_rollup and both tables
+    are read by (year, month) index ranges. Foreign currency expenses are
+    added converted to the base currency. Carry-over is the unspent
+    (or overspent, negative) budget of the category in earlier months of
+    the same year, year-to-date figures run from January. Both count
+    months that had spending but no budget.
+
+    input: start, end (str) in YYYY-MM format, inclusive
+    Returns:
+        List of tuples: (year, month, category, budget, spent, remaining,
+                         carry_over, ytd_budget, ytd_spent), ordered by
+                         month then category
+    """
+
+    start_year, start_month = _parse_month(start)
+    end_year, end_month = _parse_month(end)
+
+    if (start_year, start_month) > (end_year, end_month):
+        raise ValueError("Start month cannot be after end month.")
+
+    conn = connect_db()
+    next_year, next_month = (end_year + 1, 1) if end_month == 12 else (end_year, end_month + 1)
+
+    foreign = _foreign_totals(
+        conn,
+        f"{start_year:04d}-01-01",
+        f"{next_year:04d}-{next_month:02d}-01",
+        (
+            "CAST(substr(date, 1, 4) AS INTEGER)",
+            "CAST(substr(date, 6, 2) AS INTEGER)",
+            "IFNULL(category, '')"
+        ),
+        "expense"
     )
 
-    rows = cur.fetchall()
-    conn.close()
+    params = {
+        "first_year": start_year,
+        "start_month": start_month,
+        "end_year": end_year,
+        "end_month": end_month,
+        "foreign": json.dumps([row[1:] for row in foreign])
+    }
+
+    rows = conn.execute(
+        """
+        WITH spent AS (
+            SELECT year, month, category, SUM(total) AS spent
+            FROM (
+                SELECT year, month, category, total
+                FROM monthly_rollup
+                WHERE (year, month) BETWEEN (:first_year, 1) AND (:end_year, :end_month)
+                  AND type = 'expense'
+                UNION ALL
+                SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'),
+                       json_extract(value, '$[2]'), json_extract(value, '$[3]')
+                FROM json_each(:foreign)
+            )
+            GROUP BY year, month, category
+        ),
+        grid AS (
+            SELECT year, month, category
+            FROM budgets
+            WHERE (year, month) BETWEEN (:first_year, 1) AND (:end_year, :end_month)
+            UNION
+            SELECT year, month, category FROM spent
+        ),
+        lines AS (
+            SELECT g.year, g.month, g.category,
+                   b.amount AS budget,
+                   IFNULL(s.spent, 0) AS spent
+            FROM grid g
+            LEFT JOIN budgets b
+              ON (b.year, b.month, b.category) = (g.year, g.month, g.category)
+            LEFT JOIN spent s
+              ON (s.year, s.month, s.category) = (g.year, g.month, g.category)
+        ),
+        running AS (
+            SELECT *,
+                   SUM(IFNULL(budget, 0) - spent) OVER w
+                       - (IFNULL(budget, 0) - spent) AS carry_over,
+                   SUM(IFNULL(budget, 0)) OVER w AS ytd_budget,
+                   SUM(spent) OVER w AS ytd_spent
+            FROM lines
+            WINDOW w AS (PARTITION BY year, category ORDER BY month)
+        )
+        SELECT year, month, category,
+               budget / 100.0,
+               spent / 100.0,
+               (budget - spent) / 100.0,
+               carry_over / 100.0,
+               ytd_budget / 100.0,
+               ytd_spent / 100.0
+        FROM running
+        WHERE budget IS NOT NULL
+          AND (year, month) >= (:first_year, :start_month)
+        ORDER BY year, month, category
+        """, params
+    ).fetchall()
+
+    return rows
+
+@retry_on_busy
+def archive_transactions(before, vacuum=False):
+    """
+    Move every transaction dated before Jan 1 of a year into one
+    archive database file per year, next to finpy.db (finpy-2019.db).
+
+    Rows are first copied into the archive and only then deleted from
+    finpy.db, so an interrupted run loses nothing and can be repeated.
+    monthly_rollup keeps the totals of archived years.
+
+    input: before (int) first year to keep, at most the current year,
+           vacuum (bool) shrink finpy.db afterwards
+    Returns:
+        List of tuples: (year, rows moved, archive path)
+    """
+
+    if before > date.today().year:
+        raise ValueError("Only closed years can be archived, --before must not be in the future.")
+
+    conn = connect_db()
+    main_path = _main_path(conn)
+
+    if not main_path:
+        raise ValueError("Archives need a database file, not an in-memory database.")
+
+    oldest = conn.execute(
+        "SELECT MIN(date) FROM transactions WHERE date >= '0000-01-01'"
+    ).fetchone()[0]
+
+    if oldest is None:
+        return []
+
+    root, ext = os.path.splitext(os.path.basename(main_path))
+    moved = []
+
+    for year in range(int(oldest[:4]), before):
+        start, end = year_bounds(year)
+        name = f"{root}-{year}{ext}"
+        path = _archive_path(conn, name)
+        schema = f"archive_{year}"
+
+        if not conn.execute(
+            "SELECT 1 FROM transactions WHERE date >= ? AND date < ? LIMIT 1", (start, end)
+        ).fetchone():
+            continue
+
+        _attach(conn, [(year, path)], create=True)
+
+        # 1: copy, repeating it after an interrupted run is harmless
+        with transaction() as conn:
+            for statement in ARCHIVE_SCHEMA:
+                conn.execute(statement.format(schema=schema))
+
+            count = conn.execute(
+                f"""
+                INSERT OR REPLACE INTO {schema}.transactions (id, date, type, amount, category, note, currency)
+                SELECT id, date, type, amount, category, note, currency
+                FROM main.transactions
+                WHERE date >= ? AND date < ?
+                """, (start, end)
+            ).rowcount
+
+            # Search reads archived notes from the archive's own index
+            conn.execute(ARCHIVE_FTS_REBUILD.format(schema=schema))
+
+            # Lets reports skip archives without foreign currency rows
+            foreign_rows = conn.execute(
+                f"SELECT COUNT(*) FROM {schema}.transactions WHERE currency != '{BASE_CURRENCY}'"
+            ).fetchone()[0]
+
+        # 2: register the archive and delete the rows. The rollup keeps
+        # their totals, so its delete trigger skips them.
+        with transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO archives (year, path, foreign_rows) VALUES (?, ?, ?)",
+                (year, name, foreign_rows)
+            )
+
+            with _deferred(conn, DEFER_ROW_TRIGGERS):
+                conn.execute(
+                    "DELETE FROM main.transactions WHERE date >= ? AND date < ?", (start, end)
+                )
+
+        moved.append((year, count, path))
+
+    if vacuum and moved:
+        conn.execute("VACUUM main")
+
+    return moved
+
+def get_archives():
+    """
+    List the archived years.
+
+    Returns:
+        List of tuples: (year, archive path)
+    """
+
+    conn = connect_db()
 
-    return rows
\ No newline at end of file
+    return [
+        (year, _archive_path(conn, name))
+        for year, name in conn.execute("SELECT year, path FROM archives ORDER BY year")
+    ]
@@ -0,0 +1,219 @@
+"""
+Query profiling and phase timing (finpy --profile / FINPY_TRACE).
+
+When enabled, finpy.connection opens ProfiledConnection objects whose
+cursors time every statement, count the rows it returned and record it
+under its SQL text. A set_trace_callback hook counts every statement
+SQLite actually ran, including trigger bodies and COMMITs. phase()
+times the coarse steps of a command: connect, query, fetch, chart.
+At exit the breakdown is printed to stderr or appended as JSON lines.
+"""
+
+import atexit
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+
+enabled = False
+
+_output = None
+_statements = {}
+_phases = {}
+_traced = 0
+
+def enable(output=None):
+    """
+    Start collecting statistics and report them at exit.
+
+    output: None or "-" prints a table to stderr, anything else is a
+            file path that JSON lines are appended to.
+    """
+    global enabled, _output
+
+    if enabled:
+        return
+
+    enabled = True
+    _output = None if output in (None, "-") else output
+    atexit.register(report)
+
+def _normalize(sql):
+    return " ".join(sql.split())
+
+def _trace(_sql):
+    global _traced
+    _traced += 1
+
+def record_statement(key, calls=0, rows=0, seconds=0.0):
+    """
+    Add calls, rows and time to the statistics of a normalized statement.
+    """
+    stats = _statements.get(key)
+
+    if stats is None:
+        stats = _statements[key] = {"count": 0, "rows": 0, "time": 0.0}
+
+    stats["count"] += calls
+    stats["rows"] += rows
+    stats["time"] += seconds
+
+def _add_phase(name, seconds):
+    stats = _phases.setdefault(name, {"count": 0, "time": 0.0})
+    stats["count"] += 1
+    stats["time"] += seconds
+
+@contextmanager
+def phase(name):
+    """
+    Time a block under the given phase name, a no-op when profiling is off.
+    """
+    if not enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        _add_phase(name, time.perf_counter() - start)
+
+class ProfiledCursor(sqlite3.Cursor):
+    """
+    Cursor that times execute/fetch calls and counts returned rows.
+    """
+
+    _key = ""
+
+    def _run(self, method, sql, parameters):
+        self._key = _normalize(sql)
+        start = time.perf_counter()
+
+        try:
+            return method(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - start
+            _add_phase("query", elapsed)
+
+            # rowcount is the number of modified rows for DML, -1 otherwise
+            record_statement(self._key, 1, max(self.rowcount, 0), elapsed)
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        result = method(*args)
+        elapsed = time.perf_counter() - start
+
+        if isinstance(result, list):
+            rows = len(result)
+        else:
+            rows = 0 if result is None else 1
+
+        _add_phase("fetch", elapsed)
+        record_statement(self._key, 0, rows, elapsed)
+        return result
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        row = self._fetch(super().fetchone)
+
+        if row is None:
+            raise StopIteration
+
+        return row
+
+class ProfiledConnection(sqlite3.Connection):
+    """
+    Connection whose cursors are ProfiledCursor objects.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(_trace)
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def report():
+    """
+    Print the collected statistics to stderr or append them as JSON lines.
+    """
+
+    statements = sorted(_statements.items(), key=lambda item: item[1]["time"], reverse=True)
+    phases = dict(_phases)
+
+    # Whatever a command spent outside the database and charts went into
+    # building and printing its tables
+    if "command" in phases:
+        accounted = sum(
+            phases[name]["time"]
+            for name in ("connect", "query", "fetch", "chart")
+            if name in phases
+        )
+        phases["render"] = {
+            "count": phases["command"]["count"],
+            "time": max(phases["command"]["time"] - accounted, 0.0)
+        }
+
+    if _output:
+        import json
+
+        command = " ".join(sys.argv[1:])
+
+        with open(_output, "a", encoding="utf-8") as fh:
+            for sql, stats in statements:
+                fh.write(json.dumps({"kind": "statement", "command": command, "sql": sql, **stats}) + "\n")
+
+            for name, stats in phases.items():
+                fh.write(json.dumps({"kind": "phase", "command": command, "phase": name, **stats}) + "\n")
+
+            fh.write(json.dumps({"kind": "sqlite", "command": command, "statements": _traced}) + "\n")
+
+        return
+
+    from rich.console import Console
+    from rich.table import Table
+
+    console = Console(stderr=True)
+
+    table = Table(title="Query Profile")
+    table.add_column("Statement")
+    table.add_column("Calls", justify="right")
+    table.add_column("Rows", justify="right")
+    table.add_column("Time (ms)", justify="right")
+
+    for sql, stats in statements:
+        table.add_row(sql, str(stats["count"]), str(stats["rows"]), f"{stats['time'] * 1000:.2f}")
+
+    console.print(table)
+
+    phase_table = Table(title="Phases")
+    phase_table.add_column("Phase")
+    phase_table.add_column("Count", justify="right")
+    phase_table.add_column("Time (ms)", justify="right")
+
+    for name, stats in phases.items():
+        phase_table.add_row(name, str(stats["count"]), f"{stats['time'] * 1000:.2f}")
+
+    console.print(phase_table)
+    console.print(f"SQLite executed {_traced} statements (including triggers and COMMITs).")
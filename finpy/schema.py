@@ -0,0 +1,437 @@
+"""
+Versioned schema migrations for the finpy database.
+
+The applied version is stored in PRAGMA user_version, so existing
+finpy.db files are upgraded in place the next time they are opened.
+Append new migrations to MIGRATIONS, never edit an applied one.
+"""
+
+# Month bucket and group key of a transactions row, with NULLs folded
+# so that every row lands in exactly one monthly_rollup entry
+ROLLUP_KEY = """
+    IFNULL(CAST(substr({row}date, 1, 4) AS INTEGER), 0),
+    IFNULL(CAST(substr({row}date, 6, 2) AS INTEGER), 0),
+    IFNULL({row}type, ''),
+    IFNULL({row}category, '')
+"""
+
+ROLLUP_ADD = """
+    INSERT INTO monthly_rollup (year, month, type, category, total, count)
+    VALUES ({key}, IFNULL(NEW.amount, 0), 1)
+    ON CONFLICT (year, month, type, category)
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+""".format(key=ROLLUP_KEY.format(row="NEW."))
+
+ROLLUP_REMOVE = """
+    UPDATE monthly_rollup
+    SET total = total - IFNULL(OLD.amount, 0), count = count - 1
+    WHERE (year, month, type, category) = ({key});
+
+    DELETE FROM monthly_rollup
+    WHERE (year, month, type, category) = ({key}) AND count <= 0;
+""".format(key=ROLLUP_KEY.format(row="OLD."))
+
+# Currency every total is reported in. monthly_rollup only sums
+# transactions in this currency, the others are converted with fx_rates
+# when a report runs.
+BASE_CURRENCY = "INR"
+
+# finpy_meta 'deferred' lets a bulk writer take over work the per-row
+# triggers would do, so it is done once per statement instead. It is only
+# set inside the writer's own transaction and reset before that commits,
+# so other connections always see 0 and a crash rolls it back.
+DEFERRED = "(SELECT value FROM finpy_meta WHERE key = 'deferred')"
+
+# The writer bumps the data generation once for everything it wrote
+DEFER_GENERATION = 1
+
+# Also, the writer updates monthly_rollup and the full-text index of the
+# rows it inserts (ROLLUP_ADD_SINCE, FTS_ADD_SINCE), or leaves the rollup
+# alone for the rows it deletes (archiving)
+DEFER_ROW_TRIGGERS = 2
+
+ROLLUP_BASE_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_insert
+    AFTER INSERT ON transactions
+    WHEN NEW.currency = '{BASE_CURRENCY}' AND {DEFERRED} < {DEFER_ROW_TRIGGERS}
+    BEGIN {ROLLUP_ADD} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_delete
+    AFTER DELETE ON transactions
+    WHEN OLD.currency = '{BASE_CURRENCY}' AND {DEFERRED} < {DEFER_ROW_TRIGGERS}
+    BEGIN {ROLLUP_REMOVE} END
+    """,
+    # The old and the new row may differ in currency, so removing and
+    # adding are separate triggers (either order gives the same totals)
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_update_remove
+    AFTER UPDATE OF date, type, amount, category, currency ON transactions
+    WHEN OLD.currency = '{BASE_CURRENCY}'
+    BEGIN {ROLLUP_REMOVE} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_rollup_update_add
+    AFTER UPDATE OF date, type, amount, category, currency ON transactions
+    WHEN NEW.currency = '{BASE_CURRENCY}'
+    BEGIN {ROLLUP_ADD} END
+    """,
+)
+
+ROLLUP_BASE_REBUILD = (
+    "DELETE FROM monthly_rollup",
+    """
+    INSERT INTO monthly_rollup (year, month, type, category, total, count)
+    SELECT {key}, SUM(IFNULL(amount, 0)), COUNT(*)
+    FROM transactions
+    WHERE currency = '{base}'
+    GROUP BY 1, 2, 3, 4
+    """.format(key=ROLLUP_KEY.format(row=""), base=BASE_CURRENCY),
+)
+
+# Add totals computed elsewhere (e.g. from an archive file) to the rollup
+ROLLUP_MERGE = """
+    INSERT INTO monthly_rollup (year, month, type, category, total, count)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (year, month, type, category)
+    DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+"""
+
+# Add the base currency rows with id > ? to the rollup in one grouped
+# statement, used by bulk inserts instead of trg_rollup_insert
+ROLLUP_ADD_SINCE = """
+    INSERT INTO monthly_rollup (year, month, type, category, total, count)
+    SELECT {key}, SUM(IFNULL(amount, 0)), COUNT(*)
+    FROM transactions
+    WHERE id > ? AND currency = '{base}'
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (year, month, type, category)
+    DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+""".format(key=ROLLUP_KEY.format(row=""), base=BASE_CURRENCY)
+
+# Persistent data generation, bumped by every write to the ledger so the
+# on-disk query cache can tell stale entries apart across processes.
+# Writes of many rows bump it once instead (DEFER_GENERATION).
+GENERATION_BUMP = "UPDATE finpy_meta SET value = value + 1 WHERE key = 'generation'"
+
+GENERATION_TRIGGERS = tuple(
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_generation_{table}_{op.lower()}
+    AFTER {op} ON {table}
+    WHEN {DEFERRED} = 0
+    BEGIN
+        {GENERATION_BUMP};
+    END
+    """
+    for table in ("transactions", "budgets")
+    for op in ("INSERT", "UPDATE", "DELETE")
+)
+
+FX_GENERATION_TRIGGERS = tuple(
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_generation_fx_rates_{op.lower()}
+    AFTER {op} ON fx_rates
+    WHEN {DEFERRED} = 0
+    BEGIN
+        {GENERATION_BUMP};
+    END
+    """
+    for op in ("INSERT", "UPDATE", "DELETE")
+)
+
+# Keep the external-content FTS5 index on note and category in step with
+# transactions, deletes must pass the old values that were indexed. Bulk
+# inserts index each batch with FTS_ADD_SINCE instead of trg_fts_insert.
+FTS_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_fts_insert
+    AFTER INSERT ON transactions
+    WHEN {DEFERRED} < {DEFER_ROW_TRIGGERS}
+    BEGIN
+        INSERT INTO transactions_fts (rowid, note, category)
+        VALUES (NEW.id, NEW.note, NEW.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_fts_delete
+    AFTER DELETE ON transactions
+    BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, note, category)
+        VALUES ('delete', OLD.id, OLD.note, OLD.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_fts_update
+    AFTER UPDATE OF note, category ON transactions
+    BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, note, category)
+        VALUES ('delete', OLD.id, OLD.note, OLD.category);
+        INSERT INTO transactions_fts (rowid, note, category)
+        VALUES (NEW.id, NEW.note, NEW.category);
+    END
+    """,
+)
+
+FTS_ADD_SINCE = """
+    INSERT INTO transactions_fts (rowid, note, category)
+    SELECT id, note, category FROM transactions WHERE id > ?
+"""
+
+MIGRATIONS = [
+    # 1: base tables, as finpy.db files from before versioning have them
+    (
+        """
+        CREATE TABLE IF NOT EXISTS transactions(
+            id INTEGER PRIMARY KEY,
+            date TEXT,
+            type TEXT,
+            amount REAL,
+            category TEXT,
+            note TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS budgets (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category TEXT NOT NULL,
+        amount REAL NOT NULL CHECK(amount > 0),
+        month INTEGER NOT NULL CHECK(month BETWEEN 1 AND 12),
+        year INTEGER NOT NULL,
+        UNIQUE(category, month, year)
+        )
+        """,
+    ),
+
+    # 2: amounts as INTEGER paise and a currency per transaction. SQLite
+    # cannot change a column type in place, so both tables are copied.
+    # Existing rows are in the base currency.
+    (
+        f"""
+        CREATE TABLE transactions_paise (
+            id INTEGER PRIMARY KEY,
+            date TEXT,
+            type TEXT,
+            amount INTEGER,
+            category TEXT,
+            note TEXT,
+            currency TEXT NOT NULL DEFAULT '{BASE_CURRENCY}'
+        )
+        """,
+        """
+        INSERT INTO transactions_paise (id, date, type, amount, category, note)
+        SELECT id, date, type, CAST(ROUND(amount * 100) AS INTEGER), category, note
+        FROM transactions
+        """,
+        "DROP TABLE transactions",
+        "ALTER TABLE transactions_paise RENAME TO transactions",
+        """
+        CREATE TABLE budgets_paise (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category TEXT NOT NULL,
+        amount INTEGER NOT NULL CHECK(amount > 0),
+        month INTEGER NOT NULL CHECK(month BETWEEN 1 AND 12),
+        year INTEGER NOT NULL,
+        UNIQUE(category, month, year)
+        )
+        """,
+        """
+        INSERT INTO budgets_paise (id, category, amount, month, year)
+        SELECT id, category, CAST(ROUND(amount * 100) AS INTEGER), month, year
+        FROM budgets
+        """,
+        "DROP TABLE budgets",
+        "ALTER TABLE budgets_paise RENAME TO budgets",
+    ),
+
+    # 3: covering indexes. Reports, listings, category filters and the
+    # budget queries are answered from them alone, foreign currency rows
+    # get a small partial index of their own
+    (
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_type_date
+        ON transactions(type, date, category, amount, currency)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_date_id
+        ON transactions(date DESC, id DESC, currency, type, category, amount)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_transactions_category_date
+        ON transactions(category, date DESC, id DESC, currency, type, amount)
+        """,
+        f"""
+        CREATE INDEX IF NOT EXISTS idx_transactions_foreign
+        ON transactions(date, currency, type, category, amount)
+        WHERE currency != '{BASE_CURRENCY}'
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_budgets_period
+        ON budgets(year, month, category, amount)
+        """,
+    ),
+
+    # 4: data generation counter, the bulk write flag the triggers read
+    # and the optional on-disk query cache
+    (
+        """
+        CREATE TABLE IF NOT EXISTS finpy_meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+        "INSERT OR IGNORE INTO finpy_meta (key, value) VALUES ('generation', 0)",
+        "INSERT OR IGNORE INTO finpy_meta (key, value) VALUES ('deferred', 0)",
+        """
+        CREATE TABLE IF NOT EXISTS query_cache (
+            key TEXT PRIMARY KEY,
+            generation INTEGER NOT NULL,
+            value TEXT NOT NULL
+        ) WITHOUT ROWID
+        """,
+        *GENERATION_TRIGGERS,
+    ),
+
+    # 5: per-month totals of the base currency rows kept in sync by triggers
+    (
+        """
+        CREATE TABLE IF NOT EXISTS monthly_rollup (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (year, month, type, category)
+        ) WITHOUT ROWID
+        """,
+        *ROLLUP_BASE_REBUILD,
+        *ROLLUP_BASE_TRIGGERS,
+    ),
+
+    # 6: full-text index over notes and categories with a 3 character
+    # prefix index, shorter prefixes are answered by scanning the term list
+    (
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+            note,
+            category,
+            content='transactions',
+            content_rowid='id',
+            prefix='3'
+        )
+        """,
+        "INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')",
+        *FTS_TRIGGERS,
+    ),
+
+    # 7: closed years moved out to one database file per year, path
+    # relative to the directory of finpy.db
+    (
+        """
+        CREATE TABLE IF NOT EXISTS archives (
+            year INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            foreign_rows INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+    ),
+
+    # 8: exchange rates, foreign rows are converted with the latest rate
+    # on or before their date
+    (
+        """
+        CREATE TABLE IF NOT EXISTS fx_rates (
+            currency TEXT NOT NULL,
+            date TEXT NOT NULL,
+            rate REAL NOT NULL CHECK(rate > 0),
+            PRIMARY KEY (currency, date)
+        ) WITHOUT ROWID
+        """,
+        *FX_GENERATION_TRIGGERS,
+    ),
+]
+
+# Tables of a per-year archive file, created in the attached {schema}.
+# Archives are read-only, they get the indexes of finpy.db and a
+# full-text index of their own that is filled once (ARCHIVE_FTS_REBUILD)
+# and needs no triggers.
+ARCHIVE_SCHEMA = (
+    f"""
+    CREATE TABLE IF NOT EXISTS {{schema}}.transactions(
+        id INTEGER PRIMARY KEY,
+        date TEXT,
+        type TEXT,
+        amount INTEGER,
+        category TEXT,
+        note TEXT,
+        currency TEXT NOT NULL DEFAULT '{BASE_CURRENCY}'
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_date_id
+    ON transactions(date, id, currency, type, category, amount)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_type_date
+    ON transactions(type, date, id, currency, category, amount)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_category_date
+    ON transactions(category, date, id, currency, type, amount)
+    """,
+    f"""
+    CREATE INDEX IF NOT EXISTS {{schema}}.idx_transactions_foreign
+    ON transactions(date, currency, type, category, amount)
+    WHERE currency != '{BASE_CURRENCY}'
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.transactions_fts USING fts5(
+        note,
+        category,
+        content='transactions',
+        content_rowid='id',
+        prefix='3'
+    )
+    """,
+)
+
+ARCHIVE_FTS_REBUILD = "INSERT INTO {schema}.transactions_fts (transactions_fts) VALUES ('rebuild')"
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def get_schema_version(conn):
+    """
+    Return the schema version recorded in the database.
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """
+    Apply every pending migration, each in its own transaction.
+
+    Returns:
+        int: The schema version after migrating
+    """
+
+    version = get_schema_version(conn)
+
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        conn.execute("BEGIN IMMEDIATE")
+
+        try:
+            # Another process may have applied it while we waited for the lock
+            if get_schema_version(conn) < target:
+                for statement in MIGRATIONS[target - 1]:
+                    conn.execute(statement)
+
+                conn.execute(f"PRAGMA user_version = {target}")
+
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        version = target
+
+    return version
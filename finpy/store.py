@@ -0,0 +1,349 @@
+"""
+Columnar in-memory copy of the ledger for analytic commands.
+
+A TransactionStore keeps every transaction as one slot in a few typed
+arrays (about 25 bytes per row) instead of a tuple of Python objects
+(400+ bytes per row):
+
+    ids         array('q')  transaction id
+    days        array('i')  days since 1970-01-01
+    types       array('B')  index into type_names
+    amounts     array('q')  paise, foreign currencies converted to the
+                            base currency
+    categories  array('I')  index into category_names
+
+Notes are not loaded. The arrays support the buffer protocol, so NumPy
+can wrap them without a copy: np.frombuffer(store.amounts, dtype=np.int64).
+
+select(), take() and sum_by() use NumPy when it is installed: a
+comparison mask per condition, fancy indexing and np.bincount, about
+15 ms per million rows for a select() and sum_by(). Without it each
+condition is one map() over the rows still selected and
+itertools.compress of their positions, which run in C but box every
+value into a Python int, and sum_by() is a dict update per row,
+roughly 10x slower.
+"""
+
+from array import array
+from datetime import date, timedelta
+from itertools import compress
+
+from finpy.db import connect_db, _where, _parse_date, _ledger_windows, _missing_rates, BASE_AMOUNT
+
+# Rows fetched from SQLite per batch while loading
+BATCH = 50000
+
+EPOCH = date(1970, 1, 1)
+
+COLUMNS = ("ids", "days", "types", "amounts", "categories")
+
+def _numpy():
+    """
+    Return the numpy module, or None when it is not installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
+
+class TransactionStore:
+    """
+    Transactions held as typed columns instead of row tuples.
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.days = array("i")
+        self.types = array("B")
+        self.amounts = array("q")
+        self.categories = array("I")
+        self.type_names = []
+        self.category_names = []
+
+    @classmethod
+    def load(cls, filters=None, batch_size=BATCH):
+        """
+        Read the matching transactions, archived years included.
+
+        Transactions without a valid date are skipped. Foreign currency
+        amounts are converted with the rate in effect on their date,
+        ValueError is raised when one has no rate.
+
+        input: filters (dict, optional) see finpy.db._where(),
+               batch_size (int) rows fetched per batch
+        Returns:
+            TransactionStore
+        """
+
+        filters = filters or {}
+        store = cls()
+        type_index = {}
+        category_index = {}
+        missing = 0
+        cur = connect_db().cursor()
+
+        end = filters.get("end")
+        end_excl = (_parse_date(end) + timedelta(days=1)).isoformat() if end else None
+
+        for table, window_start, window_end in _ledger_windows(cur.connection, filters.get("start"), end_excl):
+            clause, params = _where(filters)
+
+            if window_start is not None:
+                clause += " AND date >= ?"
+                params.append(window_start)
+
+            if window_end is not None:
+                clause += " AND date < ?"
+                params.append(window_end)
+
+            cur.execute(
+                f"""
+                SELECT id, day, IFNULL(type, ''), IIF(amount IS NULL, 0, base), IFNULL(category, '')
+                FROM (
+                    SELECT *, CAST(julianday(date) - 2440587.5 AS INTEGER) AS day,
+                           {BASE_AMOUNT.format(row="t.")} AS base
+                    FROM {table} t
+                    WHERE {clause}
+                )
+                WHERE day IS NOT NULL
+                """, params
+            )
+
+            while True:
+                rows = cur.fetchmany(batch_size)
+
+                if not rows:
+                    break
+
+                ids, days, types, amounts, categories = zip(*rows)
+
+                if None in amounts:
+                    missing += amounts.count(None)
+                    continue
+
+                store.ids.extend(ids)
+                store.days.extend(days)
+                store.amounts.extend(amounts)
+                store.types.extend(_encode(types, type_index, store.type_names))
+                store.categories.extend(_encode(categories, category_index, store.category_names))
+
+        if missing:
+            raise _missing_rates(filters.get("start"), end_excl)
+
+        return store
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        """
+        Bytes held by the columns, the string tables not included.
+        """
+        return sum(getattr(self, name).itemsize * len(self) for name in COLUMNS)
+
+    def day_of(self, value):
+        """
+        Convert a YYYY-MM-DD string to the day number used in days.
+        """
+        return (_parse_date(value) - EPOCH).days
+
+    def _empty(self):
+        """
+        Return a store with no rows sharing this one's name tables.
+        """
+
+        store = TransactionStore()
+        store.type_names = self.type_names
+        store.category_names = self.category_names
+
+        return store
+
+    def take(self, positions):
+        """
+        Return a new store with the rows at the given positions.
+        """
+
+        store = self._empty()
+        np = _numpy()
+
+        if np is not None:
+            # A generator or iterator is read once
+            if iter(positions) is positions:
+                positions = np.fromiter(positions, dtype=np.intp)
+            else:
+                positions = np.asarray(positions, dtype=np.intp)
+
+            for name in COLUMNS:
+                column = getattr(self, name)
+                picked = np.frombuffer(column, dtype=column.typecode)[positions]
+                getattr(store, name).frombytes(picked.tobytes())
+
+            return store
+
+        if isinstance(positions, range):
+            rows = slice(positions.start, positions.stop, positions.step)
+
+            for name in COLUMNS:
+                getattr(store, name).extend(getattr(self, name)[rows])
+
+            return store
+
+        positions = positions if isinstance(positions, list) else list(positions)
+
+        for name in COLUMNS:
+            column = getattr(self, name)
+            getattr(store, name).extend(map(column.__getitem__, positions))
+
+        return store
+
+    def select(self, type=None, category=None, start=None, end=None):
+        """
+        Return a new store with the rows matching every given condition.
+
+        input: type (str), category (str),
+               start, end (str) YYYY-MM-DD, inclusive
+        """
+
+        # (column name, lowest, highest) value a row may hold
+        conditions = []
+
+        for name, names, value in (
+            ("types", self.type_names, type),
+            ("categories", self.category_names, category)
+        ):
+            if value is None:
+                continue
+
+            if value not in names:
+                return self._empty()
+
+            code = names.index(value)
+            conditions.append((name, code, code))
+
+        if start is not None or end is not None:
+            first = self.day_of(start) if start is not None else -2 ** 31
+            last = self.day_of(end) if end is not None else 2 ** 31 - 1
+            conditions.append(("days", first, last))
+
+        np = _numpy()
+
+        if np is not None:
+            mask = np.ones(len(self), dtype=bool)
+
+            for name, low, high in conditions:
+                column = getattr(self, name)
+                values = np.frombuffer(column, dtype=column.typecode)
+
+                if low == high:
+                    mask &= values == low
+                else:
+                    mask &= (values >= low) & (values <= high)
+
+            return self.take(np.flatnonzero(mask))
+
+        positions = range(len(self))
+
+        # Each condition only tests the rows left by the ones before it
+        for name, low, high in conditions:
+            column = getattr(self, name)
+            test = low.__eq__ if low == high else range(low, high + 1).__contains__
+            values = column if isinstance(positions, range) else map(column.__getitem__, positions)
+            positions = list(compress(positions, map(test, values)))
+
+        return self.take(positions)
+
+    def total(self):
+        """
+        Sum of all amounts, in paise.
+        """
+        return sum(self.amounts)
+
+    def sum_by(self, key):
+        """
+        Total amount per group, in paise.
+
+        key:
+            "type"      -> type name
+            "category"  -> category name
+            "month"     -> "YYYY-MM"
+            "day"       -> "YYYY-MM-DD"
+
+        Returns:
+            dict: {group: total in paise}
+        """
+
+        if key == "type":
+            codes, names = self.types, self.type_names
+        elif key == "category":
+            codes, names = self.categories, self.category_names
+        elif key in ("month", "day"):
+            codes, names = self.days, None
+        else:
+            raise ValueError(f"Unsupported group key: {key}")
+
+        np = _numpy()
+
+        if np is not None:
+            return self._bincount(np, key, codes, names)
+
+        totals = {}
+
+        for code, amount in zip(codes, self.amounts):
+            totals[code] = totals.get(code, 0) + amount
+
+        if names is not None:
+            return {names[code]: total for code, total in totals.items()}
+
+        # Group by day first, there are far fewer days than rows
+        grouped = {}
+        width = 7 if key == "month" else 10
+
+        for day, total in totals.items():
+            label = (EPOCH + timedelta(days=day)).isoformat()[:width]
+            grouped[label] = grouped.get(label, 0) + total
+
+        return grouped
+
+    def _bincount(self, np, key, codes, names):
+        """
+        sum_by() with NumPy: one np.bincount over the group numbers.
+        """
+
+        if not len(self):
+            return {}
+
+        buckets = np.frombuffer(codes, dtype=codes.typecode).astype(np.int64)
+
+        if key == "month":
+            buckets = buckets.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+        first = 0 if names is not None else int(buckets.min())
+        buckets -= first
+
+        counts = np.bincount(buckets)
+        # float64 sums are exact while a group stays under 2**53 paise
+        totals = np.bincount(buckets, weights=np.frombuffer(self.amounts, dtype=np.int64))
+
+        if names is not None:
+            label = names.__getitem__
+        else:
+            unit = "M" if key == "month" else "D"
+            label = lambda i: str(np.datetime64(first + i, unit))
+
+        return {label(int(i)): int(totals[i]) for i in np.flatnonzero(counts)}
+
+def _encode(values, index, names):
+    """
+    Map values to their position in names, adding unseen ones.
+    """
+
+    # dict.fromkeys keeps the first-seen order, so codes are repeatable
+    for value in dict.fromkeys(values):
+        if value not in index:
+            index[value] = len(names)
+            names.append(value)
+
+    return map(index.__getitem__, values)
@@ -1,53 +1,182 @@
-import termcharts
-from rich.console import Console
+import csv
+import json
+import math
+from datetime import date
 
-console = Console()
+from finpy import profiling
+from finpy.schema import BASE_CURRENCY
 
-def fetch_expenses(cur, year=None, month=None, group_by=None):
-    """
-    Fetch aggregated expense data.
+_console = None
 
-    group_by:
-        None        -> total
-        "category"  -> by category
-        "month"     -> by month
+def get_console():
+    """
+    Return the shared rich Console, importing rich on first use.
     """
+    global _console
+
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+
+    return _console
 
-    query = """
-        SELECT {select_clause}
-        FROM transactions
-        WHERE type='expense'
+TRANSACTION_TYPES = ("income", "expense", "investment")
+
+def parse_currency(value):
+    """
+    Normalize a three letter currency code (usd -> USD), empty means the base currency.
     """
 
-    params = []
+    code = (value or "").strip().upper() or BASE_CURRENCY
 
-    # Year filter
-    if year is not None:
-        query += " AND strftime('%Y', date)=?"
-        params.append(str(year))
+    if len(code) != 3 or not code.isalpha() or not code.isascii():
+        raise ValueError(f"Invalid currency '{value}'. Use a three letter code like USD.")
 
-    # Month filter
-    if month is not None:
-        query += " AND strftime('%m', date)=?"
-        params.append(f"{month:02d}")
+    return code
 
-    # Grouping
-    if group_by == "category":
-        select_clause = "category, SUM(amount)"
-        query += " GROUP BY category ORDER BY SUM(amount) DESC"
+def format_amount(amount, currency=BASE_CURRENCY):
+    """
+    Format an amount for display: ₹12.50 in the base currency, 12.50 USD otherwise.
+    """
+
+    if currency == BASE_CURRENCY:
+        return f"₹{amount:.2f}"
 
-    elif group_by == "month":
-        select_clause = "strftime('%m', date), SUM(amount)"
-        query += " GROUP BY strftime('%m', date) ORDER BY strftime('%m', date)"
+    return f"{amount:.2f} {currency}"
 
+def _records(fh, fmt):
+    if fmt == "csv":
+        return csv.DictReader(fh)
+    elif fmt == "jsonl":
+        return _json_records(fh)
     else:
-        select_clause = "SUM(amount)"
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+def _json_records(fh):
+    lines = (line for line in fh if line.strip())
+
+    for line_no, line in enumerate(lines, start=1):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Record {line_no}: invalid JSON.")
+
+        if not isinstance(record, dict):
+            raise ValueError(f"Record {line_no}: expected a JSON object, got {type(record).__name__}.")
+
+        yield record
+
+def _record_date(record, line_no):
+    tx_date = (record.get("date") or "").strip() or None
+
+    if tx_date is not None:
+        try:
+            if len(tx_date) != 10:
+                raise ValueError
+            date.fromisoformat(tx_date)
+        except ValueError:
+            raise ValueError(f"Record {line_no}: invalid date '{tx_date}'. Use YYYY-MM-DD.")
+
+    return tx_date
+
+def iter_import_rows(fh, fmt="csv"):
+    """
+    Stream transactions out of a CSV or JSONL file object.
+
+    fmt:
+        "csv"   -> header row with date,type,amount,category,note
+                   and an optional currency column
+        "jsonl" -> one JSON object per line with the same keys
+
+    Yields:
+        Tuple: (date, type, amount, category, note, currency)
+    """
+
+    for line_no, record in enumerate(_records(fh, fmt), start=1):
+        tx_type = (record.get("type") or "").strip().lower()
+
+        if tx_type not in TRANSACTION_TYPES:
+            raise ValueError(f"Record {line_no}: invalid type '{tx_type}'.")
+
+        try:
+            amount = float(record.get("amount"))
+        except (TypeError, ValueError):
+            amount = math.nan
+
+        if not math.isfinite(amount):
+            raise ValueError(f"Record {line_no}: invalid amount '{record.get('amount')}'.")
 
-    query = query.format(select_clause=select_clause)
+        tx_date = _record_date(record, line_no)
 
-    cur.execute(query, params)
+        try:
+            currency = parse_currency(record.get("currency"))
+        except ValueError as e:
+            raise ValueError(f"Record {line_no}: {e}")
 
-    return cur.fetchall()
+        yield (
+            tx_date,
+            tx_type,
+            amount,
+            (record.get("category") or "").strip().lower(),
+            record.get("note") or "",
+            currency
+        )
+
+def iter_fx_rows(fh, fmt="csv"):
+    """
+    Stream exchange rates out of a CSV or JSONL file object.
+
+    fmt:
+        "csv"   -> header row with date,currency,rate
+        "jsonl" -> one JSON object per line with the same keys
+
+    rate is the value of one unit of the currency in the base currency.
+
+    Yields:
+        Tuple: (date, currency, rate)
+    """
+
+    for line_no, record in enumerate(_records(fh, fmt), start=1):
+        rate_date = _record_date(record, line_no)
+
+        if rate_date is None:
+            raise ValueError(f"Record {line_no}: missing date.")
+
+        try:
+            currency = parse_currency(record.get("currency"))
+        except ValueError as e:
+            raise ValueError(f"Record {line_no}: {e}")
+
+        if currency == BASE_CURRENCY:
+            raise ValueError(f"Record {line_no}: {BASE_CURRENCY} is the base currency.")
+
+        try:
+            rate = float(record.get("rate"))
+            if not rate > 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise ValueError(f"Record {line_no}: invalid rate '{record.get('rate')}'.")
+
+        yield rate_date, currency, rate
+
+def month_bounds(year, month):
+    """
+    Return the half-open [start, end) ISO date range covering a month.
+    """
+    start = f"{year:04d}-{month:02d}-01"
+
+    if month == 12:
+        end = f"{year + 1:04d}-01-01"
+    else:
+        end = f"{year:04d}-{month + 1:02d}-01"
+
+    return start, end
+
+def year_bounds(year):
+    """
+    Return the half-open [start, end) ISO date range covering a year.
+    """
+    return f"{year:04d}-01-01", f"{year + 1:04d}-01-01"
 
 def render_chart(data, title, kind="doughnut"):
     """
@@ -55,6 +184,14 @@ def render_chart(data, title, kind="doughnut"):
     data: list of tuples (label, value)
     kind: "doughnut" or "bar" or "pie"
     """
+    with profiling.phase("chart"):
+        _render_chart(data, title, kind)
+
+def _render_chart(data, title, kind):
+    import termcharts
+
+    console = get_console()
+
     if kind == "doughnut":
         chart = termcharts.doughnut(
             data= data,